@@ -0,0 +1,508 @@
+"""
+Аналитика по заявкам: история статусов и агрегаты по времени.
+
+При создании заявки и смене статуса CRUD функции в той же транзакции
+записывают строку истории (ticket_status_changes) и прибавляют 1
+к агрегатам за час, день и месяц (ticket_rollups, upsert; у агрегата за
+день - и к интервалу гистограммы времени до статуса). Запросы аналитики
+читают только агрегаты, поэтому их время зависит от длины периода,
+а не от количества заявок.
+
+Агрегаты считают события (создание = переход в new, смена статуса),
+а не текущее состояние - удаление заявки их не уменьшает.
+"""
+import bisect
+import functools
+import math
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import Engine, bindparam, case, exists, func, insert, select, update
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.enums import TicketStatus
+from app.models import (
+    DURATION_BUCKETS,
+    DURATION_COLUMNS,
+    ArchivedTicket,
+    Ticket,
+    TicketRollup,
+    TicketStatusChange,
+)
+
+GRANULARITIES = ("hour", "day", "month")
+
+MOSCOW = ZoneInfo('Europe/Moscow')
+
+# Заявок (строк истории) за один проход при заполнении для существующей БД
+BACKFILL_BATCH_SIZE = 5000
+
+# Колонки агрегата: ключ и то, что складывается
+ROLLUP_KEY = ("granularity", "bucket", "status", "project_type")
+ROLLUP_SUMS = ("count", "seconds_total", *DURATION_COLUMNS)
+# Колонки-границы: наименьшее и наибольшее значение
+ROLLUP_BOUNDS = ("seconds_min", "seconds_max")
+
+
+class StatusChange(NamedTuple):
+    """Одно событие: создание заявки (from_status=None) или смена статуса"""
+    ticket_id: int
+    project_type: str | None
+    created_at: datetime
+    from_status: TicketStatus | None
+    to_status: TicketStatus
+    changed_at: datetime
+
+
+def local_time(moment: datetime) -> datetime:
+    """
+    Наивное московское время - в таком виде даты лежат в SQLite
+    (у только что созданной заявки created_at еще с tzinfo)
+    """
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(MOSCOW).replace(tzinfo=None)
+    return moment
+
+
+def now() -> datetime:
+    return local_time(datetime.now(MOSCOW))
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Начало часа / дня / месяца, в который попадает moment"""
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if granularity == "hour":
+        return moment
+    moment = moment.replace(hour=0)
+    if granularity == "day":
+        return moment
+    return moment.replace(day=1)
+
+
+def created(ticket: Ticket) -> StatusChange:
+    return StatusChange(ticket.id, ticket.project_type, ticket.created_at,
+                        None, ticket.status, ticket.created_at)
+
+
+def changed(ticket: Ticket, old_status: TicketStatus, changed_at: datetime) -> StatusChange:
+    return StatusChange(ticket.id, ticket.project_type, ticket.created_at,
+                        old_status, ticket.status, changed_at)
+
+
+def _bound(name: str, column, value):
+    """
+    Новое значение границы name: value, если оно меньше (seconds_min)
+    или больше (seconds_max) column. NULL в column остается NULL,
+    как и у гистограммы.
+    """
+    beyond = value < column if name == "seconds_min" else value > column
+    return case((beyond, value), else_=column)
+
+
+@functools.cache
+def _upsert(dialect: str):
+    """
+    INSERT ... ON CONFLICT DO UPDATE count = count + excluded.count и т.д.
+    None - у СУБД нет такого upsert (см. _add_rollups). Таблица, а не
+    модель: ORM выполнял бы executemany построчно
+    """
+    if dialect == "postgresql":
+        # Диалект PostgreSQL - только когда он нужен, не на старте
+        from sqlalchemy.dialects import postgresql
+        stmt = postgresql.insert(TicketRollup.__table__)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(TicketRollup.__table__)
+    else:
+        return None
+    columns = TicketRollup.__table__.c
+    return stmt.on_conflict_do_update(
+        index_elements=[columns[name] for name in ROLLUP_KEY],
+        # NULL + n = NULL: гистограмма старой строки остается незаполненной
+        set_={**{name: columns[name] + stmt.excluded[name] for name in ROLLUP_SUMS},
+              **{name: _bound(name, columns[name], stmt.excluded[name])
+                 for name in ROLLUP_BOUNDS}},
+    )
+
+
+def _increment(row: dict):
+    """UPDATE существующей строки агрегатов: прибавляет значения row"""
+    columns = TicketRollup.__table__.c
+    return (
+        update(TicketRollup.__table__)
+        .where(*(columns[name] == row[name] for name in ROLLUP_KEY))
+        .values({name: columns[name] + row[name]
+                 for name in ROLLUP_SUMS if row[name] is not None})
+        .values({name: _bound(name, columns[name], row[name])
+                 for name in ROLLUP_BOUNDS if row[name] is not None})
+    )
+
+
+def _accumulate(rollups: dict, changed_at: datetime, status: TicketStatus,
+                project_type: str, seconds: float, granularities=GRANULARITIES):
+    """
+    Прибавляет событие к агрегатам rollups
+    (ключ -> [count, seconds, гистограмма, min, max])
+    """
+    interval = bisect.bisect_left(DURATION_BUCKETS, seconds)
+    for granularity in granularities:
+        key = (granularity, bucket_start(changed_at, granularity), status, project_type)
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = rollups[key] = [0, 0.0, [0] * len(DURATION_COLUMNS), seconds, seconds]
+        rollup[0] += 1
+        rollup[1] += seconds
+        rollup[2][interval] += 1
+        rollup[3] = min(rollup[3], seconds)
+        rollup[4] = max(rollup[4], seconds)
+
+
+def _rollup_rows(rollups: dict) -> list[dict]:
+    """Строки ticket_rollups; гистограмма и границы - только у агрегатов за день"""
+    rows = []
+    for (granularity, bucket, status, project_type), \
+            (count, seconds, histogram, *bounds) in rollups.items():
+        if granularity != "day":
+            histogram = [None] * len(DURATION_COLUMNS)
+            bounds = [None] * len(ROLLUP_BOUNDS)
+        rows.append({"granularity": granularity, "bucket": bucket,
+                     "status": status, "project_type": project_type,
+                     "count": count, "seconds_total": seconds,
+                     **dict(zip(DURATION_COLUMNS, histogram)),
+                     **dict(zip(ROLLUP_BOUNDS, bounds))})
+    return rows
+
+
+def _statements(changes: list[StatusChange]) -> tuple[list[dict], list[dict]]:
+    """Параметры executemany для истории и строки агрегатов"""
+    history = []
+    # Несколько событий в один интервал складываем заранее:
+    # одна строка upsert на ключ агрегата
+    rollups = {}
+
+    for change in changes:
+        changed_at = local_time(change.changed_at)
+        seconds = (changed_at - local_time(change.created_at)).total_seconds()
+        project_type = change.project_type or ""
+        history.append({
+            "ticket_id": change.ticket_id,
+            "from_status": change.from_status,
+            "to_status": change.to_status,
+            "project_type": project_type,
+            "changed_at": changed_at,
+            "seconds_since_created": seconds,
+        })
+        _accumulate(rollups, changed_at, change.to_status, project_type, seconds)
+
+    return history, _rollup_rows(rollups)
+
+
+def _add_rollups(db: Session, rows: list[dict]):
+    """
+    Прибавляет строки к агрегатам. Без upsert у СУБД - UPDATE, а если
+    строки еще нет - INSERT в SAVEPOINT: ее мог вставить параллельный
+    запрос, тогда снова UPDATE.
+    """
+    upsert = _upsert(db.get_bind().dialect.name)
+    if upsert is not None:
+        db.execute(upsert, rows)
+        return
+    for row in rows:
+        if db.execute(_increment(row)).rowcount:
+            continue
+        try:
+            with db.begin_nested():
+                db.execute(insert(TicketRollup.__table__), row)
+        except IntegrityError:
+            db.execute(_increment(row))
+
+
+async def _add_rollups_async(db: AsyncSession, rows: list[dict]):
+    """Асинхронный вариант _add_rollups"""
+    upsert = _upsert(db.get_bind().dialect.name)
+    if upsert is not None:
+        await db.execute(upsert, rows)
+        return
+    for row in rows:
+        if (await db.execute(_increment(row))).rowcount:
+            continue
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(TicketRollup.__table__), row)
+        except IntegrityError:
+            await db.execute(_increment(row))
+
+
+def record_changes(db: Session, changes: list[StatusChange]):
+    """Добавляет события в текущую транзакцию (commit делает вызывающий)"""
+    if not changes:
+        return
+    history, rollups = _statements(changes)
+    db.execute(insert(TicketStatusChange.__table__), history)
+    _add_rollups(db, rollups)
+
+
+async def record_changes_async(db: AsyncSession, changes: list[StatusChange]):
+    """Асинхронный вариант record_changes"""
+    if not changes:
+        return
+    history, rollups = _statements(changes)
+    await db.execute(insert(TicketStatusChange.__table__), history)
+    await _add_rollups_async(db, rollups)
+
+
+# ============= СУЩЕСТВУЮЩАЯ БД =============
+# Заполнение долгое (десятки секунд на 100 тыс. заявок), поэтому не
+# выполняется при старте воркеров, а запускается один раз командой
+# python -m app.backfill. Пачки коммитятся по отдельности - можно
+# при работающем сервере и можно прервать и запустить снова.
+
+
+def _without_history(model):
+    return ~exists().where(TicketStatusChange.ticket_id == model.id)
+
+
+def needs_backfill(engine: Engine) -> bool:
+    """
+    Быстрая проверка при старте: у самых старых заявок нет истории или
+    у агрегатов за день нет гистограммы или границ
+    """
+    with Session(engine) as db:
+        for model in (ArchivedTicket, Ticket):
+            oldest = select(func.min(model.id)).scalar_subquery()
+            if db.scalar(select(model.id).where(
+                    model.id == oldest, _without_history(model))) is not None:
+                return True
+        # Без гистограммы нет и границ (их добавили позже)
+        return db.scalar(select(TicketRollup.count).where(
+            TicketRollup.granularity == "day",
+            TicketRollup.seconds_min.is_(None)).limit(1)) is not None
+
+
+def backfill(engine: Engine):
+    """
+    Для уже существующей БД:
+    - история и агрегаты для заявок (и из архива), созданных до их
+      появления. Промежуточные статусы неизвестны, поэтому для заявки
+      не в статусе new пишется один переход new -> текущий статус в
+      момент updated_at;
+    - гистограммы и границы агрегатов за день, посчитанных до их
+      появления, - по истории.
+    """
+    with Session(engine) as db:
+        for model in (ArchivedTicket, Ticket):
+            last_id = 0
+            while True:
+                tickets = db.execute(
+                    select(model.id, model.project_type, model.status,
+                           model.created_at, model.updated_at)
+                    .where(model.id > last_id, _without_history(model))
+                    .order_by(model.id)
+                    .limit(BACKFILL_BATCH_SIZE)
+                ).all()
+                if not tickets:
+                    break
+
+                changes = []
+                for ticket in tickets:
+                    changes.append(StatusChange(
+                        ticket.id, ticket.project_type, ticket.created_at,
+                        None, TicketStatus.new, ticket.created_at))
+                    if ticket.status != TicketStatus.new:
+                        changes.append(StatusChange(
+                            ticket.id, ticket.project_type, ticket.created_at,
+                            TicketStatus.new, ticket.status,
+                            ticket.updated_at or ticket.created_at))
+                record_changes(db, changes)
+                db.commit()
+                last_id = tickets[-1].id
+
+        backfill_histograms(db)
+
+
+def backfill_histograms(db: Session):
+    """
+    Гистограммы и границы агрегатов за день, у которых их нет (NULL), -
+    по истории. Уже заполненную гистограмму (строка посчитана до
+    появления границ) не меняет.
+    """
+    columns = TicketRollup.__table__.c
+    missing = set(db.execute(
+        select(TicketRollup.bucket, TicketRollup.status, TicketRollup.project_type)
+        .where(TicketRollup.granularity == "day",
+               columns.seconds_min.is_(None))).all())
+    if not missing:
+        return
+
+    rollups = {}
+    last_id = 0
+    while True:
+        events = db.execute(
+            select(TicketStatusChange.id, TicketStatusChange.changed_at,
+                   TicketStatusChange.to_status, TicketStatusChange.project_type,
+                   TicketStatusChange.seconds_since_created)
+            .where(TicketStatusChange.id > last_id)
+            .order_by(TicketStatusChange.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not events:
+            break
+        for event in events:
+            _accumulate(rollups, event.changed_at, event.to_status,
+                        event.project_type, event.seconds_since_created,
+                        granularities=("day",))
+        last_id = events[-1].id
+
+    # Только строки без границ: заполненные с тех пор не трогаем
+    set_histogram = (
+        update(TicketRollup.__table__)
+        .where(columns.granularity == "day",
+               columns.bucket == bindparam("day"),
+               columns.status == bindparam("day_status"),
+               columns.project_type == bindparam("day_project_type"),
+               columns.seconds_min.is_(None))
+        .values({name: func.coalesce(columns[name], bindparam(f"new_{name}"))
+                 for name in DURATION_COLUMNS})
+        .values({name: bindparam(f"new_{name}") for name in ROLLUP_BOUNDS})
+    )
+    db.connection().execute(set_histogram, [
+        {"day": bucket, "day_status": status, "day_project_type": project_type,
+         **{f"new_{name}": value for name, value in zip(
+             (*DURATION_COLUMNS, *ROLLUP_BOUNDS), (*histogram, *bounds))}}
+        for (_, bucket, status, project_type), (_, _, histogram, *bounds)
+        in rollups.items()
+        if (bucket, status, project_type) in missing
+    ])
+    db.commit()
+
+
+# ============= ЗАПРОСЫ =============
+
+
+def _period(column, date_from: date | None, date_to: date | None) -> list:
+    """Условия по периоду (date_to включительно)"""
+    conditions = []
+    if date_from:
+        conditions.append(column >= datetime.combine(date_from, time.min))
+    if date_to:
+        conditions.append(
+            column < datetime.combine(date_to + timedelta(days=1), time.min))
+    return conditions
+
+
+async def get_rollups(
+    db: AsyncSession,
+    granularity: str = "day",
+    date_from: date | None = None,
+    date_to: date | None = None,
+    status: TicketStatus | None = None,
+    project_type: str | None = None
+) -> list[dict]:
+    """
+    Количество переходов в статус по интервалам и project_type.
+    Созданные заявки - status=new.
+    """
+    conditions = [TicketRollup.granularity == granularity,
+                  *_period(TicketRollup.bucket, date_from, date_to)]
+    if status:
+        conditions.append(TicketRollup.status == status)
+    if project_type is not None:
+        conditions.append(TicketRollup.project_type == project_type)
+
+    rows = await db.execute(
+        select(TicketRollup.bucket, TicketRollup.status,
+               TicketRollup.project_type, TicketRollup.count,
+               TicketRollup.seconds_total)
+        .where(*conditions)
+        .order_by(TicketRollup.bucket, TicketRollup.status,
+                  TicketRollup.project_type)
+    )
+    return [
+        {
+            "bucket": bucket,
+            "status": row_status,
+            "project_type": row_project_type or None,
+            "count": count,
+            "avg_seconds": seconds / count if count and row_status != TicketStatus.new else None,
+        }
+        for bucket, row_status, row_project_type, count, seconds in rows
+    ]
+
+
+def _percentile(histogram: list[int], p: float,
+                lowest: float | None, highest: float | None) -> float | None:
+    """
+    Перцентиль по гистограмме: интервал, в который попадает ранг, и
+    линейная интерполяция внутри него - значения считаются равномерно
+    распределенными, каждое в середине своей доли интервала. Интервал
+    сужается до наименьшего и наибольшего значения (lowest, highest):
+    иначе у коротких времен в широком первом интервале медиана вышла бы
+    больше максимума. У последнего интервала без highest верхней границы
+    нет - результат его нижняя граница.
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+    rank = math.ceil(total * p)
+    seen = 0
+    for index, count in enumerate(histogram):
+        if seen + count >= rank:
+            low = DURATION_BUCKETS[index - 1] if index else 0
+            high = DURATION_BUCKETS[index] if index < len(DURATION_BUCKETS) else None
+            if lowest is not None:
+                low = max(low, lowest)
+            if highest is not None:
+                high = highest if high is None else min(high, highest)
+            if high is None or high <= low:
+                return float(low)
+            return low + (high - low) * (rank - seen - 0.5) / count
+        seen += count
+
+
+async def get_duration_stats(
+    db: AsyncSession,
+    status: TicketStatus = TicketStatus.completed,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    project_type: str | None = None
+) -> dict:
+    """
+    Время от создания заявки до перехода в status (в секундах) для
+    переходов за период: количество, среднее, медиана, 90-й перцентиль.
+    Все - из агрегатов за дни периода: среднее точное, перцентили - по
+    гистограмме (с точностью до ее интервала, суженного до наименьшего
+    и наибольшего значения).
+    """
+    columns = TicketRollup.__table__.c
+    conditions = [TicketRollup.granularity == "day",
+                  TicketRollup.status == status,
+                  *_period(TicketRollup.bucket, date_from, date_to)]
+    if project_type is not None:
+        conditions.append(TicketRollup.project_type == project_type)
+
+    count, seconds, lowest, highest, *histogram = (await db.execute(
+        select(func.sum(TicketRollup.count), func.sum(TicketRollup.seconds_total),
+               func.min(TicketRollup.seconds_min), func.max(TicketRollup.seconds_max),
+               *(func.sum(columns[name]) for name in DURATION_COLUMNS))
+        .where(*conditions))).one()
+    histogram = [interval or 0 for interval in histogram]
+
+    return {
+        "status": status,
+        "count": count or 0,
+        "mean_seconds": seconds / count if count else None,
+        "median_seconds": _percentile(histogram, 0.5, lowest, highest),
+        "p90_seconds": _percentile(histogram, 0.9, lowest, highest),
+    }
+
+
+async def get_ticket_history(db: AsyncSession, ticket_id: int) -> list[TicketStatusChange]:
+    result = await db.scalars(
+        select(TicketStatusChange)
+        .where(TicketStatusChange.ticket_id == ticket_id)
+        .order_by(TicketStatusChange.changed_at, TicketStatusChange.id)
+    )
+    return list(result)
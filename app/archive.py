@@ -0,0 +1,149 @@
+"""
+Архив закрытых заявок.
+
+Заявки в статусах completed и cancelled, которые не менялись
+ARCHIVE_AFTER_DAYS дней, фоновая задача переносит из tickets в
+tickets_archive пачками по ARCHIVE_BATCH_SIZE: INSERT ... SELECT и DELETE
+в одной транзакции. Рабочая таблица tickets (список, фильтры, массовые
+операции) остается маленькой, а заявки из архива по-прежнему открываются
+по id (crud.get_ticket), показываются в списке и поиске, попадают в
+выгрузку, статистику и массовое удаление. Смена статуса заявки из архива
+(и массовая) возвращает ее в tickets.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import analytics
+from app import config
+from app.database import db as db_s
+from app.enums import TicketStatus
+from app.models import ArchivedTicket, Ticket
+
+logger = logging.getLogger(__name__)
+
+# Какие заявки считаются закрытыми
+CLOSED_STATUSES = (TicketStatus.completed, TicketStatus.canceled)
+
+# Колонки, общие для tickets и tickets_archive
+COLUMNS = [column.key for column in Ticket.__table__.columns]
+
+
+def archivable_ids(before: datetime, limit: int):
+    """id закрытых заявок, не менявшихся с before"""
+    return (
+        select(Ticket.id)
+        .where(Ticket.status.in_(CLOSED_STATUSES),
+               func.coalesce(Ticket.updated_at, Ticket.created_at) < before)
+        .order_by(Ticket.id)
+        .limit(limit)
+    )
+
+
+async def archive_batch(db: AsyncSession, before: datetime, limit: int) -> int:
+    """Переносит до limit заявок в архив одной транзакцией, возвращает сколько"""
+    ids = list(await db.scalars(archivable_ids(before, limit)))
+    if not ids:
+        return 0
+
+    source = Ticket.__table__
+    await db.execute(
+        insert(ArchivedTicket).from_select(
+            [*COLUMNS, "archived_at"],
+            select(*(source.c[name] for name in COLUMNS),
+                   literal(analytics.now()))
+            .where(source.c.id.in_(ids))
+        )
+    )
+    await db.execute(
+        delete(Ticket).where(Ticket.id.in_(ids))
+        .execution_options(synchronize_session=False))
+    await db.commit()
+    return len(ids)
+
+
+async def restore_where(db: AsyncSession, conditions: list):
+    """
+    Возвращает в tickets заявки архива, подходящие под conditions, без
+    commit (массовая смена статуса). updated_at ставит вызывающий.
+    """
+    archived = ArchivedTicket.__table__
+    await db.execute(
+        insert(Ticket).from_select(
+            COLUMNS, select(*(archived.c[name] for name in COLUMNS)).where(*conditions))
+    )
+    await db.execute(
+        delete(ArchivedTicket).where(*conditions)
+        .execution_options(synchronize_session=False))
+
+
+def restored(archived: ArchivedTicket) -> Ticket:
+    """
+    Заявка для tickets с теми же данными и id. Вызывающий удаляет
+    archived и добавляет результат в сессию (одна транзакция).
+    """
+    ticket = Ticket(**{name: getattr(archived, name) for name in COLUMNS})
+    # Заявку возвращают, чтобы изменить: иначе следующий проход снова
+    # перенес бы ее в архив
+    ticket.updated_at = analytics.now()
+    return ticket
+
+
+class Archiver:
+    """Фоновый перенос закрытых заявок раз в interval секунд"""
+
+    def __init__(self, after_days: int, interval: float, batch_size: int):
+        self.after_days = after_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        """Запускает фоновую задачу (на старте приложения)"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает задачу: незавершенная пачка откатывается"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except IntegrityError:
+                # Те же заявки одновременно перенес другой воркер
+                logger.debug("Заявки уже перенесены в архив другим процессом")
+            except Exception:
+                logger.error("Ошибка при переносе заявок в архив", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> int:
+        """Переносит все подходящие заявки, возвращает сколько"""
+        before = analytics.now() - timedelta(days=self.after_days)
+        total = 0
+        while True:
+            async with db_s.AsyncSessionLocal() as db:
+                moved = await archive_batch(db, before, self.batch_size)
+            total += moved
+            if moved < self.batch_size:
+                break
+        if total:
+            logger.info("В архив перенесено заявок: %d", total)
+        return total
+
+
+archiver = Archiver(
+    after_days=config.ARCHIVE_AFTER_DAYS,
+    interval=config.ARCHIVE_INTERVAL,
+    batch_size=config.ARCHIVE_BATCH_SIZE,
+)
@@ -0,0 +1,327 @@
+"""
+Асинхронные версии функций из app.crud.
+
+Используются в async-эндпоинтах вместе с get_async_db,
+чтобы запросы к БД не блокировали event loop.
+"""
+from sqlalchemy import select, update, delete, func, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Ticket, ArchivedTicket, AdminUser
+from app.enums import TicketStatus
+from app.schemas import TicketCreate, TicketUpdate, TicketBulkSelection
+from app.passwords import verify_password_async
+from app import events
+from app import analytics
+from app import notifications
+from app import archive
+from app import customers
+from app.crud import (
+    ticket_stats_query,
+    load_ticket_stats,
+    cached_ticket_stats,
+    ticket_stats_loading,
+    adjust_ticket_stats,
+    invalidate_ticket_stats,
+    tickets_query,
+    ticket_filters,
+    split_page,
+    lists_archive,
+    merge_tickets,
+    TICKET_FIELDS,
+    TICKET_COLUMNS,
+    ARCHIVE_COLUMNS,
+)
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+
+async def get_ticket_stats(db: AsyncSession) -> dict[str, int]:
+    """Количество заявок по каждому статусу ({status.value: count})"""
+    stats = cached_ticket_stats()
+    if stats is None:
+        with ticket_stats_loading() as since:
+            stats = load_ticket_stats(await db.execute(ticket_stats_query), since)
+    return stats
+
+
+async def create_ticket(db: AsyncSession, ticket_data: TicketCreate):
+    db_ticket = Ticket(**ticket_data.model_dump())
+    db_ticket.customer_id = await customers.resolve_async(
+        db, db_ticket.email, db_ticket.name, db_ticket.phone)
+
+    db.add(db_ticket)
+    await db.flush()
+    await analytics.record_changes_async(db, [analytics.created(db_ticket)])
+    await notifications.enqueue_async(db, [db_ticket])
+    await db.commit()
+    await db.refresh(db_ticket)
+    adjust_ticket_stats(new=db_ticket.status)
+    events.publish_ticket("ticket_created", db_ticket, cached_ticket_stats())
+    notifications.dispatcher.wake()
+    return db_ticket
+
+
+async def create_tickets(db: AsyncSession, tickets_data: list[TicketCreate]) -> list[Ticket]:
+    """Создает несколько заявок одной транзакцией (один commit на всех)"""
+    db_tickets = [Ticket(**ticket_data.model_dump())
+                  for ticket_data in tickets_data]
+    await customers.link_many_async(db, db_tickets)
+
+    db.add_all(db_tickets)
+    await db.flush()
+    await analytics.record_changes_async(
+        db, [analytics.created(db_ticket) for db_ticket in db_tickets])
+    await notifications.enqueue_async(db, db_tickets)
+    await db.commit()
+    for db_ticket in db_tickets:
+        adjust_ticket_stats(new=db_ticket.status)
+    stats = cached_ticket_stats()
+    for db_ticket in db_tickets:
+        events.publish_ticket("ticket_created", db_ticket, stats)
+    notifications.dispatcher.wake()
+    return db_tickets
+
+
+async def get_ticket(db: AsyncSession, ticket_id: int) -> Ticket | ArchivedTicket | None:
+    """Заявка по id: из tickets или, если ее уже перенесли, из архива"""
+    return (await db.get(Ticket, ticket_id)
+            or await db.get(ArchivedTicket, ticket_id))
+
+
+async def get_tickets(
+    db: AsyncSession, skip: int = 0, limit: int = 30,
+    status: TicketStatus | None = None,
+    search: str | None = None,
+    cursor: str | None = None
+) -> list[Ticket]:
+    query = tickets_query(status, search, cursor)
+
+    if skip:
+        query = query.offset(skip)
+
+    result = await db.scalars(query.limit(limit))
+    return list(result)
+
+
+async def get_tickets_page(
+    db: AsyncSession, limit: int = 30,
+    status: TicketStatus | None = None,
+    search: str | None = None,
+    cursor: str | None = None
+) -> tuple[list[Ticket], str | None]:
+    """Страница заявок (вместе с архивом) и курсор следующей страницы"""
+    tickets = await get_tickets(db, limit=limit + 1, status=status,
+                                search=search, cursor=cursor)
+    if lists_archive(status):
+        archived = await db.scalars(tickets_query(
+            status, search, cursor, model=ArchivedTicket).limit(limit + 1))
+        tickets = merge_tickets(tickets, list(archived), search)
+    return split_page(tickets, limit)
+
+
+async def get_previous_tickets(
+    db: AsyncSession, ticket: Ticket | ArchivedTicket, limit: int = 10
+) -> tuple[list, int]:
+    """
+    Заявки того же клиента, созданные раньше ticket (и из архива): последние
+    limit строк (id, created_at, status, archived) и сколько их всего
+    """
+    if ticket.customer_id is None:
+        return [], 0
+    previous = union_all(*(customers.previous_query(ticket, model)
+                           for model in (Ticket, ArchivedTicket))).subquery()
+    # Всего - оконной функцией в том же запросе
+    rows = (await db.execute(
+        select(previous, func.count().over().label("total"))
+        .order_by(previous.c.created_at.desc(), previous.c.id.desc())
+        .limit(limit))).all()
+    return rows, rows[0].total if rows else 0
+
+
+async def get_ticket_row(db: AsyncSession, ticket_id: int) -> dict | None:
+    """Поля TicketResponse одной заявки словарем, без ORM объекта (и из архива)"""
+    row = (await db.execute(
+        select(*TICKET_COLUMNS).where(Ticket.id == ticket_id))).first()
+    if row is None:
+        row = (await db.execute(
+            select(*ARCHIVE_COLUMNS).where(ArchivedTicket.id == ticket_id))).first()
+    return None if row is None else dict(zip(TICKET_FIELDS, row))
+
+
+async def get_ticket_rows_page(
+    db: AsyncSession, limit: int = 30,
+    status: TicketStatus | None = None,
+    search: str | None = None,
+    cursor: str | None = None
+) -> tuple[list[dict], str | None]:
+    """
+    Как get_tickets_page, но заявки - словари полей TicketResponse,
+    выбранные кортежами строк (для JSON API)
+    """
+    query = tickets_query(status, search, cursor, columns=TICKET_COLUMNS)
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    if lists_archive(status):
+        query = tickets_query(status, search, cursor, columns=ARCHIVE_COLUMNS,
+                              model=ArchivedTicket)
+        archived = (await db.execute(query.limit(limit + 1))).all()
+        rows = merge_tickets(rows, archived, search)
+    rows, next_cursor = split_page(rows, limit)
+    # zip по TICKET_FIELDS отбрасывает search_rank в конце строки
+    return [dict(zip(TICKET_FIELDS, row)) for row in rows], next_cursor
+
+
+async def update_ticket_status(db: AsyncSession, ticket_id: int, ticket_data: TicketUpdate):
+    db_ticket = await get_ticket(db, ticket_id)
+    if db_ticket and db_ticket.archived and db_ticket.status != ticket_data.status:
+        # Заявке из архива меняют статус - возвращаем ее в tickets
+        archived, db_ticket = db_ticket, archive.restored(db_ticket)
+        await db.delete(archived)
+        db.add(db_ticket)
+    if db_ticket:
+        old_status = db_ticket.status
+        db_ticket.status = ticket_data.status
+        if old_status != db_ticket.status:
+            await analytics.record_changes_async(
+                db, [analytics.changed(db_ticket, old_status, analytics.now())])
+        await db.commit()
+        await db.refresh(db_ticket)
+        adjust_ticket_stats(old_status, db_ticket.status)
+        events.publish_ticket("ticket_updated", db_ticket, cached_ticket_stats())
+    return db_ticket
+
+
+async def delete_ticket(db: AsyncSession, ticket_id: int):
+    db_ticket = await get_ticket(db, ticket_id)
+    if db_ticket:
+        old_status = db_ticket.status
+        await db.delete(db_ticket)
+        await db.commit()
+        adjust_ticket_stats(old=old_status)
+        events.publish_ticket("ticket_deleted", db_ticket, cached_ticket_stats())
+        return True
+    else:
+        return False
+
+
+def _bulk_conditions(selection: TicketBulkSelection,
+                     model: type[Ticket] | type[ArchivedTicket] = Ticket) -> list:
+    if selection.ids is not None:
+        return [model.id.in_(selection.ids)]
+    return ticket_filters(selection.filter.status,
+                          selection.filter.date_from,
+                          selection.filter.date_to,
+                          model=model)
+
+
+def _bulk_results(selection: TicketBulkSelection, matched, affected, action: str) -> dict[int, str]:
+    results = {}
+    if selection.ids is not None:
+        results = dict.fromkeys(selection.ids, "not_found")
+    for ticket_id in matched:
+        results[ticket_id] = action if ticket_id in affected else "unchanged"
+    return results
+
+
+async def bulk_update_status(
+    db: AsyncSession, selection: TicketBulkSelection, new_status: TicketStatus
+) -> dict[int, str]:
+    """
+    Меняет статус всех выбранных заявок одним UPDATE в одной транзакции.
+    Заявки, у которых статус уже new_status, не трогаются (updated_at тоже).
+    Выбранные заявки из архива с другим статусом сначала возвращаются
+    в tickets (как в update_ticket_status).
+    """
+    conditions = _bulk_conditions(selection)
+    archived_conditions = _bulk_conditions(selection, ArchivedTicket)
+
+    await archive.restore_where(
+        db, [*archived_conditions, ArchivedTicket.status != new_status])
+    # Оставшиеся в архиве уже в new_status
+    unchanged = list(await db.scalars(
+        select(ArchivedTicket.id).where(*archived_conditions)))
+
+    # Старые статусы нужны для снимка статистики и истории
+    old_statuses = dict((await db.execute(
+        select(Ticket.id, Ticket.status).where(*conditions))).all())
+
+    changed_at = analytics.now()
+    result = await db.execute(
+        update(Ticket)
+        .where(*conditions, Ticket.status != new_status)
+        .values(status=new_status,
+                updated_at=datetime.now(ZoneInfo('Europe/Moscow')))
+        .returning(Ticket.id, Ticket.project_type, Ticket.created_at)
+        .execution_options(synchronize_session=False)
+    )
+    updated = result.all()
+    updated_ids = {ticket_id for ticket_id, _, _ in updated}
+    await analytics.record_changes_async(db, [
+        analytics.StatusChange(ticket_id, project_type, created_at,
+                               old_statuses.get(ticket_id), new_status, changed_at)
+        for ticket_id, project_type, created_at in updated
+    ])
+    await db.commit()
+
+    if updated_ids <= old_statuses.keys():
+        for ticket_id in updated_ids:
+            adjust_ticket_stats(old_statuses[ticket_id], new_status)
+    else:
+        # Заявка появилась между SELECT и UPDATE - пересчитаем при чтении
+        invalidate_ticket_stats()
+
+    if updated_ids:
+        events.publish_bulk("tickets_updated", sorted(updated_ids),
+                            cached_ticket_stats(), status=new_status.value)
+
+    return _bulk_results(selection, [*old_statuses, *unchanged], updated_ids,
+                         "updated")
+
+
+async def bulk_delete_tickets(db: AsyncSession, selection: TicketBulkSelection) -> dict[int, str]:
+    """
+    Удаляет все выбранные заявки (и из архива) одним DELETE на таблицу
+    в одной транзакции
+    """
+    deleted = {}
+    for model in (Ticket, ArchivedTicket):
+        result = await db.execute(
+            delete(model)
+            .where(*_bulk_conditions(selection, model))
+            .returning(model.id, model.status)
+            .execution_options(synchronize_session=False)
+        )
+        deleted.update(result.all())
+    await db.commit()
+
+    for old_status in deleted.values():
+        adjust_ticket_stats(old=old_status)
+
+    if deleted:
+        events.publish_bulk("tickets_deleted", sorted(deleted),
+                            cached_ticket_stats())
+
+    return _bulk_results(selection, deleted, deleted, "deleted")
+
+
+async def get_admin_by_username(db: AsyncSession, username: str) -> AdminUser | None:
+    """Находит админа по username"""
+    result = await db.scalars(
+        select(AdminUser).where(AdminUser.username == username).limit(1))
+    return result.first()
+
+
+async def authenticate_admin(db: AsyncSession, username: str, password: str) -> AdminUser | None:
+    """
+    Проверяет логин и пароль админа.
+    Возвращает объект AdminUser если успешно, None если ошибка.
+    """
+    admin = await get_admin_by_username(db, username)
+
+    if not admin:
+        return None
+
+    # Argon2 - в пуле потоков, event loop не блокируется
+    if not await verify_password_async(password, admin.hashed_password):
+        return None
+
+    return admin
@@ -0,0 +1,37 @@
+"""
+Заполнение для БД, созданной до появления клиентов и аналитики:
+связывание заявок с клиентами (app.customers.backfill), история
+статусов, агрегаты и их гистограммы (app.analytics.backfill).
+
+На большой БД это долго, поэтому при старте воркеров не выполняется
+(там только предупреждение в лог). Запускается один раз после
+обновления, можно при работающем сервере: пачки коммитятся по
+отдельности, повторный или прерванный и запущенный снова проход
+ничего не задваивает.
+
+Запуск из корня репозитория:
+    python -m app.backfill
+"""
+import logging
+import time
+
+from app import analytics
+from app import customers
+from app.database.db import engine, init_db
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    init_db(check_backfill=False)
+    started = time.perf_counter()
+    customers.backfill(engine)
+    logger.info("Клиенты связаны за %.1f с", time.perf_counter() - started)
+    started = time.perf_counter()
+    analytics.backfill(engine)
+    logger.info("Аналитика заполнена за %.1f с", time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main()
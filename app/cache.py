@@ -0,0 +1,62 @@
+"""
+Простые кэши в памяти процесса.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from app import config
+
+
+class TTLCache:
+    """
+    LRU кэш с ограничением по размеру и времени жизни записей.
+
+    Когда записей больше maxsize, вытесняется давно не использованная.
+    Запись старше ttl секунд считается отсутствующей.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        """ttl - время жизни этой записи, если не такое, как у кэша"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# Админы по username из токена - чтобы не ходить в БД на каждый запрос
+# админки. Сбрасывается при изменении админа (crud.create_admin и т.п.)
+admin_cache = TTLCache(maxsize=config.ADMIN_CACHE_SIZE,
+                       ttl=config.ADMIN_CACHE_TTL)
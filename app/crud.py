@@ -1,80 +1,396 @@
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, or_
-from app.models import Ticket, AdminUser
+from sqlalchemy.orm import Session, with_expression
+from sqlalchemy import desc, or_, select, func, tuple_, union_all
+from app.models import Ticket, ArchivedTicket, AdminUser
 from app.database import db as db_s
+from app.database import fts
+from app.cache import admin_cache
+from app import events
+from app import analytics
+from app import config
+from app import notifications
+from app import archive
+from app import customers
+from app.passwords import verify_password, get_password_hash
 from app.enums import TicketStatus
-from app.schemas import TicketCreate, TicketUpdate, AdminUserCreate
-from datetime import datetime
+from app.schemas import TicketCreate, TicketUpdate, AdminUserCreate, TicketResponse
+from datetime import date, datetime, time, timedelta
+from contextlib import contextmanager
+import base64
+import heapq
+import json
+import threading
+from time import monotonic
+
+
+# ============= СТАТИСТИКА ПО СТАТУСАМ =============
+
+# Снимок количества заявок по статусам. Загружается одним GROUP BY
+# при первом обращении, дальше обновляется инкрементально в
+# create_ticket / update_ticket_status / delete_ticket.
+# Изменения из других воркеров сюда не попадают - с несколькими
+# воркерами снимок перечитывается раз в TICKET_STATS_TTL секунд.
+# Считаются и заявки в архиве: перенос статус не меняет
+_ticket_stats: dict[str, int] | None = None
+_ticket_stats_loaded_at = 0.0
+_ticket_stats_lock = threading.Lock()
+# Пока выполняется GROUP BY, изменения копятся в журнале и применяются
+# к его результату: иначе закоммиченное во время загрузки в снимок не
+# попало бы. None в журнале - снимок сброшен (invalidate_ticket_stats)
+_ticket_stats_loads = 0
+_ticket_stats_changes: list[tuple[TicketStatus | None, TicketStatus | None] | None] = []
+
+ticket_stats_query = union_all(
+    select(Ticket.status, func.count()).group_by(Ticket.status),
+    select(ArchivedTicket.status, func.count()).group_by(ArchivedTicket.status),
+)
+
+
+def _apply_change(stats: dict[str, int], old: TicketStatus | None,
+                  new: TicketStatus | None):
+    if old is not None:
+        stats[old.value] -= 1
+    if new is not None:
+        stats[new.value] += 1
+
+
+@contextmanager
+def ticket_stats_loading():
+    """
+    Оборачивает выполнение ticket_stats_query: с этого момента изменения
+    журналируются. Возвращает позицию журнала для load_ticket_stats.
+    """
+    global _ticket_stats_loads
+    with _ticket_stats_lock:
+        _ticket_stats_loads += 1
+        since = len(_ticket_stats_changes)
+    try:
+        yield since
+    finally:
+        with _ticket_stats_lock:
+            _ticket_stats_loads -= 1
+            if not _ticket_stats_loads:
+                _ticket_stats_changes.clear()
+
+
+def load_ticket_stats(rows, since: int) -> dict[str, int]:
+    """
+    Сохраняет результат ticket_stats_query как снимок (вместе с
+    изменениями из журнала начиная с since) и возвращает копию
+    """
+    global _ticket_stats, _ticket_stats_loaded_at
+
+    stats = {status.value: 0 for status in TicketStatus}
+    for status, count in rows:
+        stats[status.value] += count
+
+    with _ticket_stats_lock:
+        changes = _ticket_stats_changes[since:]
+        if None in changes:
+            # Снимок сбросили во время загрузки - результат не сохраняем
+            return stats
+        for old, new in changes:
+            _apply_change(stats, old, new)
+        _ticket_stats = stats
+        _ticket_stats_loaded_at = monotonic()
+        return dict(stats)
+
+
+def cached_ticket_stats() -> dict[str, int] | None:
+    """Копия снимка или None, если он еще не загружен или устарел"""
+    with _ticket_stats_lock:
+        if _ticket_stats is None:
+            return None
+        if (config.TICKET_STATS_TTL
+                and monotonic() - _ticket_stats_loaded_at > config.TICKET_STATS_TTL):
+            return None
+        return dict(_ticket_stats)
+
+
+def adjust_ticket_stats(
+    old: TicketStatus | None = None,
+    new: TicketStatus | None = None
+):
+    """
+    Обновляет снимок после успешного commit:
+    old=None - заявка создана, new=None - удалена.
+    """
+    with _ticket_stats_lock:
+        if _ticket_stats_loads:
+            _ticket_stats_changes.append((old, new))
+        if _ticket_stats is not None:
+            _apply_change(_ticket_stats, old, new)
+
+
+def invalidate_ticket_stats():
+    """Сбрасывает снимок - следующий get_ticket_stats перечитает его из БД"""
+    global _ticket_stats
+    with _ticket_stats_lock:
+        _ticket_stats = None
+        if _ticket_stats_loads:
+            _ticket_stats_changes.append(None)
+
+
+def get_ticket_stats(db: Session) -> dict[str, int]:
+    """Количество заявок по каждому статусу ({status.value: count})"""
+    stats = cached_ticket_stats()
+    if stats is None:
+        with ticket_stats_loading() as since:
+            stats = load_ticket_stats(db.execute(ticket_stats_query), since)
+    return stats
+
+
+# ============= ЗАЯВКИ =============
 
 
 def create_ticket(db: Session, ticket_data: TicketCreate):
     db_ticket = Ticket(**ticket_data.model_dump())
+    db_ticket.customer_id = customers.resolve(
+        db, db_ticket.email, db_ticket.name, db_ticket.phone)
 
     db.add(db_ticket)
+    db.flush()
+    analytics.record_changes(db, [analytics.created(db_ticket)])
+    notifications.enqueue(db, [db_ticket])
     db.commit()
     db.refresh(db_ticket)
+    adjust_ticket_stats(new=db_ticket.status)
+    events.publish_ticket("ticket_created", db_ticket, cached_ticket_stats())
+    notifications.dispatcher.wake()
     return db_ticket
 
 
-def get_ticket(db: Session, ticket_id: int):
-    return db.query(Ticket).filter(Ticket.id == ticket_id).first()
+def get_ticket(db: Session, ticket_id: int) -> Ticket | ArchivedTicket | None:
+    """Заявка по id: из tickets или, если ее уже перенесли, из архива"""
+    return (db.query(Ticket).filter(Ticket.id == ticket_id).first()
+            or db.get(ArchivedTicket, ticket_id))
+
+
+# ============= ПАГИНАЦИЯ ПО КУРСОРУ =============
+# Курсор - непрозрачная строка с (created_at, id) последней заявки страницы.
+# Следующая страница выбирается условием (created_at, id) < курсор по
+# индексу ix_tickets_created_at_id, поэтому стоит столько же, сколько первая
+# (в отличие от OFFSET, который перебирает все пропущенные строки).
+# В полнотекстовом поиске вместо created_at в курсоре лежит rank.
+
+
+def encode_cursor(ticket: Ticket) -> str:
+    """
+    Курсор, указывающий на позицию сразу после ticket
+    (заявки или строки из select(*TICKET_COLUMNS))
+    """
+    search_rank = getattr(ticket, "search_rank", None)
+    if search_rank is not None:
+        key = search_rank
+    else:
+        key = ticket.created_at.isoformat()
+    raw = json.dumps([key, ticket.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime | float, int]:
+    """
+    Разбирает курсор в (created_at или rank, id).
+    ValueError если строка не является курсором.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key, ticket_id = json.loads(base64.urlsafe_b64decode(padded))
+        if isinstance(key, str):
+            key = datetime.fromisoformat(key)
+        elif isinstance(key, (int, float)) and not isinstance(key, bool):
+            key = float(key)
+        else:
+            raise ValueError(key)
+        return key, int(ticket_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Неверный курсор") from e
+
+
+# Колонки TicketResponse: JSON API выбирает только их, кортежами строк,
+# без загрузки ORM объектов и валидации через Pydantic
+TICKET_FIELDS = tuple(TicketResponse.model_fields)
+TICKET_COLUMNS = [getattr(Ticket, name) for name in TICKET_FIELDS]
+ARCHIVE_COLUMNS = [getattr(ArchivedTicket, name) for name in TICKET_FIELDS]
+
+
+def tickets_query(
+    status: TicketStatus | None = None,
+    search: str | None = None,
+    cursor: str | None = None,
+    columns: list | None = None,
+    model: type[Ticket] | type[ArchivedTicket] = Ticket
+):
+    """
+    SELECT для списка заявок (общий для sync и async версий).
+
+    С search - полнотекстовый поиск по имени, email, телефону, сообщению и
+    типу проекта (по префиксам слов), результаты по релевантности.
+    С columns - строки из этих колонок вместо заявок (при поиске к ним
+    добавляется search_rank для курсора).
+    model=ArchivedTicket - то же по архиву (columns - ARCHIVE_COLUMNS).
+    """
+    query = select(*columns) if columns else select(model)
+
+    if status:
+        query = query.where(model.status == status)
+
+    if search and search.split():
+        if fts.enabled:
+            return _search_query(query, search, cursor, columns, model)
+
+        search_filter = or_(model.name.ilike(f"%{search}%"),
+                            model.email.ilike(f"{search}%"))
+
+        query = query.where(search_filter)
+
+    if cursor:
+        created_at, ticket_id = decode_cursor(cursor)
+        if not isinstance(created_at, datetime):
+            raise ValueError("Неверный курсор")
+        query = query.where(
+            tuple_(model.created_at, model.id) < tuple_(created_at, ticket_id))
+
+    return query.order_by(desc(model.created_at), desc(model.id))
+
+
+def _search_query(query, search: str, cursor: str | None, columns: list | None, model):
+    """Поиск через FTS5: сортировка по rank, затем по id"""
+    match = fts.match_subquery(search, model.__tablename__)
+    query = query.join(match, match.c.id == model.id)
+    if columns:
+        query = query.add_columns(match.c.rank.label("search_rank"))
+    else:
+        query = query.options(with_expression(model.search_rank, match.c.rank))
+
+    if cursor:
+        rank, ticket_id = decode_cursor(cursor)
+        if not isinstance(rank, float):
+            raise ValueError("Неверный курсор")
+        query = query.where(tuple_(match.c.rank, model.id) > tuple_(rank, ticket_id))
+
+    return query.order_by(match.c.rank, model.id)
+
+
+# ============= АРХИВ В СПИСКЕ =============
+# Список заявок (и поиск) читает и архив: тот же запрос (с тем же
+# курсором) выполняется по tickets_archive, и две отсортированные выборки
+# по limit + 1 строк сливаются - каждая по своему индексу. id в таблицах
+# не пересекаются. В архиве только закрытые заявки, поэтому с фильтром
+# по new / in_progress он не читается. rank в поиске FTS считается по
+# своему индексу у каждой таблицы - порядок между ними приблизительный.
+
+
+def lists_archive(status: TicketStatus | None) -> bool:
+    """Могут ли в списке с этим фильтром по статусу быть заявки из архива"""
+    return status is None or status in archive.CLOSED_STATUSES
+
+
+def merge_tickets(hot: list, archived: list, search: str | None) -> list:
+    """
+    Сливает выборки tickets_query из tickets и из архива (заявки или
+    строки) в один список в том же порядке
+    """
+    if fts.enabled and search and search.split():
+        return list(heapq.merge(
+            hot, archived, key=lambda ticket: (ticket.search_rank, ticket.id)))
+    return list(heapq.merge(
+        hot, archived, key=lambda ticket: (ticket.created_at, ticket.id),
+        reverse=True))
+
+
+def ticket_filters(
+    status: TicketStatus | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    model: type[Ticket] | type[ArchivedTicket] = Ticket
+) -> list:
+    """Условия WHERE по статусу и дате создания (date_to включительно)"""
+    conditions = []
+    if status:
+        conditions.append(model.status == status)
+    if date_from:
+        conditions.append(
+            model.created_at >= datetime.combine(date_from, time.min))
+    if date_to:
+        conditions.append(
+            model.created_at < datetime.combine(date_to + timedelta(days=1), time.min))
+    return conditions
+
+
+def split_page(tickets: list[Ticket], limit: int) -> tuple[list[Ticket], str | None]:
+    """
+    Из limit + 1 выбранных заявок возвращает страницу и курсор следующей
+    (None если это последняя страница).
+    """
+    if len(tickets) > limit:
+        tickets = tickets[:limit]
+        return tickets, encode_cursor(tickets[-1])
+    return tickets, None
 
 
 def get_tickets(
     db: Session, skip: int = 0, limit: int = 30,
     status: TicketStatus | None = None,
-    search: str | None = None
+    search: str | None = None,
+    cursor: str | None = None
 ) -> list[Ticket]:
-    query = db.query(Ticket)
-
-    if status:
-        query = query.filter(Ticket.status == status)
+    query = tickets_query(status, search, cursor)
 
-    if search:
-        search_filter = or_(Ticket.name.ilike(f"%{search}%"),
-                            Ticket.email.ilike(f"${search}%"))
+    if skip:
+        query = query.offset(skip)
 
-        query = query.filter(search_filter)
+    return list(db.scalars(query.limit(limit)))
 
-    query = query.order_by(desc(Ticket.created_at))
 
-    return query.offset(skip).limit(limit).all()
+def get_tickets_page(
+    db: Session, limit: int = 30,
+    status: TicketStatus | None = None,
+    search: str | None = None,
+    cursor: str | None = None
+) -> tuple[list[Ticket], str | None]:
+    """Страница заявок (вместе с архивом) и курсор следующей страницы"""
+    tickets = get_tickets(db, limit=limit + 1, status=status,
+                          search=search, cursor=cursor)
+    if lists_archive(status):
+        archived = db.scalars(tickets_query(
+            status, search, cursor, model=ArchivedTicket).limit(limit + 1))
+        tickets = merge_tickets(tickets, list(archived), search)
+    return split_page(tickets, limit)
 
 
 def update_ticket_status(db: Session, ticket_id: int, ticket_data: TicketUpdate):
-    db_ticket = db.query(Ticket).filter(Ticket.id == ticket_id).first()
+    db_ticket = get_ticket(db, ticket_id)
+    if db_ticket and db_ticket.archived and db_ticket.status != ticket_data.status:
+        # Заявке из архива меняют статус - возвращаем ее в tickets
+        archived, db_ticket = db_ticket, archive.restored(db_ticket)
+        db.delete(archived)
+        db.add(db_ticket)
     if db_ticket:
+        old_status = db_ticket.status
         db_ticket.status = ticket_data.status
+        if old_status != db_ticket.status:
+            analytics.record_changes(
+                db, [analytics.changed(db_ticket, old_status, analytics.now())])
         db.commit()
         db.refresh(db_ticket)
+        adjust_ticket_stats(old_status, db_ticket.status)
+        events.publish_ticket("ticket_updated", db_ticket, cached_ticket_stats())
     return db_ticket
 
 
 def delete_ticket(db: Session, ticket_id: int):
     db_ticket = get_ticket(db, ticket_id)
     if db_ticket:
+        old_status = db_ticket.status
         db.delete(db_ticket)
         db.commit()
+        adjust_ticket_stats(old=old_status)
+        events.publish_ticket("ticket_deleted", db_ticket, cached_ticket_stats())
         return True
     else:
         return False
 
 
-# Контекст для хеширования паролей
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Проверяет соответствие пароля хешу"""
-    return pwd_context.verify(plain_password, hashed_password)
-
-
-def get_password_hash(password: str) -> str:
-    """Хеширует пароль"""
-    return pwd_context.hash(password)
-
-
 def create_admin(db: Session, admin_data: AdminUserCreate) -> AdminUser:
     """Создает нового админа"""
     hashed_password = get_password_hash(admin_data.password)
@@ -88,6 +404,7 @@ def create_admin(db: Session, admin_data: AdminUserCreate) -> AdminUser:
     db.add(db_admin)
     db.commit()
     db.refresh(db_admin)
+    admin_cache.pop(db_admin.username)
 
     return db_admin
 
@@ -0,0 +1,358 @@
+"""
+Клиенты: заявки одного человека, связанные по email и телефону.
+
+Контакты нормализуются при приеме заявки (TicketCreate): email - в нижнем
+регистре, телефон - в формате E.164 (+79991234567). При создании заявки
+CRUD функции в той же транзакции находят клиента по email, а если такого
+email еще не было - по телефону (оба поиска - по индексам customers),
+и записывают tickets.customer_id; не нашли - создают клиента.
+
+Заявки клиента выбираются по индексу (customer_id, created_at, id, status)
+в tickets и tickets_archive - без чтения самих таблиц. Заявки, созданные
+до появления customers, связывает python -m app.backfill.
+"""
+import functools
+import re
+from datetime import datetime
+
+from sqlalchemy import (Engine, bindparam, case, func, insert, literal, or_, select,
+                        tuple_, update)
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import analytics
+from app.models import ArchivedTicket, Customer, Ticket
+
+# Код страны для номеров без него (8 999 ... или 999 ...)
+COUNTRY_CODE = "7"
+
+# Заявок за один проход при связывании существующих заявок
+BACKFILL_BATCH_SIZE = 5000
+
+
+# ============= НОРМАЛИЗАЦИЯ =============
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def normalize_phone(phone: str) -> str:
+    """
+    Телефон в формате E.164. Номер без "+" считается российским:
+    8 999 123-45-67 и 999 123-45-67 -> +79991234567.
+    ValueError, если цифр не 10-15.
+    """
+    digits = re.sub(r"\D", "", phone)
+    if not phone.lstrip().startswith("+"):
+        if len(digits) == 11 and digits[0] == "8":
+            digits = COUNTRY_CODE + digits[1:]
+        elif len(digits) == 10:
+            digits = COUNTRY_CODE + digits
+    if not 10 <= len(digits) <= 15:
+        raise ValueError("Некорректный номер телефона")
+    return "+" + digits
+
+
+def phone_key(phone: str) -> str | None:
+    """Телефон для поиска клиента; None - номер не разобрать (старые заявки)"""
+    try:
+        return normalize_phone(phone)
+    except ValueError:
+        return None
+
+
+# ============= СВЯЗЫВАНИЕ ЗАЯВОК =============
+
+
+def _find(email: str, phone: str | None):
+    """id клиента: с этим email, иначе последний с этим телефоном"""
+    query = select(Customer.id).limit(1)
+    if phone is None:
+        return query.where(Customer.email == email)
+    return (
+        query.where(or_(Customer.email == email, Customer.phone == phone))
+        .order_by(case((Customer.email == email, 0), else_=1),
+                  Customer.last_seen_at.desc())
+    )
+
+
+def _touch(customer_id: int, name: str, phone: str | None, seen_at: datetime):
+    """Последние имя, телефон и время обращения клиента"""
+    values = {"name": name, "last_seen_at": seen_at}
+    if phone is not None:
+        values["phone"] = phone
+    return update(Customer).where(Customer.id == customer_id).values(**values)
+
+
+@functools.cache
+def _create(dialect: str):
+    """
+    INSERT клиентов (параметры - колонки Customer), RETURNING id в порядке
+    параметров. Если тот же email одновременно добавил другой воркер -
+    ON CONFLICT возвращает его запись. None - у СУБД нет такого upsert
+    (см. _insert).
+    """
+    if dialect == "postgresql":
+        from sqlalchemy.dialects import postgresql
+        stmt = postgresql.insert(Customer)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(Customer)
+    else:
+        return None
+    return stmt.on_conflict_do_update(
+        index_elements=[Customer.email],
+        set_={"last_seen_at": stmt.excluded.last_seen_at},
+    ).returning(Customer.id, sort_by_parameter_order=True)
+
+
+def _existing(customer: dict):
+    """id клиента с email нового клиента - его добавил другой воркер"""
+    return select(Customer.id).where(Customer.email == customer["email"])
+
+
+def _seen(customer_id: int, customer: dict):
+    return (update(Customer).where(Customer.id == customer_id)
+            .values(last_seen_at=customer["last_seen_at"]))
+
+
+def _insert(db: Session, customers: list[dict]) -> list[int]:
+    """
+    Запасной путь _create: INSERT по одному в SAVEPOINT, при конфликте
+    по email - запись другого воркера (SELECT) с новым last_seen_at
+    """
+    ids = []
+    for customer in customers:
+        try:
+            with db.begin_nested():
+                result = db.execute(insert(Customer.__table__), customer)
+            ids.append(result.inserted_primary_key[0])
+        except IntegrityError:
+            customer_id = db.scalar(_existing(customer))
+            db.execute(_seen(customer_id, customer))
+            ids.append(customer_id)
+    return ids
+
+
+async def _insert_async(db: AsyncSession, customers: list[dict]) -> list[int]:
+    """Асинхронный вариант _insert"""
+    ids = []
+    for customer in customers:
+        try:
+            async with db.begin_nested():
+                result = await db.execute(insert(Customer.__table__), customer)
+            ids.append(result.inserted_primary_key[0])
+        except IntegrityError:
+            customer_id = await db.scalar(_existing(customer))
+            await db.execute(_seen(customer_id, customer))
+            ids.append(customer_id)
+    return ids
+
+
+def _new(email: str, name: str, phone: str | None, seen_at: datetime) -> dict:
+    return {"email": email, "name": name, "phone": phone,
+            "first_seen_at": seen_at, "last_seen_at": seen_at}
+
+
+def _key(email: str, name: str, phone: str, created_at: datetime | None) -> tuple:
+    """Аргументы поиска клиента: нормализованные контакты и время обращения"""
+    return (normalize_email(email), name, phone_key(phone),
+            analytics.local_time(created_at or analytics.now()))
+
+
+def resolve(db: Session, email: str, name: str, phone: str,
+            created_at: datetime | None = None) -> int:
+    """
+    id клиента с этими контактами (найденного или нового) в текущей
+    транзакции, commit делает вызывающий
+    """
+    email, name, phone, seen_at = _key(email, name, phone, created_at)
+    customer_id = db.scalar(_find(email, phone))
+    if customer_id is None:
+        create = _create(db.get_bind().dialect.name)
+        customer = _new(email, name, phone, seen_at)
+        if create is None:
+            return _insert(db, [customer])[0]
+        return db.scalar(create, customer)
+    db.execute(_touch(customer_id, name, phone, seen_at))
+    return customer_id
+
+
+async def resolve_async(db: AsyncSession, email: str, name: str, phone: str,
+                        created_at: datetime | None = None) -> int:
+    """Асинхронный вариант resolve"""
+    email, name, phone, seen_at = _key(email, name, phone, created_at)
+    customer_id = await db.scalar(_find(email, phone))
+    if customer_id is None:
+        create = _create(db.get_bind().dialect.name)
+        customer = _new(email, name, phone, seen_at)
+        if create is None:
+            return (await _insert_async(db, [customer]))[0]
+        return await db.scalar(create, customer)
+    await db.execute(_touch(customer_id, name, phone, seen_at))
+    return customer_id
+
+
+# Последние имя, телефон (если разобран) и время обращения - executemany
+_touch_many = (
+    update(Customer)
+    .where(Customer.id == bindparam("customer"))
+    .values(name=bindparam("new_name"),
+            phone=func.coalesce(bindparam("new_phone"), Customer.phone),
+            last_seen_at=bindparam("seen_at"))
+)
+
+
+def _lookups(keys: list[tuple]) -> tuple:
+    """
+    Запросы уже известных клиентов пачки: (email, id) и (phone, id).
+    По телефону - в порядке last_seen_at, чтобы в словаре остался последний.
+    """
+    emails = {email for email, _, _, _ in keys}
+    phones = {phone for _, _, phone, _ in keys if phone is not None}
+    return (
+        select(Customer.email, Customer.id).where(Customer.email.in_(emails)),
+        select(Customer.phone, Customer.id).where(Customer.phone.in_(phones))
+        .order_by(Customer.last_seen_at),
+    )
+
+
+def _plan(keys: list[tuple], by_email: dict, by_phone: dict) -> tuple:
+    """
+    Клиент каждой заявки пачки по порядку: id из БД или словарь нового
+    клиента (id появится после INSERT). Возвращает
+    (клиенты по заявкам, новые клиенты, параметры _touch_many).
+    """
+    assigned, created, touched = [], [], {}
+    for email, name, phone, seen_at in keys:
+        customer = by_email.get(email) or (phone and by_phone.get(phone))
+        if customer is None:
+            customer = _new(email, name, phone, seen_at)
+            created.append(customer)
+        elif isinstance(customer, dict):
+            customer.update(name=name, phone=phone or customer["phone"],
+                            last_seen_at=seen_at)
+        else:
+            touched[customer] = {"customer": customer, "new_name": name,
+                                 "new_phone": phone, "seen_at": seen_at}
+        by_email[email] = customer
+        if phone is not None:
+            by_phone[phone] = customer
+        assigned.append(customer)
+    return assigned, created, list(touched.values())
+
+
+def _ids(assigned: list, created: list, created_ids) -> list[int]:
+    for customer, customer_id in zip(created, created_ids):
+        customer["id"] = customer_id
+    return [customer["id"] if isinstance(customer, dict) else customer
+            for customer in assigned]
+
+
+def resolve_many(db: Session, keys: list[tuple]) -> list[int]:
+    """
+    id клиентов для пачки контактов (_key): двумя запросами IN, одним
+    INSERT новых клиентов и одним UPDATE остальных. Повторы в пачке
+    получают одного клиента.
+    """
+    by_email_query, by_phone_query = _lookups(keys)
+    assigned, created, touched = _plan(
+        keys, dict(db.execute(by_email_query).all()),
+        dict(db.execute(by_phone_query).all()))
+    created_ids = []
+    create = _create(db.get_bind().dialect.name)
+    if created and create is None:
+        created_ids = _insert(db, created)
+    elif created:
+        created_ids = db.scalars(create, created).all()
+    if touched:
+        db.connection().execute(_touch_many, touched)
+    return _ids(assigned, created, created_ids)
+
+
+async def resolve_many_async(db: AsyncSession, keys: list[tuple]) -> list[int]:
+    """Асинхронный вариант resolve_many"""
+    by_email_query, by_phone_query = _lookups(keys)
+    assigned, created, touched = _plan(
+        keys, dict((await db.execute(by_email_query)).all()),
+        dict((await db.execute(by_phone_query)).all()))
+    created_ids = []
+    create = _create(db.get_bind().dialect.name)
+    if created and create is None:
+        created_ids = await _insert_async(db, created)
+    elif created:
+        created_ids = (await db.scalars(create, created)).all()
+    if touched:
+        await (await db.connection()).execute(_touch_many, touched)
+    return _ids(assigned, created, created_ids)
+
+
+async def link_many_async(db: AsyncSession, tickets: list[Ticket]):
+    """customer_id для новых заявок пачки (до db.add_all)"""
+    ids = await resolve_many_async(
+        db, [_key(ticket.email, ticket.name, ticket.phone, ticket.created_at)
+             for ticket in tickets])
+    for ticket, customer_id in zip(tickets, ids):
+        ticket.customer_id = customer_id
+
+
+def needs_backfill(engine: Engine) -> bool:
+    """Быстрая проверка при старте: есть заявки без клиента"""
+    with Session(engine) as db:
+        return any(
+            db.scalar(select(model.id).where(model.customer_id.is_(None)).limit(1))
+            is not None
+            for model in (ArchivedTicket, Ticket))
+
+
+def backfill(engine: Engine):
+    """
+    Для уже существующей БД: связывает с клиентами заявки без customer_id
+    по порядку id - сначала архив (старые заявки), потом tickets. Контакты
+    самих заявок не меняются - нормализуются только ключи поиска клиента.
+    """
+    with Session(engine) as db:
+        for model in (ArchivedTicket, Ticket):
+            # updated_at = updated_at: иначе сработал бы onupdate у tickets
+            set_customer = (
+                update(model)
+                .where(model.id == bindparam("ticket_id"))
+                .values(customer_id=bindparam("customer"),
+                        updated_at=model.updated_at)
+            )
+            while True:
+                rows = db.execute(
+                    select(model.id, model.email, model.name, model.phone,
+                           model.created_at)
+                    .where(model.customer_id.is_(None))
+                    .order_by(model.id)
+                    .limit(BACKFILL_BATCH_SIZE)
+                ).all()
+                if not rows:
+                    break
+                ids = resolve_many(db, [
+                    _key(row.email, row.name, row.phone, row.created_at)
+                    for row in rows])
+                db.connection().execute(set_customer, [
+                    {"ticket_id": row.id, "customer": customer_id}
+                    for row, customer_id in zip(rows, ids)])
+                db.commit()
+
+
+# ============= ЗАПРОСЫ =============
+
+
+def previous_query(ticket: Ticket | ArchivedTicket, model):
+    """
+    Заявки того же клиента, созданные раньше ticket (id, created_at,
+    status, в архиве ли), - по индексу customer_id
+    """
+    return select(
+        model.id, model.created_at, model.status,
+        literal(model.archived).label("archived"),
+    ).where(
+        model.customer_id == ticket.customer_id,
+        tuple_(model.created_at, model.id) < tuple_(ticket.created_at, ticket.id),
+    )
@@ -1,20 +1,243 @@
-from sqlalchemy import create_engine
+import logging
+from contextlib import contextmanager
+from sqlalchemy import (Column, MetaData, Table, create_engine, event, func, inspect,
+                        make_url, select, text)
+from sqlalchemy.engine import Engine, URL
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.schema import CreateColumn, CreateTable
+from app.database import fts
+from app import config
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
 
-DATABASE_URL = "sqlite:///app/database/sqlbase.db"
+try:
+    import fcntl
+except ImportError:  # Windows - без блокировки файла
+    fcntl = None
 
-engine = create_engine(DATABASE_URL)
+logger = logging.getLogger(__name__)
+
+# Асинхронные драйверы для синхронных URL без явного async-драйвера
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+# Эти драйверы сами умеют работать в async режиме
+NATIVE_ASYNC_DRIVERS = {"aiosqlite", "asyncpg", "psycopg"}
+
+
+def to_async_url(url: str | URL) -> URL:
+    """sqlite:///x.db -> sqlite+aiosqlite:///x.db и т.п."""
+    url = make_url(url)
+    _, _, driver = url.drivername.partition("+")
+    if driver in NATIVE_ASYNC_DRIVERS:
+        return url
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+DATABASE_URL = config.DATABASE_URL
+ASYNC_DATABASE_URL = config.ASYNC_DATABASE_URL or to_async_url(DATABASE_URL)
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Настройка каждого нового соединения SQLite:
+    WAL - читатели не блокируют писателя и наоборот,
+    busy_timeout - ждать освобождения блокировки вместо "database is locked",
+    synchronous=NORMAL - в WAL режиме безопасно и без fsync на каждый commit,
+    cache_size / mmap_size - меньше системных вызовов на чтение.
+    """
+    cursor = dbapi_connection.cursor()
+    if config.SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size={config.SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def engine_options(url: str | URL) -> dict:
+    """Параметры create_engine / create_async_engine из настроек"""
+    url = make_url(url)
+    options = {
+        "echo": config.DB_ECHO,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+    }
+    # Для SQLite в памяти используется пул из одного соединения
+    if not (url.get_backend_name() == "sqlite"
+            and url.database in (None, "", ":memory:")):
+        options.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+        )
+    return options
+
+
+def create_db_engine(url: str | URL = DATABASE_URL) -> Engine:
+    """Синхронный движок с настройками из окружения"""
+    db_engine = create_engine(url, **engine_options(url))
+    if db_engine.dialect.name == "sqlite":
+        event.listen(db_engine, "connect", set_sqlite_pragmas)
+    return db_engine
+
+
+def create_async_db_engine(url: str | URL = ASYNC_DATABASE_URL) -> AsyncEngine:
+    """Асинхронный движок с настройками из окружения"""
+    db_engine = create_async_engine(url, **engine_options(url))
+    if db_engine.dialect.name == "sqlite":
+        event.listen(db_engine.sync_engine, "connect", set_sqlite_pragmas)
+    return db_engine
+
+
+engine = create_db_engine()
 
 SessionLocal = sessionmaker(bind=engine)
 
+async_engine = create_async_db_engine()
+
+# expire_on_commit=False - после commit объекты остаются загруженными,
+# иначе обращение к атрибутам в шаблоне вызовет ленивый запрос вне сессии
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, expire_on_commit=False)
+
 
 class Base(DeclarativeBase):
     pass
 
 
-def init_db():
-    """Создание всех таблиц"""
-    Base.metadata.create_all(bind=engine)
+# Ключ pg_advisory_lock на время создания схемы
+SCHEMA_LOCK_KEY = 8_271_645_001
+
+
+@contextmanager
+def schema_lock(db_engine: Engine):
+    """
+    Блокировка между процессами на время создания / обновления схемы:
+    воркеры стартуют одновременно, схему меняет первый, остальные ждут
+    и находят ее готовой. SQLite - flock на файле <БД>.lock,
+    PostgreSQL - advisory lock; для остальных СУБД блокировки нет.
+    """
+    url = db_engine.url
+    if url.get_backend_name() == "postgresql":
+        with db_engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"),
+                             {"key": SCHEMA_LOCK_KEY})
+        return
+
+    if (url.get_backend_name() != "sqlite" or fcntl is None
+            or url.database in (None, "", ":memory:")):
+        yield
+        return
+
+    with open(f"{url.database}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def init_db(check_backfill: bool = True):
+    """
+    Создание всех таблиц, колонок, индексов и FTS. Вызывается при старте
+    каждого воркера (main.lifespan), выполняется под schema_lock -
+    повторный вызов ничего не меняет. Клиентов и аналитику для старых
+    заявок заполняет python -m app.backfill - здесь только предупреждение
+    в лог (check_backfill=False - без проверки).
+    """
+    # Импорт здесь: app.analytics, app.customers и модели зависят
+    # от этого модуля
+    from app import analytics
+    from app import customers
+    from app.models import ArchivedTicket, Notification, Ticket, TicketStatusChange
+    with schema_lock(engine):
+        Base.metadata.create_all(bind=engine)
+        ensure_columns()
+        # История и уведомления удаленных заявок остаются - их id тоже выданы
+        ensure_autoincrement(Ticket.__table__, ArchivedTicket.__table__.c.id,
+                             TicketStatusChange.__table__.c.ticket_id,
+                             Notification.__table__.c.ticket_id)
+        ensure_indexes()
+        fts.init_fts(engine)
+        if check_backfill and (customers.needs_backfill(engine)
+                               or analytics.needs_backfill(engine)):
+            logger.warning("Клиенты или аналитика заполнены не для всех "
+                           "заявок - выполните python -m app.backfill")
+
+
+def ensure_columns():
+    """
+    create_all не трогает уже существующие таблицы, поэтому колонки,
+    добавленные в модели позже (только nullable), добавляем через
+    ALTER TABLE ADD COLUMN.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+
+
+def ensure_autoincrement(table: Table, *issued_ids: Column):
+    """
+    Без AUTOINCREMENT SQLite выдает новой строке max(id) + 1 - id последней
+    удаленной строки достается следующей. Таблицу с sqlite_autoincrement
+    в модели, созданную раньше без него, пересоздаем: копия строк с теми
+    же id, DROP старой (с ней - индексы и триггеры FTS, их затем заново
+    создают ensure_indexes и init_fts) и RENAME. Счетчик id - после
+    наибольшего id из таблицы и issued_ids (уже выданные id, например
+    заявок в архиве и в истории).
+    """
+    if (engine.dialect.name != "sqlite"
+            or not table.dialect_options["sqlite"]["autoincrement"]):
+        return
+    with engine.begin() as conn:
+        ddl = conn.scalar(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": table.name})
+        if "AUTOINCREMENT" in ddl.upper():
+            return
+
+        logger.info("Пересоздание %s с AUTOINCREMENT", table.name)
+        rebuilt = table.to_metadata(MetaData(), name=f"{table.name}_rebuilt")
+        columns = ", ".join(column.name for column in table.columns)
+        conn.execute(CreateTable(rebuilt))
+        conn.execute(text(f"INSERT INTO {rebuilt.name} ({columns}) "
+                          f"SELECT {columns} FROM {table.name}"))
+        conn.execute(text(f"DROP TABLE {table.name}"))
+        conn.execute(text(f"ALTER TABLE {rebuilt.name} RENAME TO {table.name}"))
+
+        issued = [conn.scalar(select(func.max(column)))
+                  for column in (table.c.id, *issued_ids)]
+        conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"),
+                     {"name": table.name})
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                     {"name": table.name,
+                      "seq": max((top for top in issued if top is not None), default=0)})
+
+
+def ensure_indexes():
+    """
+    create_all не трогает уже существующие таблицы, поэтому индексы,
+    добавленные в модели позже, создаем отдельно (если их еще нет).
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 
 
 # Функция-генератор для получения сессии БД
@@ -29,3 +252,12 @@ def get_db():
         yield db  # Отдаем сессию
     finally:
         db.close()  # Всегда закрываем после использования
+
+
+async def get_async_db():
+    """
+    Асинхронный вариант get_db для async-эндпоинтов.
+    Запросы к БД не блокируют event loop.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,108 @@
+"""
+Полнотекстовый поиск по заявкам (SQLite FTS5).
+
+tickets_fts - виртуальная таблица с внешним содержимым (content='tickets'):
+текст хранится только в tickets, FTS5 держит лишь индекс. Так же устроена
+tickets_archive_fts для архива заявок. Синхронизация - триггерами
+на INSERT / UPDATE / DELETE, поэтому индекс актуален при любом способе
+записи (ORM, bulk-операции, ручной SQL).
+"""
+from sqlalchemy import DDL, event, inspect, select, table, column, literal_column, text
+from sqlalchemy.engine import Engine
+
+FTS_COLUMNS = "name, email, phone, message, project_type"
+
+
+def fts_ddl(table_name: str) -> list[str]:
+    """FTS таблица <table_name>_fts и триггеры синхронизации с table_name"""
+    fts_table = f"{table_name}_fts"
+    return [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+            {FTS_COLUMNS},
+            content='{table_name}',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table_name} BEGIN
+            INSERT INTO {fts_table}(rowid, {FTS_COLUMNS})
+            VALUES (new.id, new.name, new.email, new.phone, new.message, new.project_type);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table_name} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {FTS_COLUMNS})
+            VALUES ('delete', old.id, old.name, old.email, old.phone, old.message, old.project_type);
+        END
+        """,
+        # Смена статуса не затрагивает индексируемые поля - триггер не срабатывает
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {FTS_COLUMNS} ON {table_name} BEGIN
+            INSERT INTO {fts_table}({fts_table}, rowid, {FTS_COLUMNS})
+            VALUES ('delete', old.id, old.name, old.email, old.phone, old.message, old.project_type);
+            INSERT INTO {fts_table}(rowid, {FTS_COLUMNS})
+            VALUES (new.id, new.name, new.email, new.phone, new.message, new.project_type);
+        END
+        """,
+    ]
+
+
+# Используется ли FTS5 для поиска. Выставляется в init_fts по диалекту БД,
+# для остальных СУБД crud.tickets_query использует ILIKE
+enabled = True
+
+# Таблицы с полнотекстовым индексом (tickets и архив tickets_archive)
+_tables: list[str] = []
+
+
+def register(tickets_table):
+    """Создавать FTS таблицу и триггеры вместе с tickets_table в create_all"""
+    _tables.append(tickets_table.name)
+    for ddl in fts_ddl(tickets_table.name):
+        event.listen(tickets_table, "after_create",
+                     DDL(ddl).execute_if(dialect="sqlite"))
+
+
+def init_fts(engine: Engine):
+    """
+    Для уже существующей БД: создает FTS таблицы и триггеры, если их нет,
+    и индексирует заявки, которые были добавлены до этого.
+    """
+    global enabled
+    enabled = engine.dialect.name == "sqlite"
+    if not enabled:
+        return
+
+    for table_name in _tables:
+        fts_table = f"{table_name}_fts"
+        is_new = not inspect(engine).has_table(fts_table)
+
+        with engine.begin() as conn:
+            for ddl in fts_ddl(table_name):
+                conn.execute(text(ddl))
+            if is_new:
+                conn.execute(text(
+                    f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"))
+
+
+def fts_query(search: str) -> str:
+    """
+    Превращает пользовательский ввод в запрос FTS5: каждое слово - фраза
+    в кавычках (спецсимволы FTS5 не интерпретируются) с поиском по префиксу.
+    "иван petr" -> "иван"* "petr"*  (все слова должны совпасть)
+    """
+    terms = ('"' + term.replace('"', '""') + '"*' for term in search.split())
+    return " ".join(terms)
+
+
+def match_subquery(search: str, table_name: str = "tickets"):
+    """id и rank (bm25, меньше - релевантнее) найденных в table_name заявок"""
+    fts_table = table(f"{table_name}_fts", column("rowid"), column("rank"))
+    return (
+        select(fts_table.c.rowid.label("id"),
+               fts_table.c.rank.label("rank"))
+        .where(literal_column(fts_table.name).op("MATCH")(fts_query(search)))
+        .subquery("fts_match")
+    )
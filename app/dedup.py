@@ -0,0 +1,153 @@
+"""
+Защита от повторных заявок (двойной клик, повтор fetch, боты).
+
+Заявка считается повтором, если
+- пришла с тем же заголовком Idempotency-Key (в течение IDEMPOTENCY_TTL), или
+- у нее те же email, телефон и сообщение после нормализации
+  (в течение DEDUP_WINDOW секунд).
+
+Повтор получает id уже созданной заявки без записи в БД. Окно
+DEDUP_WINDOW отсчитывается от первой заявки: повторы его не продлевают.
+Индекс - в общем для воркеров хранилище (app.shared; по умолчанию -
+ограниченный LRU/TTL кэш в памяти процесса). Перед записью заявки запрос
+атомарно занимает ее fingerprint (и ключ) в хранилище, поэтому одинаковые
+запросы, пришедшие одновременно в один или в разные воркеры, ждут первый
+из них, а не создают вторую заявку.
+"""
+import asyncio
+import hashlib
+import re
+from typing import Awaitable, Callable
+
+from app import config
+from app.schemas import TicketCreate
+from app.shared import SharedState, create_state
+
+# Ограничение на длину ключа (по черновику IETF это строка до 255 символов)
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# id в индексе, пока заявку записывает занявший ее запрос
+PENDING = 0
+# Сколько секунд держится занятая запись: если занявший запрос
+# не записал заявку (воркер упал), после этого ее займет следующий
+CLAIM_TTL = 30
+# Как часто проверять запись, занятую другим воркером (секунды)
+CLAIM_POLL_INTERVAL = 0.05
+
+
+class IdempotencyKeyMismatch(Exception):
+    """Idempotency-Key уже использован для заявки с другими данными"""
+
+
+def fingerprint(ticket_data: TicketCreate) -> str:
+    """
+    Хэш нормализованных email, телефона и сообщения:
+    регистр и пробелы не важны, в телефоне - только цифры.
+    """
+    email = ticket_data.email.strip().lower()
+    phone = re.sub(r"\D", "", ticket_data.phone)
+    message = " ".join((ticket_data.message or "").split()).casefold()
+    return hashlib.sha256(
+        "\x1f".join((email, phone, message)).encode()).hexdigest()
+
+
+class SubmissionIndex:
+    def __init__(self, store: SharedState, window: float, key_ttl: float):
+        # dedup:fp:<fingerprint> -> ticket_id
+        # dedup:key:<Idempotency-Key> -> (fingerprint, ticket_id)
+        self.store = store
+        self.window = window
+        self.key_ttl = key_ttl
+        # Заявки, которые сейчас записываются: fingerprint / ключ -> Future
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def lookup(self, digest: str, key: str | None) -> int | None:
+        """
+        id заявки (PENDING - ее сейчас записывают), если это повтор;
+        IdempotencyKeyMismatch при конфликте
+        """
+        if key is not None:
+            known = await self.store.get("dedup:key:" + key)
+            if known is not None:
+                known_digest, ticket_id = known
+                if known_digest != digest:
+                    raise IdempotencyKeyMismatch(key)
+                return ticket_id
+        return await self.store.get("dedup:fp:" + digest)
+
+    async def claim(self, digest: str, key: str | None) -> bool:
+        """Занимает fingerprint и ключ до записи заявки; False - заняты"""
+        if not await self.store.add("dedup:fp:" + digest, PENDING, ttl=CLAIM_TTL):
+            return False
+        if key is not None and not await self.store.add(
+                "dedup:key:" + key, (digest, PENDING), ttl=CLAIM_TTL):
+            await self.store.delete("dedup:fp:" + digest)
+            return False
+        return True
+
+    async def release(self, digest: str, key: str | None):
+        """Освобождает занятые записи, если заявку записать не удалось"""
+        await self.store.delete("dedup:fp:" + digest)
+        if key is not None:
+            await self.store.delete("dedup:key:" + key)
+
+    async def remember(self, digest: str, key: str | None, ticket_id: int):
+        await self.store.set("dedup:fp:" + digest, ticket_id, ttl=self.window)
+        if key is not None:
+            await self.store.set("dedup:key:" + key, (digest, ticket_id),
+                                 ttl=self.key_ttl)
+
+    async def submit(
+        self,
+        ticket_data: TicketCreate,
+        key: str | None,
+        create: Callable[[], Awaitable[int]]
+    ) -> tuple[int, bool]:
+        """
+        Возвращает (ticket_id, повтор ли это). create() вызывается,
+        только если такой заявки нет ни в индексе, ни в записи прямо сейчас
+        (ни в этом процессе, ни в другом воркере).
+        """
+        digest = fingerprint(ticket_data)
+        names = [digest] if key is None else [digest, "key:" + key]
+
+        while True:
+            ticket_id = await self.lookup(digest, key)
+            if ticket_id is None and await self.claim(digest, key):
+                break
+            if ticket_id is not None and ticket_id != PENDING:
+                # Повтор не продлевает окно fingerprint - только запоминает
+                # новый Idempotency-Key, если пришел с ним
+                if key is not None:
+                    await self.store.add("dedup:key:" + key, (digest, ticket_id),
+                                         ttl=self.key_ttl)
+                return ticket_id, True
+            # Ждем первый такой же запрос: в этом процессе - его future,
+            # в другом воркере - опросом индекса. Если он упадет - пробуем сами
+            pending = next((self._inflight[name] for name in names
+                            if name in self._inflight), None)
+            if pending is not None:
+                await asyncio.wait([pending])
+            elif ticket_id == PENDING:
+                await asyncio.sleep(CLAIM_POLL_INTERVAL)
+
+        future = asyncio.get_running_loop().create_future()
+        for name in names:
+            self._inflight[name] = future
+        try:
+            try:
+                ticket_id = await create()
+            except BaseException:
+                await self.release(digest, key)
+                raise
+            await self.remember(digest, key, ticket_id)
+            return ticket_id, False
+        finally:
+            future.set_result(None)
+            for name in names:
+                self._inflight.pop(name, None)
+
+
+submissions = SubmissionIndex(store=create_state(maxsize=config.DEDUP_CACHE_SIZE),
+                              window=config.DEDUP_WINDOW,
+                              key_ttl=config.IDEMPOTENCY_TTL)
@@ -1,9 +1,9 @@
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from app.database.db import get_db
-from app import crud
-from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.db import get_async_db
+from app import async_crud
+from app.cache import admin_cache
 from datetime import datetime, timedelta
 from typing import Optional
 from zoneinfo import ZoneInfo
@@ -16,6 +16,18 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8 часов
 security = HTTPBearer()
 
 
+async def get_admin_cached(db: AsyncSession, username: str):
+    """
+    Админ по username: сначала из кэша, в БД - только при промахе.
+    """
+    admin = admin_cache.get(username)
+    if admin is None:
+        admin = await async_crud.get_admin_by_username(db, username=username)
+        if admin is not None:
+            admin_cache.set(username, admin)
+    return admin
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Создает JWT токен.
@@ -32,14 +44,26 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
             timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
     to_encode.update({"exp": expire})
+    # python-jose (с криптобэкендами) - при первом токене, не на старте
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
     return encoded_jwt
 
 
-def get_current_admin(
+def decode_token(token: str) -> str | None:
+    """username из JWT токена или None, если токен неверный или истек"""
+    from jose import JWTError, jwt
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+
+async def get_current_admin(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Зависимость для защищенных эндпоинтов админки.
@@ -58,22 +82,14 @@ def get_current_admin(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    try:
-        # Извлекаем токен
-        token = credentials.credentials
-
-        # Декодируем JWT
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
+    # Декодируем JWT из заголовка
+    username = decode_token(credentials.credentials)
 
-        if username is None:
-            raise credentials_exception
-
-    except JWTError:
+    if username is None:
         raise credentials_exception
 
-    # Находим админа в БД
-    admin = crud.get_admin_by_username(db, username=username)
+    # Находим админа (кэш, затем БД)
+    admin = await get_admin_cached(db, username)
 
     if admin is None or not admin.is_active:
         raise credentials_exception
@@ -83,9 +99,9 @@ def get_current_admin(
 # Альтернативная проверка через cookies (для HTML страниц)
 
 
-def get_current_admin_from_cookie(
+async def get_current_admin_from_cookie(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Зависимость для HTML страниц админки.
@@ -101,16 +117,11 @@ def get_current_admin_from_cookie(
             detail="Необходима авторизация"
         )
 
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
+    username = decode_token(token)
 
-        if username is None:
-            raise HTTPException(status_code=401, detail="Неверный токен")
-
-    except JWTError:
+    if username is None:
         raise HTTPException(status_code=401, detail="Неверный токен")
 
-    admin = crud.get_admin_by_username(db, username=username)
+    admin = await get_admin_cached(db, username)
 
     return admin
@@ -9,3 +9,13 @@ class TicketStatus(enum.Enum):
     in_progress = 'in_progress'
     canceled = 'cancelled'
     completed = 'completed'
+
+
+class NotificationStatus(enum.Enum):
+    """
+    Статус уведомления в outbox: ждет отправки, отправлено,
+    или попытки закончились (dead)
+    """
+    pending = 'pending'
+    sent = 'sent'
+    dead = 'dead'
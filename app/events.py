@@ -0,0 +1,171 @@
+"""
+Pub/sub событий по заявкам внутри процесса + поток Server-Sent Events.
+
+CRUD функции публикуют события (создание, смена статуса, удаление),
+каждое подключение к /admin/events получает их через свою очередь.
+Событие кодируется в SSE кадр один раз, рассылка - это put_nowait в
+очередь каждого подписчика. Простаивающее подключение ничего не стоит,
+кроме корутины и пустой очереди (плюс keep-alive раз в EVENTS_KEEPALIVE).
+
+С несколькими воркерами broker.start(state) пускает события через общее
+хранилище (app.shared): кадр публикуется туда, а каждый воркер рассылает
+полученные кадры своим подписчикам.
+"""
+import asyncio
+import json
+import logging
+from typing import AsyncIterator
+
+from app import config
+from app.shared import SharedState
+
+logger = logging.getLogger(__name__)
+
+# Канал событий в общем хранилище
+CHANNEL = "ticket-events"
+
+
+def sse_frame(event: str, data: dict) -> str:
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+RESYNC_FRAME = sse_frame("resync", {})
+
+
+class EventBroker:
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: set[asyncio.Queue] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._shared: SharedState | None = None
+        self._listener: asyncio.Task | None = None
+        self._publishing: set[asyncio.Task] = set()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    async def start(self, state: SharedState):
+        """Рассылка через общее хранилище - подписчикам всех воркеров"""
+        self._loop = asyncio.get_running_loop()
+        self._shared = state
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is None:
+            return
+        self._listener.cancel()
+        await asyncio.gather(self._listener, *self._publishing,
+                             return_exceptions=True)
+        self._listener = None
+        self._shared = None
+
+    async def _listen(self):
+        while True:
+            try:
+                async for frame in self._shared.listen(CHANNEL):
+                    self._fanout(frame)
+            except Exception:
+                logger.warning("Ошибка чтения событий из общего хранилища",
+                               exc_info=True)
+                await asyncio.sleep(1)
+
+    def publish(self, event: str, data: dict):
+        """
+        Рассылает событие всем подписчикам. Можно вызывать и из других
+        потоков (sync CRUD в threadpool) - рассылка уйдет в event loop.
+        """
+        if self._shared is not None:
+            target = self._publish_shared
+        elif self._subscribers and self._loop is not None:
+            target = self._fanout
+        else:
+            return
+        frame = sse_frame(event, data)
+        if _running_loop() is self._loop:
+            target(frame)
+        else:
+            self._loop.call_soon_threadsafe(target, frame)
+
+    def _publish_shared(self, frame: str):
+        task = asyncio.ensure_future(self._shared.publish(CHANNEL, frame))
+        self._publishing.add(task)
+        task.add_done_callback(self._published)
+
+    def _published(self, task: asyncio.Task):
+        self._publishing.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Событие не опубликовано: %r", task.exception())
+
+    def _fanout(self, frame: str):
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # Клиент не успевает читать - сбрасываем очередь и просим
+                # его перечитать страницу целиком
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC_FRAME)
+
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+broker = EventBroker(queue_size=config.EVENTS_QUEUE_SIZE)
+
+
+def ticket_payload(ticket) -> dict:
+    return {
+        "id": ticket.id,
+        "name": ticket.name,
+        "email": ticket.email,
+        "project_type": ticket.project_type,
+        "status": ticket.status.value,
+        "created_at": ticket.created_at.isoformat() if ticket.created_at else None,
+    }
+
+
+def publish_ticket(event: str, ticket, stats: dict | None):
+    """ticket_created / ticket_updated / ticket_deleted + свежая статистика"""
+    broker.publish(event, {"ticket": ticket_payload(ticket), "stats": stats})
+
+
+def publish_bulk(event: str, ids: list[int], stats: dict | None, **extra):
+    """tickets_updated / tickets_deleted для массовых операций"""
+    broker.publish(event, {"ids": ids, "stats": stats, **extra})
+
+
+async def sse_stream(initial: list[str] | None = None,
+                     keepalive: float = config.EVENTS_KEEPALIVE) -> AsyncIterator[str]:
+    """
+    Поток SSE для одного подключения. При отключении клиента Starlette
+    отменяет генератор, и подписка снимается в finally.
+    """
+    queue = broker.subscribe()
+    try:
+        # Подсказка браузеру: переподключаться через 3 секунды
+        yield "retry: 3000\n\n"
+        for frame in initial or []:
+            yield frame
+        while True:
+            try:
+                yield await asyncio.wait_for(queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+    finally:
+        broker.unsubscribe(queue)
@@ -0,0 +1,196 @@
+"""
+Потоковая выгрузка заявок в CSV, NDJSON и Parquet.
+
+Строки читаются курсором на стороне сервера (stream + yield_per) пачками
+по EXPORT_BATCH_SIZE и сразу кодируются и отправляются клиенту, поэтому
+память не зависит от размера таблицы. Сначала выгружается архив заявок,
+затем tickets - каждая часть по дате создания.
+"""
+import csv
+import importlib.util
+import io
+import json
+from datetime import date, datetime
+from typing import AsyncIterator
+
+from sqlalchemy import select
+
+from app import config
+from app.crud import ticket_filters
+from app.database import db as db_s
+from app.enums import TicketStatus
+from app.models import Ticket, ArchivedTicket
+
+# pyarrow не обязателен - без него нет Parquet. Импортируется при первой
+# выгрузке в Parquet, а не на старте
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+EXPORT_COLUMNS = [
+    Ticket.id,
+    Ticket.name,
+    Ticket.email,
+    Ticket.phone,
+    Ticket.status,
+    Ticket.message,
+    Ticket.project_type,
+    Ticket.created_at,
+    Ticket.updated_at,
+]
+COLUMN_NAMES = [column.key for column in EXPORT_COLUMNS]
+
+# С этих символов Excel начинает формулу (=HYPERLINK(...), @cmd) - такие
+# ячейки CSV начинаются с апострофа и открываются как текст
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+# формат -> (media type, расширение файла)
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def available_formats() -> list[str]:
+    return [name for name in FORMATS if name != "parquet" or HAS_PYARROW]
+
+
+def export_query(
+    status: TicketStatus | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    model: type[Ticket] | type[ArchivedTicket] = Ticket
+):
+    """SELECT колонок заявок (без ORM объектов), date_to включительно"""
+    columns = [getattr(model, column.key) for column in EXPORT_COLUMNS]
+    query = select(*columns).where(
+        *ticket_filters(status, date_from, date_to, model))
+
+    return query.order_by(model.created_at, model.id)
+
+
+def export_queries(
+    status: TicketStatus | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None
+) -> list:
+    """export_query по архиву и по tickets"""
+    return [export_query(status, date_from, date_to, ArchivedTicket),
+            export_query(status, date_from, date_to)]
+
+
+async def iter_batches(*queries, batch_size: int = config.EXPORT_BATCH_SIZE) -> AsyncIterator[list]:
+    """
+    Пачки строк (кортежей) из queries по очереди. Сессия открывается
+    здесь, а не через Depends - она должна жить, пока отдается ответ.
+    """
+    async with db_s.AsyncSessionLocal() as db:
+        for query in queries:
+            result = await db.stream(
+                query.execution_options(yield_per=batch_size))
+            async for partition in result.partitions():
+                yield partition
+
+
+def _plain(value):
+    if isinstance(value, TicketStatus):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_cell(value):
+    """
+    Значение для CSV: поля заявки пришли из публичной формы, поэтому
+    текст, похожий на формулу, экранируется апострофом
+    """
+    value = _plain(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+async def encode_csv(batches: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM - чтобы Excel правильно открыл кириллицу
+    buffer.write("\ufeff")
+    writer.writerow(COLUMN_NAMES)
+    async for batch in batches:
+        writer.writerows([_csv_cell(value) for value in row] for row in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+async def encode_ndjson(batches: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        lines = [
+            json.dumps(dict(zip(COLUMN_NAMES, map(_plain, row))),
+                       ensure_ascii=False)
+            for row in batch
+        ]
+        yield ("\n".join(lines) + "\n").encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Файлоподобный приемник: ParquetWriter пишет сюда, мы забираем байты"""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def encode_parquet(batches: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    """Каждая пачка - отдельная row group"""
+    import pyarrow
+    import pyarrow.parquet
+    schema = pyarrow.schema([
+        ("id", pyarrow.int64()),
+        ("name", pyarrow.string()),
+        ("email", pyarrow.string()),
+        ("phone", pyarrow.string()),
+        ("status", pyarrow.string()),
+        ("message", pyarrow.string()),
+        ("project_type", pyarrow.string()),
+        ("created_at", pyarrow.timestamp("us")),
+        ("updated_at", pyarrow.timestamp("us")),
+    ])
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd")
+    async for batch in batches:
+        columns = list(zip(*batch))
+        status_index = COLUMN_NAMES.index("status")
+        columns[status_index] = [status.value for status in columns[status_index]]
+        writer.write_table(pyarrow.table(columns, schema=schema))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+ENCODERS = {
+    "csv": encode_csv,
+    "ndjson": encode_ndjson,
+    "parquet": encode_parquet,
+}
+
+
+def stream_export(fmt: str, *queries) -> AsyncIterator[bytes]:
+    return ENCODERS[fmt](iter_batches(*queries))
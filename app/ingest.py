@@ -0,0 +1,130 @@
+"""
+Пакетная (write-behind) запись заявок.
+
+Вместо отдельного commit на каждую заявку submit_application кладет
+TicketCreate в ограниченную очередь, а фоновая задача пишет накопленное
+одной транзакцией - когда набралось batch_size заявок или прошло
+max_delay секунд с первой. Вызывающий ждет commit своей пачки и получает
+id заявки, как и раньше.
+
+Включается переменной окружения TICKET_BATCH_INGEST=1.
+"""
+import asyncio
+import logging
+
+from app import async_crud
+from app import config
+from app.database import db as db_s
+from app.schemas import TicketCreate
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueueFull(Exception):
+    """Очередь заполнена - клиенту стоит повторить запрос позже"""
+
+
+class TicketBatchWriter:
+    def __init__(self, batch_size: int, max_delay: float, queue_size: int):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.queue_size = queue_size
+        self._queue: asyncio.Queue | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._closing = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._closing
+
+    @property
+    def pending(self) -> int:
+        """Заявок в очереди, еще не записанных в БД"""
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self):
+        """Запускает фоновую задачу записи (на старте приложения)"""
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Перестает принимать заявки и дописывает все, что в очереди"""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    async def submit(self, ticket_data: TicketCreate) -> int:
+        """
+        Ставит заявку в очередь и ждет ее записи.
+        Возвращает id заявки, IngestQueueFull если очередь заполнена.
+        """
+        if not self.running:
+            raise RuntimeError("Пакетная запись не запущена")
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((ticket_data, future))
+        except asyncio.QueueFull:
+            raise IngestQueueFull()
+        self._wakeup.set()
+
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if self._queue.empty():
+                if self._closing:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # Первая заявка есть - добираем пачку до batch_size или max_delay
+            batch = [self._queue.get_nowait()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0 or self._closing:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[tuple[TicketCreate, asyncio.Future]]):
+        try:
+            async with db_s.AsyncSessionLocal() as db:
+                tickets = await async_crud.create_tickets(
+                    db, [ticket_data for ticket_data, _ in batch])
+        except Exception as e:
+            logger.error("Ошибка при записи пачки из %d заявок",
+                         len(batch), exc_info=True)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        # Клиент мог отключиться, не дождавшись ответа - future уже отменен
+        for (_, future), ticket in zip(batch, tickets):
+            if not future.done():
+                future.set_result(ticket.id)
+
+
+ticket_writer = TicketBatchWriter(
+    batch_size=config.TICKET_BATCH_SIZE,
+    max_delay=config.TICKET_BATCH_MAX_DELAY,
+    queue_size=config.TICKET_QUEUE_SIZE,
+)
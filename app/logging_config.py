@@ -0,0 +1,183 @@
+"""
+Настройка логирования приложения (app.main: при импорте и на старте
+каждого lifespan).
+
+- Записи уходят в очередь (QueueHandler), в поток/файл их пишет отдельный
+  поток QueueListener - обработчик запроса не ждет I/O.
+- Сообщение форматируется уже в потоке записи: logger.info("... %s", x)
+  ничего не собирает в строку, если запись отброшена по уровню.
+- Access-лог запросов - AccessLogMiddleware: структурные поля, выборка
+  (LOG_SAMPLE_RATE) и уровень по префиксу пути (LOG_ROUTE_LEVELS):
+  выше INFO - только ошибки 5xx, DEBUG - каждый запрос без выборки
+  и с подробностями (query, client, user_agent).
+"""
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from app import config
+
+# Стандартные атрибуты LogRecord - всё остальное пришло через extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "taskName"}
+
+_listener: QueueListener | None = None
+
+access_logger = logging.getLogger("app.access")
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON строка на запись, поля из extra= попадают на верхний уровень"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler без форматирования в вызывающем потоке: запись
+    передается как есть, форматирует ее обработчик в QueueListener.
+    Очередь в памяти процесса, поэтому pickle-совместимость не нужна.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging():
+    """
+    Настраивает корневой логгер: очередь + поток записи в stderr.
+    Повторный вызов после shutdown_logging снова запускает очередь.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if config.LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [DeferredQueueHandler(log_queue)]
+    root.setLevel(config.LOG_LEVEL)
+
+    _listener = QueueListener(
+        log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """
+    Дописывает очередь и останавливает поток записи. Дальше корневой
+    логгер пишет напрямую, без очереди: иначе записи уходили бы в очередь,
+    которую никто не читает.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        logging.getLogger().handlers = list(_listener.handlers)
+        _listener = None
+
+
+def parse_route_levels(value: str) -> list[tuple[str, int]]:
+    """"/health=WARNING,/admin=DEBUG" -> [("/health", 30), ("/admin", 10)]"""
+    levels = []
+    for item in value.split(","):
+        prefix, _, level = item.strip().partition("=")
+        if prefix and level:
+            levels.append((prefix, logging.getLevelName(level.strip().upper())))
+    # Самый длинный префикс проверяется первым
+    return sorted(levels, key=lambda item: len(item[0]), reverse=True)
+
+
+class AccessLogMiddleware:
+    """
+    ASGI middleware: одна структурная запись на запрос
+    (method, path, status, duration_ms). Уровень маршрута: выше INFO -
+    пишутся только ошибки 5xx, INFO - запросы с выборкой sample_rate,
+    DEBUG - все запросы и еще query, client и user_agent.
+    """
+
+    def __init__(self, app, sample_rate: float = 1.0,
+                 route_levels: list[tuple[str, int]] | None = None):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.route_levels = route_levels or []
+
+    def _level(self, path: str) -> int:
+        for prefix, level in self.route_levels:
+            if path.startswith(prefix):
+                return level
+        return logging.INFO
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self._log(scope, status_code, started)
+
+    def _log(self, scope, status_code: int, started: float):
+        route_level = self._level(scope["path"])
+        if status_code >= 500:
+            level = logging.ERROR
+        else:
+            # Уровень маршрута выше INFO - обычные запросы не пишем
+            if route_level > logging.INFO:
+                return
+            # DEBUG - без выборки
+            if (route_level > logging.DEBUG and self.sample_rate < 1.0
+                    and random.random() >= self.sample_rate):
+                return
+            level = logging.INFO
+
+        if not access_logger.isEnabledFor(level):
+            return
+
+        extra = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status_code,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+        if route_level <= logging.DEBUG:
+            client = scope.get("client")
+            extra.update(
+                query=scope.get("query_string", b"").decode("latin-1"),
+                client=client[0] if client else None,
+                user_agent=dict(scope["headers"]).get(b"user-agent", b"").decode("latin-1"),
+            )
+        access_logger.log(
+            level, "%s %s %s", scope["method"], scope["path"], status_code,
+            extra=extra)
@@ -1,22 +1,127 @@
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from app.database.db import engine, Base
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import text
+from app.database.db import engine, async_engine, init_db
 from app.models import Ticket
 from app.routers import public, admin
+from app.ingest import ticket_writer
+from app import config
+from app import passwords
+from app import metrics
+from app import notifications
+from app import events
+from app import shared
+from app import uploads
+from app import archive
+from app.throttling import SubmitGuardMiddleware, submit_ip_limiter
+from app.templating import CachedStaticFiles
+from app.responses import DefaultJSONResponse
+from app.logging_config import (
+    AccessLogMiddleware,
+    parse_route_levels,
+    setup_logging,
+    shutdown_logging,
+)
+import asyncio
 import logging
+import secrets
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+setup_logging()
+
+
+# Старт и остановка - в каждом процессе-воркере
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Выполняется при запуске сервера (до первого запроса) и при остановке.
+    Схема БД создается здесь, а не при импорте: под блокировкой, поэтому
+    одновременно стартующие воркеры не мешают друг другу.
+    """
+    # Очередь логов - заново, если процесс уже проходил lifespan (тесты)
+    setup_logging()
+    init_db()
+    uploads.UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+    if config.TICKET_BATCH_INGEST:
+        await ticket_writer.start()
+    # Уведомления - если настроен хотя бы один канал
+    if notifications.dispatcher.sinks:
+        await notifications.dispatcher.start()
+    # События SSE из всех воркеров
+    if config.SHARED_STATE_BACKEND != "memory":
+        await events.broker.start(shared.create_state())
+    if config.ARCHIVE_ENABLED:
+        await archive.archiver.start()
+
+    print("🚀 Сервер ДомиЛьоны запущен!")
+    print("📝 Документация API: http://127.0.0.1:8000/docs")
+
+    yield
+
+    # Сначала дописываем заявки из очереди, потом закрываем соединения
+    await ticket_writer.stop()
+    await archive.archiver.stop()
+    await notifications.dispatcher.stop()
+    await events.broker.stop()
+    await shared.close_all()
+    await async_engine.dispose()
+    passwords.shutdown()
+    uploads.shutdown()
+    shutdown_logging()
+    print("👋 Сервер остановлен")
+
 
-Base.metadata.create_all(bind=engine)
 # Инициализируем FastAPI приложение
 app = FastAPI(
     title="ДомиЛьоны - Система заявок",
     description="Backend для сайта строительной компании",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson, если установлен (app/responses.py)
+    default_response_class=DefaultJSONResponse,
+    lifespan=lifespan
 )
 # Подключаем статические файлы (CSS, JS, изображения)
-# Если у тебя есть папка static с CSS/JS - раскомментируй:
-# app.mount("/static", StaticFiles(directory="static"), name="static")
+# с Cache-Control, чтобы браузер не запрашивал их заново
+app.mount(
+    "/static",
+    CachedStaticFiles(directory=config.STATIC_DIR, check_dir=False),
+    name="static"
+)
+# Фото проектов: имя файла - хэш содержимого, кэшируются навсегда
+app.mount(
+    uploads.UPLOAD_URL,
+    CachedStaticFiles(directory=uploads.UPLOAD_DIR, check_dir=False,
+                      max_age=365 * 24 * 3600, immutable=True),
+    name="uploads"
+)
+
+# Лимит по IP и сброс нагрузки на приеме заявок - до разбора тела и БД
+app.add_middleware(
+    SubmitGuardMiddleware,
+    paths=("/api/submit-application",),
+    limiter=submit_ip_limiter if config.RATE_LIMIT_ENABLED else None,
+    max_concurrency=config.SUBMIT_MAX_CONCURRENCY,
+    trust_forwarded=config.RATE_LIMIT_TRUST_FORWARDED,
+)
+
+# Access-лог запросов (выборка и уровни по маршрутам - из настроек)
+app.add_middleware(
+    AccessLogMiddleware,
+    sample_rate=config.LOG_SAMPLE_RATE,
+    route_levels=parse_route_levels(config.LOG_ROUTE_LEVELS),
+)
+
+# Метрики запросов и SQL (/metrics)
+if config.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+    metrics.register_engine(engine, "sync")
+    metrics.register_engine(async_engine.sync_engine, "async")
 
 # Подключаем роутеры
 # Публичная часть (главная страница, API для заявок)
@@ -25,37 +130,58 @@ app.include_router(public.router, tags=["Public"])
 # Админка (будем делать дальше)
 app.include_router(admin.router, tags=["Admin"])
 
-# Корневой endpoint для проверки что сервер работает
+# Проверки для балансировщика / оркестратора
+
+
+async def check_database():
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
 
 
 @app.get("/health")
 async def health_check():
     """
-    Простая проверка здоровья сервера.
-    Полезно для мониторинга.
+    Проверка готовности (readiness): сервер работает и БД отвечает.
+    503 - если БД недоступна или не ответила за HEALTH_DB_TIMEOUT секунд.
     """
+    try:
+        await asyncio.wait_for(check_database(), config.HEALTH_DB_TIMEOUT)
+    except Exception as e:
+        logger.warning("Health check: БД недоступна: %r", e)
+        return JSONResponse(
+            status_code=503,
+            content={
+                "status": "unavailable",
+                "message": "БД недоступна",
+                "database": "error"
+            }
+        )
+
     return {
         "status": "ok",
-        "message": "Сервер работает"
+        "message": "Сервер работает",
+        "database": "ok"
     }
 
-# Это запустится при старте приложения
 
+@app.get("/health/live")
+async def liveness_check():
+    """Проверка жизни (liveness): процесс отвечает, БД не проверяется"""
+    return {"status": "ok"}
 
-@app.on_event("startup")
-async def startup_event():
-    """
-    Выполняется когда сервер запускается.
-    Здесь можно инициализировать соединения, кеши и т.д.
-    """
-    print("🚀 Сервер ДомиЛьоны запущен!")
-    print("📝 Документация API: http://127.0.0.1:8000/docs")
 
+if config.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint(request: Request):
+        """Метрики в текстовом формате Prometheus"""
+        if config.METRICS_TOKEN:
+            expected = f"Bearer {config.METRICS_TOKEN}"
+            if not secrets.compare_digest(
+                    request.headers.get("authorization", "").encode(),
+                    expected.encode()):
+                return PlainTextResponse("Unauthorized", status_code=401)
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    """
-    Выполняется при остановке сервера.
-    Закрываем соединения, сохраняем данные и т.д.
-    """
-    print("👋 Сервер остановлен")
+        return PlainTextResponse(
+            metrics.render(),
+            media_type="text/plain; version=0.0.4; charset=utf-8"
+        )
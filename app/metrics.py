@@ -0,0 +1,272 @@
+"""
+Метрики приложения в текстовом формате Prometheus (GET /metrics).
+
+- MetricsMiddleware: количество и длительность запросов по шаблону
+  маршрута (/admin/tickets/{ticket_id}, а не конкретный id), запросы
+  в обработке;
+- SQLAlchemy события: количество и время SQL запросов, в том числе
+  в пересчете на один HTTP запрос;
+- состояние пулов соединений и очередей снимается в момент опроса.
+
+Без внешних зависимостей: метрика - словарь значений по набору меток
+под одной блокировкой, запись - несколько операций со словарем.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from typing import Callable
+
+from sqlalchemy import Engine, event
+
+from app import config
+from app import events
+from app.ingest import ticket_writer
+
+# Границы корзин гистограмм (секунды)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.labels, key)} {_number(value)}"
+            for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # [количество по корзинам (+Inf последней), сумма]
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = [(key, list(counts), total)
+                      for key, (counts, total) in self._values.items()]
+        lines = self.header()
+        names = self.labels + ("le",)
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_labels(names, key + (_number(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+registry: list[Metric] = []
+
+# Функции, обновляющие gauge-метрики прямо перед опросом
+_collectors: list[Callable[[], None]] = []
+
+
+def collector(func: Callable[[], None]) -> Callable[[], None]:
+    _collectors.append(func)
+    return func
+
+
+def render() -> str:
+    for collect in _collectors:
+        collect()
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ============= HTTP =============
+
+http_requests = Counter(
+    "http_requests_total", "HTTP запросы", ("method", "route", "status"))
+http_duration = Histogram(
+    "http_request_duration_seconds", "Длительность HTTP запроса",
+    ("method", "route"))
+http_in_progress = Gauge(
+    "http_requests_in_progress", "HTTP запросы в обработке")
+http_db_queries = Histogram(
+    "http_request_db_queries", "SQL запросов на один HTTP запрос",
+    ("route",), buckets=QUERY_COUNT_BUCKETS)
+http_db_duration = Histogram(
+    "http_request_db_duration_seconds", "Время SQL запросов за один HTTP запрос",
+    ("route",), buckets=DB_LATENCY_BUCKETS)
+
+# ============= БД =============
+
+# Количество запросов - db_query_duration_seconds_count
+db_query_duration = Histogram(
+    "db_query_duration_seconds", "Длительность SQL запроса",
+    ("engine",), buckets=DB_LATENCY_BUCKETS)
+db_pool_size = Gauge("db_pool_size", "Размер пула соединений", ("engine",))
+db_pool_checked_out = Gauge(
+    "db_pool_checked_out", "Соединения, выданные из пула", ("engine",))
+db_pool_overflow = Gauge(
+    "db_pool_overflow", "Соединения сверх pool_size", ("engine",))
+
+# [количество запросов, время] SQL в рамках текущего HTTP запроса
+_request_db: contextvars.ContextVar[list | None] = contextvars.ContextVar(
+    "request_db", default=None)
+
+_engines: dict[str, Engine] = {}
+
+
+def register_engine(engine: Engine, name: str):
+    """
+    Пул движка (для async - engine.sync_engine) попадает в метрики,
+    SQL запросы - если включен METRICS_DB_QUERIES
+    """
+    _engines[name] = engine
+    if config.METRICS_DB_QUERIES:
+        instrument_engine(engine, name)
+
+
+def instrument_engine(engine: Engine, name: str):
+    """Подписывает движок на SQL события"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        db_query_duration.observe(elapsed, name)
+        request_db = _request_db.get()
+        if request_db is not None:
+            request_db[0] += 1
+            request_db[1] += elapsed
+
+
+@collector
+def collect_pools():
+    for name, engine in _engines.items():
+        pool = engine.pool
+        # У StaticPool / NullPool этих счетчиков нет
+        if hasattr(pool, "checkedout"):
+            db_pool_size.set(name, value=pool.size())
+            db_pool_checked_out.set(name, value=pool.checkedout())
+            db_pool_overflow.set(name, value=max(pool.overflow(), 0))
+
+
+# ============= ОЧЕРЕДИ =============
+
+ingest_pending = Gauge(
+    "ticket_ingest_pending", "Заявки в очереди пакетной записи")
+sse_subscribers = Gauge(
+    "sse_subscribers", "Открытые подключения к /admin/events")
+
+
+@collector
+def collect_queues():
+    ingest_pending.set(value=ticket_writer.pending)
+    sse_subscribers.set(value=events.broker.subscribers)
+
+
+# ============= MIDDLEWARE =============
+
+
+class MetricsMiddleware:
+    """ASGI middleware: метрики по каждому HTTP запросу"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+        request_db = [0, 0.0]
+        token = _request_db.set(request_db)
+        http_in_progress.inc()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_progress.dec()
+            _request_db.reset(token)
+            # Шаблон маршрута, а не путь - иначе метрика на каждый id;
+            # все, что не нашлось (404 сканеров и т.п.) - одной строкой
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            http_requests.inc(method, route, status_code)
+            http_duration.observe(time.perf_counter() - started, method, route)
+            http_db_queries.observe(request_db[0], route)
+            http_db_duration.observe(request_db[1], route)
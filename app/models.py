@@ -1,8 +1,9 @@
-from sqlalchemy import String, Integer, Enum as SQLEnum
+from sqlalchemy import String, Integer, Float, DateTime, Index, JSON, Enum as SQLEnum
 from datetime import datetime
 from app.database.db import Base
-from sqlalchemy.orm import mapped_column, Mapped
-from app.enums import TicketStatus
+from app.database import fts
+from sqlalchemy.orm import mapped_column, Mapped, query_expression
+from app.enums import TicketStatus, NotificationStatus
 from zoneinfo import ZoneInfo
 
 
@@ -10,6 +11,8 @@ class Ticket(Base):
     """Таблица заявок"""
     __tablename__ = 'tickets'
 
+    archived = False
+
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
 
     email: Mapped[str] = mapped_column(String, nullable=False, index=True)
@@ -25,11 +28,222 @@ class Ticket(Base):
 
     project_type: Mapped[str] = mapped_column(String, nullable=True)
 
+    # Клиент (app.customers). Без ForeignKey, как и в остальных таблицах;
+    # NULL - заявка еще не связана (до customers.backfill)
+    customer_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
     created_at: Mapped[datetime] = mapped_column(
         default=lambda: datetime.now(ZoneInfo('Europe/Moscow')))
     updated_at: Mapped[datetime | None] = mapped_column(
         default=None, onupdate=lambda: datetime.now(ZoneInfo('Europe/Moscow')))
 
+    # Релевантность при полнотекстовом поиске (заполняется только в поиске)
+    search_rank: Mapped[float | None] = query_expression()
+
+    __table_args__ = (
+        # Пагинация по курсору: ORDER BY created_at DESC, id DESC
+        Index("ix_tickets_created_at_id", "created_at", "id"),
+        # То же с фильтром по статусу + GROUP BY status для статистики
+        Index("ix_tickets_status_created_at_id", "status", "created_at", "id"),
+        # Предыдущие заявки клиента: status в индексе - читается без таблицы
+        Index("ix_tickets_customer_id_created_at_id_status",
+              "customer_id", "created_at", "id", "status"),
+        # id не выдается повторно: без AUTOINCREMENT SQLite дал бы новой
+        # заявке id последней, перенесенной в архив или удаленной
+        {"sqlite_autoincrement": True},
+    )
+
+
+fts.register(Ticket.__table__)
+
+
+class ArchivedTicket(Base):
+    """
+    Архив закрытых заявок: те же колонки, что у tickets, и время переноса.
+    Заявки переносит app.archive, id сохраняется.
+    """
+    __tablename__ = 'tickets_archive'
+
+    # Для шаблонов: заявка из архива
+    archived = True
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+
+    email: Mapped[str] = mapped_column(String, nullable=False, index=True)
+
+    name: Mapped[str] = mapped_column(String, nullable=False)
+
+    phone: Mapped[str] = mapped_column(String, nullable=False)
+
+    status: Mapped[TicketStatus] = mapped_column(SQLEnum(TicketStatus))
+
+    message: Mapped[str] = mapped_column(String, nullable=True)
+
+    project_type: Mapped[str] = mapped_column(String, nullable=True)
+
+    customer_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    archived_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    search_rank: Mapped[float | None] = query_expression()
+
+    __table_args__ = (
+        Index("ix_tickets_archive_created_at_id", "created_at", "id"),
+        Index("ix_tickets_archive_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_tickets_archive_customer_id_created_at_id_status",
+              "customer_id", "created_at", "id", "status"),
+    )
+
+
+fts.register(ArchivedTicket.__table__)
+
+
+class Customer(Base):
+    """
+    Клиент: нормализованные контакты, по которым связаны его заявки
+    (tickets.customer_id). Ведется в app.customers при создании заявок.
+    """
+    __tablename__ = 'customers'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    # В нижнем регистре
+    email: Mapped[str] = mapped_column(String, nullable=False, unique=True)
+
+    # E.164 (+79991234567), последний известный; NULL - номер не разобрать
+    phone: Mapped[str | None] = mapped_column(String, nullable=True, index=True)
+
+    # Имя из последней заявки
+    name: Mapped[str] = mapped_column(String, nullable=False)
+
+    first_seen_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    last_seen_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class TicketStatusChange(Base):
+    """
+    История статусов заявки: одна строка на создание (from_status = NULL)
+    и на каждую смену статуса. Заполняется в app.analytics.
+    """
+    __tablename__ = 'ticket_status_changes'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    # Без ForeignKey: история остается и после удаления заявки. id заявок
+    # не выдаются повторно (sqlite_autoincrement у tickets), поэтому
+    # история удаленной заявки не достается новой
+    ticket_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+
+    from_status: Mapped[TicketStatus | None] = mapped_column(
+        SQLEnum(TicketStatus), nullable=True)
+
+    to_status: Mapped[TicketStatus] = mapped_column(
+        SQLEnum(TicketStatus), nullable=False)
+
+    project_type: Mapped[str] = mapped_column(String, nullable=False, default="")
+
+    changed_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    # Секунды от создания заявки до этой смены статуса
+    seconds_since_created: Mapped[float] = mapped_column(
+        Float, nullable=False, default=0)
+
+
+class TicketRollup(Base):
+    """
+    Агрегаты по заявкам: сколько заявок перешло в статус status
+    (создание = переход в new) за час / день / месяц по project_type.
+    Обновляется инкрементально в app.analytics, читается аналитикой
+    вместо полного прохода по tickets.
+    """
+    __tablename__ = 'ticket_rollups'
+
+    # hour / day / month
+    granularity: Mapped[str] = mapped_column(String, primary_key=True)
+
+    # Начало интервала, локальное время (как created_at)
+    bucket: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+
+    status: Mapped[TicketStatus] = mapped_column(
+        SQLEnum(TicketStatus), primary_key=True)
+
+    # '' - тип проекта не указан (NULL в первичном ключе нельзя)
+    project_type: Mapped[str] = mapped_column(String, primary_key=True)
+
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    # Сумма seconds_since_created - для среднего времени до статуса
+    seconds_total: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+
+    # Наименьшее и наибольшее seconds_since_created - границы перцентилей
+    # по гистограмме. Как и гистограмма, только у granularity = day
+    seconds_min: Mapped[float | None] = mapped_column(Float, nullable=True)
+    seconds_max: Mapped[float | None] = mapped_column(Float, nullable=True)
+
+
+# Гистограмма seconds_since_created в агрегатах за день - по ней считаются
+# медиана и перцентили. Верхние границы интервалов (включительно), секунды;
+# последний интервал - больше года
+_HOUR = 3600
+_DAY = 24 * _HOUR
+DURATION_BUCKETS = (
+    60, 300, 900, 1800, _HOUR, 2 * _HOUR, 3 * _HOUR, 4 * _HOUR, 6 * _HOUR,
+    8 * _HOUR, 12 * _HOUR, 18 * _HOUR, _DAY, 36 * _HOUR, 2 * _DAY, 3 * _DAY,
+    4 * _DAY, 5 * _DAY, 7 * _DAY, 10 * _DAY, 14 * _DAY, 21 * _DAY, 30 * _DAY,
+    45 * _DAY, 60 * _DAY, 90 * _DAY, 180 * _DAY, 365 * _DAY,
+)
+# Колонки ticket_rollups.duration_00 ... - сколько переходов попало
+# в интервал. Заполнены только у granularity = day; NULL у дня - строка
+# посчитана до появления гистограммы или seconds_min / seconds_max
+# (заполняет python -m app.backfill)
+DURATION_COLUMNS = [f"duration_{index:02d}"
+                    for index in range(len(DURATION_BUCKETS) + 1)]
+for _name in DURATION_COLUMNS:
+    setattr(TicketRollup, _name, mapped_column(_name, Integer, nullable=True))
+
+
+class Notification(Base):
+    """
+    Outbox уведомлений о заявках: пишется в одной транзакции с заявкой,
+    отправляется фоновой задачей из app.notifications
+    """
+    __tablename__ = 'notifications'
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+    # Без ForeignKey: уведомление о заявке уходит, даже если ее уже удалили
+    ticket_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+
+    # email / webhook
+    channel: Mapped[str] = mapped_column(String, nullable=False)
+
+    # Данные заявки на момент создания
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)
+
+    status: Mapped[NotificationStatus] = mapped_column(
+        SQLEnum(NotificationStatus), nullable=False,
+        default=NotificationStatus.pending)
+
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    # Когда отправлять (следующая попытка или конец аренды)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    last_error: Mapped[str | None] = mapped_column(String, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Выборка готовых к отправке: status = pending AND next_attempt_at <= now
+        Index("ix_notifications_status_next_attempt_at",
+              "status", "next_attempt_at"),
+    )
+
 
 class AdminUser(Base):
     """Таблица админ пользователей"""
@@ -37,7 +251,8 @@ class AdminUser(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
 
-    username: Mapped[str] = mapped_column(String, nullable=False)
+    username: Mapped[str] = mapped_column(
+        String, nullable=False, unique=True, index=True)
 
     hashed_password: Mapped[int] = mapped_column(Integer, nullable=False)
 
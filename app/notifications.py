@@ -0,0 +1,508 @@
+"""
+Уведомления отдела продаж о новых заявках (email и webhook).
+
+Transactional outbox: при создании заявки в той же транзакции в таблицу
+notifications пишется по строке на каждый включенный канал. Запрос
+клиента не ждет SMTP или HTTP, а если процесс упадет после commit,
+уведомления останутся в таблице и уйдут после перезапуска.
+
+NotificationDispatcher - фоновая задача. Забирает пачку готовых строк
+одним UPDATE ... RETURNING (аренда на NOTIFY_LEASE секунд, поэтому
+несколько процессов не отправят одно и то же), отправляет через
+постоянное SMTP соединение и пул HTTP соединений. Ошибка - следующая
+попытка через экспоненциально растущую задержку, после
+NOTIFY_MAX_ATTEMPTS попыток - статус dead (страница /admin/notifications,
+оттуда их можно отправить заново).
+
+Доставка "хотя бы один раз": получатель webhook может увидеть
+уведомление повторно и должен различать их по id.
+"""
+import asyncio
+import hashlib
+import hmac
+import importlib.util
+import json
+import logging
+import random
+import smtplib
+from datetime import timedelta
+from email.message import EmailMessage
+from typing import Protocol
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import analytics
+from app import config
+from app.database import db as db_s
+from app.enums import NotificationStatus
+from app.models import Notification
+
+logger = logging.getLogger(__name__)
+
+# Длина last_error в БД
+MAX_ERROR_LENGTH = 500
+
+
+def ticket_payload(ticket) -> dict:
+    """Данные заявки для уведомления (JSON-совместимые)"""
+    return {
+        "id": ticket.id,
+        "name": ticket.name,
+        "email": ticket.email,
+        "phone": ticket.phone,
+        "message": ticket.message,
+        "project_type": ticket.project_type,
+        "created_at": analytics.local_time(ticket.created_at).isoformat(),
+    }
+
+
+def outbox_rows(tickets, channels: list[str]) -> list[dict]:
+    moment = analytics.now()
+    return [
+        {
+            "ticket_id": ticket.id,
+            "channel": channel,
+            "payload": ticket_payload(ticket),
+            "status": NotificationStatus.pending,
+            "attempts": 0,
+            "next_attempt_at": moment,
+            "created_at": moment,
+        }
+        for ticket in tickets
+        for channel in channels
+    ]
+
+
+def enqueue(db: Session, tickets):
+    """
+    Добавляет уведомления о новых заявках в текущую транзакцию
+    (commit и dispatcher.wake() - за вызывающим)
+    """
+    rows = outbox_rows(tickets, dispatcher.channels)
+    if rows:
+        db.execute(insert(Notification), rows)
+
+
+async def enqueue_async(db: AsyncSession, tickets):
+    """Асинхронный вариант enqueue"""
+    rows = outbox_rows(tickets, dispatcher.channels)
+    if rows:
+        await db.execute(insert(Notification), rows)
+
+
+def retry_delay(attempts: int, base: float, maximum: float) -> float:
+    """
+    Задержка перед следующей попыткой: base * 2^(attempts-1), не больше
+    maximum, из них случайная половина - чтобы после сбоя получателя
+    повторы не приходили одной волной
+    """
+    delay = min(maximum, base * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _error_text(error: BaseException) -> str:
+    return (f"{type(error).__name__}: {error}")[:MAX_ERROR_LENGTH]
+
+
+# ============= КАНАЛЫ =============
+
+
+class Sink(Protocol):
+    channel: str
+
+    async def deliver(self, batch: list[dict]) -> list[str | None]:
+        """Отправляет пачку; по каждому уведомлению - None или текст ошибки"""
+
+    async def close(self):
+        ...
+
+
+class EmailSink:
+    """
+    Письмо на каждую заявку через одно SMTP соединение, которое держится
+    открытым между пачками. Живо ли оно, перед письмами не проверяется
+    (NOOP - лишний обмен на каждое письмо): если сервер закрыл его, пока
+    оно простаивало, письмо отправляется заново через новое соединение.
+    smtplib блокирующий - работает в потоке.
+    """
+    channel = "email"
+
+    def __init__(self, host: str, port: int, sender: str, recipients: list[str],
+                 username: str = "", password: str = "", starttls: bool = False,
+                 timeout: float = 10):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = recipients
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self._smtp: smtplib.SMTP | None = None
+
+    def _send(self, message: EmailMessage):
+        if self._smtp is not None:
+            try:
+                self._smtp.send_message(message)
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._disconnect()
+        self._connect().send_message(message)
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self._smtp = smtp
+        return smtp
+
+    def _disconnect(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+
+    def message(self, payload: dict) -> EmailMessage:
+        message = EmailMessage()
+        message["Subject"] = f"Новая заявка #{payload['id']} - {payload['name']}"
+        message["From"] = self.sender
+        message["To"] = ", ".join(self.recipients)
+        message["Reply-To"] = payload["email"]
+        message.set_content("\n".join([
+            f"Заявка #{payload['id']} от {payload['created_at']}",
+            "",
+            f"Имя: {payload['name']}",
+            f"Email: {payload['email']}",
+            f"Телефон: {payload['phone']}",
+            f"Тип проекта: {payload.get('project_type') or '-'}",
+            "",
+            payload.get("message") or "",
+        ]))
+        return message
+
+    def send_batch(self, batch: list[dict]) -> list[str | None]:
+        results: list[str | None] = []
+        for notification in batch:
+            try:
+                self._send(self.message(notification["payload"]))
+                results.append(None)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+                    smtplib.SMTPDataError) as e:
+                # Сервер отказал в этом письме - соединение живо
+                results.append(_error_text(e))
+            except (smtplib.SMTPException, OSError) as e:
+                # Соединение потеряно: остаток пачки - в следующую попытку
+                self._disconnect()
+                error = _error_text(e)
+                results.extend([error] * (len(batch) - len(results)))
+                break
+        return results
+
+    async def deliver(self, batch: list[dict]) -> list[str | None]:
+        return await asyncio.to_thread(self.send_batch, batch)
+
+    async def close(self):
+        await asyncio.to_thread(self._disconnect)
+
+
+class WebhookSink:
+    """
+    Вся пачка - один POST {"notifications": [...]} через пул соединений
+    httpx. Ответ 2xx - доставлено все, иначе вся пачка уходит на повтор.
+    httpx (не обязателен) импортируется при первой отправке.
+    """
+    channel = "webhook"
+
+    def __init__(self, url: str, secret: str = "", timeout: float = 10,
+                 max_connections: int = 4):
+        if importlib.util.find_spec("httpx") is None:
+            raise RuntimeError("Для webhook уведомлений нужен пакет httpx")
+        self.url = url
+        self.secret = secret.encode()
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    def body(self, batch: list[dict]) -> bytes:
+        return json.dumps({
+            "notifications": [
+                {"id": notification["id"], "event": "ticket_created",
+                 "ticket": notification["payload"]}
+                for notification in batch
+            ]
+        }, ensure_ascii=False).encode()
+
+    async def deliver(self, batch: list[dict]) -> list[str | None]:
+        import httpx
+        body = self.body(batch)
+        headers = {"Content-Type": "application/json"}
+        if self.secret:
+            digest = hmac.new(self.secret, body, hashlib.sha256).hexdigest()
+            headers["X-Signature"] = f"sha256={digest}"
+        try:
+            response = await self._get_client().post(self.url, content=body, headers=headers)
+        except httpx.HTTPError as e:
+            error = _error_text(e)
+        else:
+            if response.is_success:
+                return [None] * len(batch)
+            error = f"HTTP {response.status_code}: {response.text[:200]}"
+        return [error] * len(batch)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+
+
+def create_sinks() -> dict[str, Sink]:
+    """Каналы, для которых в настройках заданы получатели"""
+    sinks = {}
+    recipients = [address.strip() for address in config.NOTIFY_EMAIL_TO.split(",")
+                  if address.strip()]
+    if recipients:
+        sinks["email"] = EmailSink(
+            config.NOTIFY_SMTP_HOST, config.NOTIFY_SMTP_PORT,
+            config.NOTIFY_EMAIL_FROM, recipients,
+            username=config.NOTIFY_SMTP_USER,
+            password=config.NOTIFY_SMTP_PASSWORD,
+            starttls=config.NOTIFY_SMTP_STARTTLS,
+            timeout=config.NOTIFY_TIMEOUT,
+        )
+    if config.NOTIFY_WEBHOOK_URL:
+        sinks["webhook"] = WebhookSink(
+            config.NOTIFY_WEBHOOK_URL,
+            secret=config.NOTIFY_WEBHOOK_SECRET,
+            timeout=config.NOTIFY_TIMEOUT,
+        )
+    return sinks
+
+
+# ============= ОТПРАВКА =============
+
+
+class NotificationDispatcher:
+    def __init__(self, sinks: dict[str, Sink], batch_size: int,
+                 poll_interval: float, lease: float, max_attempts: int,
+                 retry_base: float, retry_max: float):
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._closing = False
+
+    @property
+    def channels(self) -> list[str]:
+        """Каналы, в которые пишутся уведомления о новых заявках"""
+        return list(self.sinks)
+
+    async def start(self):
+        """Запускает фоновую отправку (на старте приложения)"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Дожидается текущей пачки и закрывает соединения"""
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        for sink in self.sinks.values():
+            await sink.close()
+
+    def wake(self):
+        """
+        Проверить outbox сейчас, не дожидаясь poll_interval (после commit
+        новой заявки). Можно вызывать из других потоков.
+        """
+        if self._loop is None or self._closing:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        while not self._closing:
+            self._wakeup.clear()
+            try:
+                processed = await self.run_once()
+            except Exception:
+                logger.error("Ошибка при отправке уведомлений", exc_info=True)
+                processed = 0
+            # Полная пачка - скорее всего, есть еще; иначе ждем
+            if processed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run_once(self) -> int:
+        """Забирает и отправляет одну пачку, возвращает ее размер"""
+        async with db_s.AsyncSessionLocal() as db:
+            batch = await self._claim(db)
+        if not batch:
+            return 0
+
+        by_channel: dict[str, list[dict]] = {}
+        for notification in batch:
+            by_channel.setdefault(notification["channel"], []).append(notification)
+
+        results: dict[int, str | None] = {}
+        for channel, notifications in by_channel.items():
+            sink = self.sinks.get(channel)
+            if sink is None:
+                errors = [f"Канал {channel} не настроен"] * len(notifications)
+            else:
+                try:
+                    errors = await sink.deliver(notifications)
+                except Exception as e:
+                    logger.error("Ошибка канала %s", channel, exc_info=True)
+                    errors = [_error_text(e)] * len(notifications)
+            for notification, error in zip(notifications, errors):
+                results[notification["id"]] = error
+
+        async with db_s.AsyncSessionLocal() as db:
+            await self._record(db, batch, results)
+        return len(batch)
+
+    async def _claim(self, db: AsyncSession) -> list[dict]:
+        """Арендует до batch_size готовых уведомлений одним UPDATE"""
+        moment = analytics.now()
+        due = (
+            (Notification.status == NotificationStatus.pending)
+            & (Notification.next_attempt_at <= moment)
+        )
+        ids = (
+            select(Notification.id).where(due)
+            .order_by(Notification.next_attempt_at, Notification.id)
+            .limit(self.batch_size)
+        )
+        rows = await db.execute(
+            update(Notification)
+            .where(Notification.id.in_(ids), due)
+            .values(next_attempt_at=moment + timedelta(seconds=self.lease))
+            .returning(Notification.id, Notification.channel,
+                       Notification.payload, Notification.attempts)
+            .execution_options(synchronize_session=False)
+        )
+        batch = [row._asdict() for row in rows]
+        await db.commit()
+        return batch
+
+    async def _record(self, db: AsyncSession, batch: list[dict],
+                      results: dict[int, str | None]):
+        moment = analytics.now()
+        changes = []
+        failed = dead = 0
+        for notification in batch:
+            error = results.get(notification["id"], "Нет результата отправки")
+            attempts = notification["attempts"] + 1
+            change = {"id": notification["id"], "attempts": attempts,
+                      "last_error": error}
+            if error is None:
+                change.update(status=NotificationStatus.sent, sent_at=moment)
+            elif attempts >= self.max_attempts:
+                change["status"] = NotificationStatus.dead
+                dead += 1
+            else:
+                change["next_attempt_at"] = moment + timedelta(seconds=retry_delay(
+                    attempts, self.retry_base, self.retry_max))
+                failed += 1
+            changes.append(change)
+
+        # UPDATE по первичному ключу пачкой (executemany)
+        for keys in {tuple(change) for change in changes}:
+            await db.execute(
+                update(Notification),
+                [change for change in changes if tuple(change) == keys])
+        await db.commit()
+
+        if failed or dead:
+            logger.warning("Уведомления: %d отправлено, %d отложено, %d в dead",
+                           len(batch) - failed - dead, failed, dead)
+
+
+dispatcher = NotificationDispatcher(
+    sinks=create_sinks(),
+    batch_size=config.NOTIFY_BATCH_SIZE,
+    poll_interval=config.NOTIFY_POLL_INTERVAL,
+    lease=config.NOTIFY_LEASE,
+    max_attempts=config.NOTIFY_MAX_ATTEMPTS,
+    retry_base=config.NOTIFY_RETRY_BASE,
+    retry_max=config.NOTIFY_RETRY_MAX,
+)
+
+
+# ============= АДМИНКА =============
+
+
+async def get_status_counts(db: AsyncSession) -> dict[str, int]:
+    rows = await db.execute(
+        select(Notification.status, func.count()).group_by(Notification.status))
+    counts = {status.value: 0 for status in NotificationStatus}
+    counts.update({status.value: count for status, count in rows})
+    return counts
+
+
+async def get_dead(db: AsyncSession, limit: int = 100) -> list[Notification]:
+    """Последние уведомления, попытки отправки которых закончились"""
+    result = await db.scalars(
+        select(Notification)
+        .where(Notification.status == NotificationStatus.dead)
+        .order_by(Notification.id.desc())
+        .limit(limit))
+    return list(result)
+
+
+async def retry_dead(db: AsyncSession, ids: list[int] | None = None) -> int:
+    """
+    Возвращает dead уведомления (все или ids) в очередь с нулевым
+    счетчиком попыток. Возвращает их количество.
+    """
+    query = (
+        update(Notification)
+        .where(Notification.status == NotificationStatus.dead)
+        .values(status=NotificationStatus.pending, attempts=0,
+                next_attempt_at=analytics.now())
+        .execution_options(synchronize_session=False)
+    )
+    if ids is not None:
+        query = query.where(Notification.id.in_(ids))
+    result = await db.execute(query)
+    await db.commit()
+    dispatcher.wake()
+    return result.rowcount
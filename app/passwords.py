@@ -0,0 +1,96 @@
+"""
+Хеширование и проверка паролей (Argon2).
+
+Argon2 намеренно тяжелый по CPU и памяти, поэтому в async-коде пароли
+проверяются в отдельном пуле потоков (argon2-cffi отпускает GIL), а не в
+event loop. Пул ограничен по размеру и по длине очереди: при шторме
+попыток входа лишние запросы сразу получают PasswordQueueFull.
+
+passlib и argon2 импортируются при первой проверке или хешировании, а не
+при старте воркера.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from app import config
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+# Контекст для хеширования паролей (_get_context)
+_pwd_context: "CryptContext | None" = None
+_executor: ThreadPoolExecutor | None = None
+# Проверок в работе + в очереди пула
+_pending = 0
+
+
+class PasswordQueueFull(Exception):
+    """Слишком много проверок паролей в очереди"""
+
+
+def _get_context() -> "CryptContext":
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(
+            schemes=["argon2"],
+            deprecated="auto",
+            argon2__time_cost=config.ARGON2_TIME_COST,
+            argon2__memory_cost=config.ARGON2_MEMORY_COST,
+            argon2__parallelism=config.ARGON2_PARALLELISM,
+        )
+    return _pwd_context
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Проверяет соответствие пароля хешу"""
+    return _get_context().verify(plain_password, hashed_password)
+
+
+def get_password_hash(password: str) -> str:
+    """Хеширует пароль"""
+    return _get_context().hash(password)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=config.PASSWORD_WORKERS,
+            thread_name_prefix="argon2")
+    return _executor
+
+
+async def _run(func, *args):
+    global _pending
+    if config.PASSWORD_WORKERS <= 0:
+        return func(*args)
+
+    if _pending >= config.PASSWORD_WORKERS + config.PASSWORD_QUEUE_LIMIT:
+        raise PasswordQueueFull()
+
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), func, *args)
+    finally:
+        _pending -= 1
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password в пуле потоков, не блокирует event loop"""
+    return await _run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash в пуле потоков, не блокирует event loop"""
+    return await _run(get_password_hash, password)
+
+
+def shutdown():
+    """Останавливает пул (при остановке приложения)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
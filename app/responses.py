@@ -0,0 +1,40 @@
+"""
+JSON ответ по умолчанию для API.
+
+С orjson - ORJSONResponse: datetime, enum и словари строк кодируются
+сразу в байты, в разы быстрее json.dumps. Без orjson - стандартный
+json с тем же форматом (datetime в ISO 8601, enum - значением), чтобы
+эндпоинты могли отдавать строки из БД, не прогоняя их через Pydantic.
+"""
+import enum
+import json
+from datetime import date, datetime
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson не обязателен - без него стандартный json
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class StdJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return json.dumps(
+            content,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+            default=_default,
+        ).encode("utf-8")
+
+
+DefaultJSONResponse = ORJSONResponse if orjson is not None else StdJSONResponse
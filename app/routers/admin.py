@@ -1,35 +1,48 @@
-from fastapi import APIRouter, Depends, Request, Form, UploadFile, File, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from app.database.db import get_db
+from fastapi import APIRouter, Depends, Request, Form, HTTPException, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.db import get_async_db, AsyncSessionLocal
 from app.models import AdminUser
 from app.schemas import (
     AdminUserLogin,
     TicketUpdate,
+    TicketPage,
+    TicketResponse,
+    TicketBulkSelection,
+    TicketBulkStatusUpdate,
+    TicketBulkResult,
+    TicketRollupSeries,
+    TicketDurationStats,
+    TicketStatusChangeResponse,
+    PhotoUploadResult,
 )
-from app import crud
+from app import async_crud
+from app import export
+from app import events
+from app import analytics
+from app import notifications
+from app import uploads
+from app import config
+from app.passwords import PasswordQueueFull
+from app.responses import DefaultJSONResponse
+from app.throttling import client_ip, login_throttle
+from app.templating import templates
 from app.dependencies import (
     get_current_admin_from_cookie,
     create_access_token,
     get_current_admin
 )
 from app.enums import TicketStatus
-from datetime import timedelta
+from datetime import date, datetime, timedelta
 import logging
-import shutil
-import os
-from pathlib import Path
-from typing import Optional
+from typing import Literal, Optional
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
-templates = Jinja2Templates(directory="templates")
 
-# Настройка папки для загрузки файлов
-UPLOAD_DIR = Path("static/uploads/projects")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+# Заявок на одной странице списка
+TICKETS_PAGE_SIZE = 50
 
 # ============= АВТОРИЗАЦИЯ =============
 
@@ -46,8 +59,8 @@ async def login_page(request: Request):
     if token:
         try:
             # Если токен валидный - сразу на дашборд
-            db = next(get_db())
-            admin = get_current_admin_from_cookie(request, db)
+            async with AsyncSessionLocal() as db:
+                admin = await get_current_admin_from_cookie(request, db)
             if admin:
                 return RedirectResponse(url="/admin/dashboard", status_code=303)
         except:
@@ -64,7 +77,7 @@ async def login(
     request: Request,
     username: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Обработка формы входа.
@@ -74,8 +87,34 @@ async def login(
     3. Устанавливает cookie с токеном
     4. Редирект на дашборд
     """
+    # Ограничиваем число попыток с одного IP до проверки пароля
+    # (за reverse proxy - IP из X-Forwarded-For, как у приема заявок)
+    ip = client_ip(request.scope, config.RATE_LIMIT_TRUST_FORWARDED)
+    retry_after = await login_throttle.hit(ip)
+    if retry_after:
+        return templates.TemplateResponse(
+            "admin/login.html",
+            {
+                "request": request,
+                "error": "Слишком много попыток входа. Попробуйте позже."
+            },
+            status_code=429,
+            headers={"Retry-After": str(int(retry_after) + 1)}
+        )
+
     # Проверяем учетные данные
-    admin = crud.authenticate_admin(db, username, password)
+    try:
+        admin = await async_crud.authenticate_admin(db, username, password)
+    except PasswordQueueFull:
+        return templates.TemplateResponse(
+            "admin/login.html",
+            {
+                "request": request,
+                "error": "Сервер перегружен. Попробуйте через несколько секунд."
+            },
+            status_code=503,
+            headers={"Retry-After": "1"}
+        )
 
     if not admin:
         return templates.TemplateResponse(
@@ -86,6 +125,8 @@ async def login(
             }
         )
 
+    await login_throttle.reset(ip)
+
     # Создаем JWT токен
     access_token = create_access_token(
         data={"sub": admin.username},
@@ -104,7 +145,7 @@ async def login(
         samesite="lax"  # CSRF защита
     )
 
-    logger.info(f"Админ {admin.username} вошел в систему")
+    logger.info("Админ %s вошел в систему", admin.username)
 
     return response
 
@@ -126,7 +167,7 @@ async def logout():
 @router.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     admin: AdminUser = Depends(get_current_admin_from_cookie)
 ):
     """
@@ -137,17 +178,13 @@ async def dashboard(
     - Количество проектов
     - Последние заявки
     """
-    # Статистика по заявкам
-    tickets_stats = {}
-    for status in TicketStatus:
-        count = db.query(crud.Ticket).filter(
-            crud.Ticket.status == status).count()
-        tickets_stats[status.value] = count
+    # Статистика по заявкам (один GROUP BY, дальше - из снимка в памяти)
+    tickets_stats = await async_crud.get_ticket_stats(db)
 
     total_tickets = sum(tickets_stats.values())
 
     # Последние 5 заявок
-    recent_tickets = crud.get_tickets(db, limit=5)
+    recent_tickets = await async_crud.get_tickets(db, limit=5)
 
     return templates.TemplateResponse(
         "admin/dashboard.html",
@@ -160,6 +197,31 @@ async def dashboard(
         }
     )
 
+
+
+@router.get("/events")
+async def events_stream(
+    db: AsyncSession = Depends(get_async_db),
+    admin: AdminUser = Depends(get_current_admin_from_cookie)
+):
+    """
+    Server-Sent Events для страниц админки: новые заявки, смена статусов,
+    удаления и обновленная статистика. Первым приходит событие stats.
+    """
+    stats = await async_crud.get_ticket_stats(db)
+    # Соединение с БД потоку не нужно - возвращаем его в пул сразу
+    await db.close()
+
+    return StreamingResponse(
+        events.sse_stream(initial=[events.sse_frame("stats", {"stats": stats})]),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Отключаем буферизацию в nginx
+            "X-Accel-Buffering": "no",
+        }
+    )
+
 # ============= УПРАВЛЕНИЕ ЗАЯВКАМИ =============
 
 
@@ -168,13 +230,15 @@ async def tickets_page(
     request: Request,
     status: Optional[str] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
     admin: AdminUser = Depends(get_current_admin_from_cookie)
 ):
     """
     Страница со списком всех заявок.
 
-    Поддерживает фильтрацию по статусу и поиск.
+    Поддерживает фильтрацию по статусу, поиск и постраничный
+    просмотр по курсору (?cursor=...).
     """
     # Преобразуем строку статуса в Enum
     status_filter = None
@@ -183,18 +247,28 @@ async def tickets_page(
             status_filter = TicketStatus(status)
         except ValueError:
             pass
-    logger.info(status)
     # Получаем заявки с фильтрами
-    tickets = crud.get_tickets(
-        db,
-        status=status_filter,
-        search=search,
-        limit=100
-    )
+    try:
+        tickets, next_cursor = await async_crud.get_tickets_page(
+            db,
+            status=status_filter,
+            search=search,
+            cursor=cursor,
+            limit=TICKETS_PAGE_SIZE
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверный курсор")
+
+    next_page_url = None
+    if next_cursor:
+        next_page_url = str(request.url.include_query_params(
+            cursor=next_cursor))
+    first_page_url = None
+    if cursor:
+        first_page_url = str(request.url.remove_query_params("cursor"))
 
     # Все статусы для фильтра
     all_statuses = [s.value for s in TicketStatus]
-    logger.info(all_statuses)
     return templates.TemplateResponse(
         "admin/tickets.html",
         {
@@ -203,25 +277,197 @@ async def tickets_page(
             "tickets": tickets,
             "all_statuses": all_statuses,
             "current_status": status,
-            "search_query": search or ""
+            "search_query": search or "",
+            "next_page_url": next_page_url,
+            "first_page_url": first_page_url
         }
     )
 
 
+@router.get("/api/tickets", response_model=TicketPage)
+async def tickets_api(
+    status: Optional[TicketStatus] = None,
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=TICKETS_PAGE_SIZE, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
+    admin: AdminUser = Depends(get_current_admin_from_cookie)
+):
+    """
+    JSON список заявок с пагинацией по курсору.
+
+    Следующая страница - тот же запрос с cursor=next_cursor.
+    next_cursor = null, если страниц больше нет.
+
+    Выбираются только колонки TicketResponse, строки кодируются в JSON
+    напрямую (response_model - для документации, валидации нет).
+    """
+    try:
+        items, next_cursor = await async_crud.get_ticket_rows_page(
+            db,
+            status=status,
+            search=search,
+            cursor=cursor,
+            limit=limit
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверный курсор")
+
+    return DefaultJSONResponse({"items": items, "next_cursor": next_cursor})
+
+
+@router.get("/api/tickets/{ticket_id}", response_model=TicketResponse)
+async def ticket_api(
+    ticket_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    admin: AdminUser = Depends(get_current_admin_from_cookie)
+):
+    """JSON одной заявки (поля TicketResponse)"""
+    ticket = await async_crud.get_ticket_row(db, ticket_id)
+    if ticket is None:
+        raise HTTPException(status_code=404, detail="Заявка не найдена")
+    return DefaultJSONResponse(ticket)
+
+
+@router.post("/api/tickets/bulk-status", response_model=TicketBulkResult)
+async def bulk_update_status(
+    data: TicketBulkStatusUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    admin: AdminUser = Depends(get_current_admin_from_cookie)
+):
+    """
+    Массовая смена статуса: {"ids": [...], "status": ...}
+    или {"filter": {"status", "date_from", "date_to"}, "status": ...}.
+
+    Выполняется одним UPDATE в одной транзакции.
+    """
+    results = await async_crud.bulk_update_status(db, data, data.status)
+    affected = sum(result == "updated" for result in results.values())
+
+    logger.info("Админ %s массово изменил статус %s заявок на %s",
+                admin.username, affected, data.status.value)
+
+    return {"results": results, "affected": affected}
+
+
+@router.post("/api/tickets/bulk-delete", response_model=TicketBulkResult)
+async def bulk_delete_tickets(
+    data: TicketBulkSelection,
+    db: AsyncSession = Depends(get_async_db),
+    admin: AdminUser = Depends(get_current_admin_from_cookie)
+):
+    """
+    Массовое удаление: {"ids": [...]} или {"filter": {...}}.
+
+    Выполняется одним DELETE в одной транзакции.
+    """
+    results = await async_crud.bulk_delete_tickets(db, data)
+    affected = sum(result == "deleted" for result in results.values())
+
+    logger.info("Админ %s массово удалил %s заявок", admin.username, affected)
+
+    return {"results": results, "affected": affected}
+
+
+@router.get("/tickets/export")
+async def export_tickets(
+    format: str = "csv",
+    status: Optional[TicketStatus] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    admin: AdminUser = Depends(get_current_admin_from_cookie)
+):
+    """
+    Выгрузка заявок файлом: format = csv | ndjson | parquet.
+
+    Фильтры: статус и диапазон дат создания (date_to включительно).
+    Строки отдаются потоком, память не зависит от числа заявок.
+    """
+    if format not in export.available_formats():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Формат не поддерживается, доступны: {', '.join(export.available_formats())}")
+
+    media_type, extension = export.FORMATS[format]
+    filename = f"tickets-{datetime.now():%Y%m%d-%H%M%S}.{extension}"
+
+    logger.info("Админ %s выгружает заявки (%s)", admin.username, format)
+
+    return StreamingResponse(
+        export.stream_export(format, *export.export_queries(status, date_from, date_to)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+# ============= АНАЛИТИКА =============
+
+
+@router.get("/api/analytics/tickets", response_model=TicketRollupSeries)
+async def analytics_tickets(
+    granularity: Literal["hour", "day", "month"] = "day",
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    status: Optional[TicketStatus] = None,
+    project_type: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    admin: AdminUser = Depends(get_current_admin_from_cookie)
+):
+    """
+    Количество заявок по интервалам (час / день / месяц), статусам
+    и типам проекта. status=new - созданные заявки, остальные статусы -
+    сколько заявок перешло в статус за интервал.
+
+    Читаются готовые агрегаты, а не таблица заявок.
+    """
+    items = await analytics.get_rollups(
+        db, granularity, date_from, date_to, status, project_type)
+    return {"granularity": granularity, "items": items}
+
+
+@router.get("/api/analytics/durations", response_model=TicketDurationStats)
+async def analytics_durations(
+    status: TicketStatus = TicketStatus.completed,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    project_type: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    admin: AdminUser = Depends(get_current_admin_from_cookie)
+):
+    """
+    Время от создания заявки до перехода в status (по умолчанию completed)
+    для переходов за период: среднее, медиана и 90-й перцентиль в секундах.
+    """
+    return await analytics.get_duration_stats(
+        db, status, date_from, date_to, project_type)
+
+
+@router.get("/api/tickets/{ticket_id}/history",
+            response_model=list[TicketStatusChangeResponse])
+async def ticket_history(
+    ticket_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    admin: AdminUser = Depends(get_current_admin_from_cookie)
+):
+    """История статусов заявки (первая запись - создание)"""
+    return await analytics.get_ticket_history(db, ticket_id)
+
+
 @router.get("/tickets/{ticket_id}", response_class=HTMLResponse)
 async def ticket_detail(
     request: Request,
     ticket_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     admin: AdminUser = Depends(get_current_admin_from_cookie)
 ):
     """Детальная страница одной заявки"""
-    ticket = crud.get_ticket(db, ticket_id)
+    ticket = await async_crud.get_ticket(db, ticket_id)
 
     if not ticket:
         raise HTTPException(status_code=404, detail="Заявка не найдена")
 
     all_statuses = [s.value for s in TicketStatus]
+    previous, previous_total = await async_crud.get_previous_tickets(db, ticket)
 
     return templates.TemplateResponse(
         "admin/ticket_detail.html",
@@ -229,7 +475,9 @@ async def ticket_detail(
             "request": request,
             "admin": admin,
             "ticket": ticket,
-            "all_statuses": all_statuses
+            "all_statuses": all_statuses,
+            "previous": previous,
+            "previous_total": previous_total
         }
     )
 
@@ -238,7 +486,7 @@ async def ticket_detail(
 async def update_ticket_status(
     ticket_id: int,
     status: str = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     admin: AdminUser = Depends(get_current_admin_from_cookie)
 ):
     """
@@ -250,13 +498,14 @@ async def update_ticket_status(
         new_status = TicketStatus(status)
         update_data = TicketUpdate(status=new_status)
 
-        updated_ticket = crud.update_ticket_status(db, ticket_id, update_data)
+        updated_ticket = await async_crud.update_ticket_status(
+            db, ticket_id, update_data)
 
         if not updated_ticket:
             raise HTTPException(status_code=404, detail="Заявка не найдена")
 
-        logger.info(
-            f"Админ {admin.username} изменил статус заявки #{ticket_id} на {status}")
+        logger.info("Админ %s изменил статус заявки #%s на %s",
+                    admin.username, ticket_id, status)
 
         return RedirectResponse(
             url=f"/admin/tickets/{ticket_id}",
@@ -265,3 +514,71 @@ async def update_ticket_status(
 
     except ValueError:
         raise HTTPException(status_code=400, detail="Неверный статус")
+
+
+# ============= УВЕДОМЛЕНИЯ =============
+
+@router.get("/notifications", response_class=HTMLResponse)
+async def notifications_page(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    admin: AdminUser = Depends(get_current_admin_from_cookie)
+):
+    """Очередь уведомлений: счетчики по статусам и недоставленные (dead)"""
+    return templates.TemplateResponse(
+        "admin/notifications.html",
+        {
+            "request": request,
+            "admin": admin,
+            "counts": await notifications.get_status_counts(db),
+            "dead": await notifications.get_dead(db),
+            "channels": notifications.dispatcher.channels,
+        }
+    )
+
+
+@router.post("/notifications/retry")
+async def retry_notifications(
+    notification_id: Optional[int] = Form(default=None),
+    db: AsyncSession = Depends(get_async_db),
+    admin: AdminUser = Depends(get_current_admin_from_cookie)
+):
+    """Отправить заново одно dead уведомление (notification_id) или все"""
+    ids = None if notification_id is None else [notification_id]
+    count = await notifications.retry_dead(db, ids)
+    logger.info("Админ %s вернул в очередь уведомлений: %d",
+                admin.username, count)
+    return RedirectResponse(url="/admin/notifications", status_code=303)
+
+
+# ============= ФОТОГРАФИИ ПРОЕКТОВ =============
+
+@router.post("/api/photos", response_model=PhotoUploadResult, status_code=201)
+async def upload_photo(
+    request: Request,
+    admin: AdminUser = Depends(get_current_admin_from_cookie)
+):
+    """
+    Загрузка фото проекта. Тело запроса - сам файл (JPEG, PNG или WebP):
+    fetch('/admin/api/photos', {method: 'POST', body: file}).
+
+    Не multipart: тело сразу пишется на диск кусками, без промежуточного
+    временного файла. 201 - новый файл, 200 - такой уже был (duplicate).
+    """
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > config.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Файл слишком большой")
+
+    try:
+        photo = await uploads.save_photo(request.stream())
+    except uploads.UploadTooLarge:
+        raise HTTPException(status_code=413, detail="Файл слишком большой")
+    except uploads.UnsupportedImage:
+        raise HTTPException(
+            status_code=415, detail="Поддерживаются только JPEG, PNG и WebP")
+
+    logger.info("Админ %s загрузил фото %s (%d байт%s)", admin.username,
+                photo["digest"], photo["size"], ", повтор" if photo["duplicate"] else "")
+    if photo["duplicate"]:
+        return DefaultJSONResponse(photo, status_code=200)
+    return photo
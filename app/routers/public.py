@@ -1,33 +1,40 @@
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Request, Header
 from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from app.database.db import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database.db import get_async_db
 from app.schemas import TicketCreate
-from app import crud
+from app import async_crud
+from app.ingest import ticket_writer, IngestQueueFull
+from app.dedup import submissions, IdempotencyKeyMismatch, IDEMPOTENCY_KEY_MAX_LENGTH
+from app.throttling import submit_email_limiter, RateLimited, retry_after_header
+from app import config
+from app.templating import landing_page
+from typing import Optional
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 
 @router.get("/", response_class=HTMLResponse)
 async def home(request: Request):
-    """Главная страница"""
-    return templates.TemplateResponse(
-        "index.html",
-        {"request": request}
-    )
+    """
+    Главная страница.
+
+    Не зависит от запроса, поэтому рендерится один раз и отдается из
+    памяти (сжатая, с ETag / Last-Modified).
+    """
+    return landing_page.response(request)
 
 
 @router.post("/api/submit-application")
 async def submit_application(
     request: Request,
     ticket_data: TicketCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: Optional[str] = Header(
+        default=None, max_length=IDEMPOTENCY_KEY_MAX_LENGTH)
 ):
     """
     API endpoint для создания заявки.
@@ -36,31 +43,83 @@ async def submit_application(
     1. Парсит JSON из request body
     2. Валидирует через TicketCreate схему
     3. Преобразует projectType -> project_type (благодаря alias)
+
+    Повтор (тот же Idempotency-Key или те же email, телефон и сообщение
+    недавно) возвращает id уже созданной заявки со статусом 200
+    и ничего не пишет в БД.
     """
-    try:
-        # Логируем что пришло
-        body = await request.body()
-        logger.info(f"Raw body: {body.decode()}")
+    async def create() -> int:
+        # Лимит по email считаем только для новых заявок, не для повторов
+        if config.RATE_LIMIT_ENABLED:
+            await submit_email_limiter.check(ticket_data.email.strip().lower())
+        # Создаем заявку (сразу или через очередь пакетной записи)
+        if ticket_writer.running:
+            return await ticket_writer.submit(ticket_data)
+        new_ticket = await async_crud.create_ticket(db, ticket_data)
+        return new_ticket.id
 
-        # Логируем что Pydantic распарсил
-        logger.info(f"Parsed data: {ticket_data.model_dump()}")
+    try:
+        ticket_id, duplicate = await submissions.submit(
+            ticket_data, idempotency_key, create)
 
-        # Создаем заявку
-        new_ticket = crud.create_ticket(db, ticket_data)
+        if duplicate:
+            logger.info("Повторная заявка, возвращаем #%s", ticket_id)
+            return JSONResponse(
+                status_code=200,
+                headers={"Idempotent-Replayed": "true"},
+                content={
+                    "success": True,
+                    "message": "Заявка уже отправлена! Мы свяжемся с вами в ближайшее время.",
+                    "ticket_id": ticket_id,
+                    "duplicate": True
+                }
+            )
 
-        logger.info(f"Заявка #{new_ticket.id} успешно создана")
+        logger.info("Заявка #%s успешно создана", ticket_id)
 
         return JSONResponse(
             status_code=201,
             content={
                 "success": True,
                 "message": "Заявка успешно отправлена! Мы свяжемся с вами в ближайшее время.",
-                "ticket_id": new_ticket.id
+                "ticket_id": ticket_id
+            }
+        )
+
+    except IdempotencyKeyMismatch:
+        logger.warning("Idempotency-Key повторно использован с другими данными")
+        return JSONResponse(
+            status_code=422,
+            content={
+                "success": False,
+                "message": "Idempotency-Key уже использован для другой заявки"
+            }
+        )
+
+    except RateLimited as e:
+        logger.warning("Превышен лимит заявок с одного email")
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": retry_after_header(e.retry_after)},
+            content={
+                "success": False,
+                "message": "Слишком много заявок. Попробуйте позже."
+            }
+        )
+
+    except IngestQueueFull:
+        logger.warning("Очередь заявок заполнена, запрос отклонен")
+        return JSONResponse(
+            status_code=503,
+            headers={"Retry-After": "1"},
+            content={
+                "success": False,
+                "message": "Сервер перегружен. Попробуйте через несколько секунд."
             }
         )
 
     except ValueError as e:
-        logger.error(f"Ошибка валидации: {str(e)}")
+        logger.error("Ошибка валидации: %s", e)
         return JSONResponse(
             status_code=400,
             content={
@@ -70,7 +129,7 @@ async def submit_application(
         )
 
     except Exception as e:
-        logger.error(f"Ошибка при сохранении: {str(e)}", exc_info=True)
+        logger.error("Ошибка при сохранении: %s", e, exc_info=True)
         return JSONResponse(
             status_code=500,
             content={
@@ -1,7 +1,9 @@
-from pydantic import BaseModel, EmailStr, Field, ConfigDict
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, ConfigDict, field_validator, model_validator
+from datetime import date, datetime
+from typing import Literal
 from app.models import Ticket
 from app.enums import TicketStatus
+from app import customers
 
 
 class TicketCreate(BaseModel):
@@ -16,6 +18,17 @@ class TicketCreate(BaseModel):
     message: str | None = Field(default=None)
     project_type: str | None = Field(default=None, alias="projectType")
 
+    # Контакты хранятся нормализованными: по ним заявки связываются с клиентом
+    @field_validator("email")
+    @classmethod
+    def normalize_email(cls, email: str) -> str:
+        return customers.normalize_email(email)
+
+    @field_validator("phone")
+    @classmethod
+    def normalize_phone(cls, phone: str) -> str:
+        return customers.normalize_phone(phone)
+
 
 class TicketUpdate(BaseModel):
     """Только те поля которые можно менять в админ панеле"""
@@ -35,6 +48,86 @@ class TicketResponse(BaseModel):
     updated_at: datetime | None
 
 
+class TicketBulkFilter(BaseModel):
+    """Фильтр для массовых операций (хотя бы одно поле обязательно)"""
+    status: TicketStatus | None = None
+    date_from: date | None = None
+    date_to: date | None = None
+
+    @model_validator(mode="after")
+    def check_not_empty(self):
+        if self.status is None and self.date_from is None and self.date_to is None:
+            raise ValueError("Фильтр не может быть пустым")
+        return self
+
+
+class TicketBulkSelection(BaseModel):
+    """Какие заявки затрагивает массовая операция: список id или фильтр"""
+    ids: list[int] | None = Field(default=None, min_length=1, max_length=1000)
+    filter: TicketBulkFilter | None = None
+
+    @model_validator(mode="after")
+    def check_ids_or_filter(self):
+        if (self.ids is None) == (self.filter is None):
+            raise ValueError("Нужно указать либо ids, либо filter")
+        return self
+
+
+class TicketBulkStatusUpdate(TicketBulkSelection):
+    """Массовая смена статуса"""
+    status: TicketStatus
+
+
+class TicketBulkResult(BaseModel):
+    """
+    Результат массовой операции по каждой заявке:
+    updated / deleted / unchanged (статус уже такой) / not_found
+    """
+    results: dict[int, str]
+    affected: int
+
+
+class TicketPage(BaseModel):
+    """Страница списка заявок + курсор следующей страницы"""
+    items: list[TicketResponse]
+    next_cursor: str | None
+
+
+# Схемы для аналитики
+class TicketRollupPoint(BaseModel):
+    """Сколько заявок перешло в status за интервал (создание - status=new)"""
+    bucket: datetime
+    status: TicketStatus
+    project_type: str | None
+    count: int
+    # Среднее время от создания заявки до перехода (для new - null)
+    avg_seconds: float | None
+
+
+class TicketRollupSeries(BaseModel):
+    granularity: Literal["hour", "day", "month"]
+    items: list[TicketRollupPoint]
+
+
+class TicketDurationStats(BaseModel):
+    """Время от создания заявки до перехода в status, секунды"""
+    status: TicketStatus
+    count: int
+    mean_seconds: float | None
+    median_seconds: float | None
+    p90_seconds: float | None
+
+
+class TicketStatusChangeResponse(BaseModel):
+    """Строка истории статусов (from_status = null - создание)"""
+    model_config = ConfigDict(from_attributes=True)
+
+    from_status: TicketStatus | None
+    to_status: TicketStatus
+    changed_at: datetime
+    seconds_since_created: float
+
+
 # Схемы для админов
 class AdminUserCreate(BaseModel):
     """Создание админа"""
@@ -56,3 +149,13 @@ class AdminUserResponse(BaseModel):
     username: str
     email: str
     created_at: datetime
+
+
+# Схема ответа на загрузку фото
+class PhotoUploadResult(BaseModel):
+    """Сохраненное фото: URL оригинала и вариантов (thumb, large)"""
+    digest: str
+    url: str
+    size: int
+    duplicate: bool
+    variants: dict[str, str]
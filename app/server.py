@@ -0,0 +1,74 @@
+"""
+Запуск в несколько процессов-воркеров.
+
+    python -m app.server                            # uvicorn
+    gunicorn -c python:app.server app.main:app      # gunicorn + UvicornWorker
+
+Настройки - WEB_* в app/config.py. Переменные этого модуля в нижнем
+регистре - конфигурация gunicorn. Каждый воркер при старте создает схему
+БД под блокировкой (main.lifespan). Чтобы лимиты, индекс повторных
+заявок и события SSE были общими, с несколькими воркерами нужен
+SHARED_STATE_BACKEND=sqlite (одна машина) или redis.
+"""
+import logging
+import os
+
+from app import config
+
+logger = logging.getLogger(__name__)
+
+
+def worker_count() -> int:
+    return config.WEB_WORKERS or os.cpu_count() or 1
+
+
+def check_shared_state(workers: int):
+    if workers > 1 and config.SHARED_STATE_BACKEND == "memory":
+        logger.warning(
+            "Воркеров: %d, а SHARED_STATE_BACKEND=memory - лимиты, повторные "
+            "заявки и события SSE у каждого воркера свои", workers)
+
+
+# ============= GUNICORN =============
+
+bind = f"{config.WEB_HOST}:{config.WEB_PORT}"
+workers = worker_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = config.WEB_TIMEOUT
+graceful_timeout = config.WEB_GRACEFUL_TIMEOUT
+keepalive = config.WEB_KEEPALIVE
+max_requests = config.WEB_MAX_REQUESTS
+max_requests_jitter = config.WEB_MAX_REQUESTS_JITTER
+# Приложение импортируется в каждом воркере после fork: у каждого свои
+# пулы соединений и фоновые задачи
+preload_app = False
+
+
+def on_starting(server):
+    check_shared_state(workers)
+
+
+# ============= UVICORN =============
+
+
+def main():
+    import uvicorn
+
+    count = worker_count()
+    check_shared_state(count)
+    uvicorn.run(
+        "app.main:app",
+        host=config.WEB_HOST,
+        port=config.WEB_PORT,
+        workers=count,
+        timeout_keep_alive=config.WEB_KEEPALIVE,
+        timeout_graceful_shutdown=config.WEB_GRACEFUL_TIMEOUT,
+        limit_max_requests=config.WEB_MAX_REQUESTS or None,
+        limit_max_requests_jitter=config.WEB_MAX_REQUESTS_JITTER,
+        # Логи пишет приложение (app/logging_config.py)
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
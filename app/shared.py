@@ -0,0 +1,394 @@
+"""
+Состояние, общее для всех процессов-воркеров.
+
+Лимиты, индекс повторных заявок, попытки входа и события SSE должны
+быть одними на все воркеры, иначе каждый считает свое. SharedState -
+ключ-значение с TTL, token bucket и pub/sub; реализации выбираются
+SHARED_STATE_BACKEND:
+
+- memory - в памяти процесса (по умолчанию, один воркер);
+- sqlite - отдельный файл SQLite в режиме WAL: общий для воркеров на
+  одной машине, без отдельного сервера (замена Redis для локального
+  запуска и тестов);
+- redis - Redis или совместимый сервер (нужен пакет redis).
+
+Значения хранятся в JSON: кортежи возвращаются списками.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Protocol
+
+from app import config
+from app.cache import TTLCache
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis не обязателен - без него нет backend redis
+    aioredis = None
+
+
+class SharedState(Protocol):
+    async def get(self, key: str) -> Any:
+        """Значение или None, если его нет или истек TTL"""
+
+    async def set(self, key: str, value: Any, ttl: float):
+        ...
+
+    async def add(self, key: str, value: Any, ttl: float) -> bool:
+        """
+        Атомарно записывает value, если key нет (или истек TTL).
+        True - записали, False - key уже занят.
+        """
+
+    async def incr(self, key: str, ttl: float) -> tuple[int, float]:
+        """
+        Атомарно увеличивает счетчик key на 1 (новый счетчик живет ttl
+        секунд, увеличение TTL не продлевает). Возвращает (значение,
+        через сколько секунд счетчик истечет).
+        """
+
+    async def delete(self, key: str):
+        ...
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        """Token bucket, как throttling.BucketStore.take"""
+
+    async def publish(self, channel: str, message: str):
+        ...
+
+    def listen(self, channel: str) -> AsyncIterator[str]:
+        """Сообщения channel, опубликованные после подписки (любым воркером)"""
+
+    async def close(self):
+        ...
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float,
+            burst: float, cost: float) -> tuple[float, float]:
+    """(токены после запроса, сколько ждать) - общая арифметика token bucket"""
+    tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0
+    return tokens, (cost - tokens) / rate
+
+
+class MemoryState:
+    """В памяти процесса: TTLCache и очереди подписчиков"""
+
+    def __init__(self, maxsize: int):
+        self._data = TTLCache(maxsize=maxsize, ttl=0)
+        self._buckets = TTLCache(maxsize=maxsize, ttl=0)
+        self._listeners: dict[str, set[asyncio.Queue]] = {}
+
+    async def get(self, key: str) -> Any:
+        return self._data.get(key)
+
+    async def set(self, key: str, value: Any, ttl: float):
+        self._data.set(key, value, ttl=ttl)
+
+    async def add(self, key: str, value: Any, ttl: float) -> bool:
+        # Без await внутри - атомарно в пределах event loop
+        if self._data.get(key) is not None:
+            return False
+        self._data.set(key, value, ttl=ttl)
+        return True
+
+    async def incr(self, key: str, ttl: float) -> tuple[int, float]:
+        now = time.monotonic()
+        count, expires_at = self._data.get(key) or (0, now + ttl)
+        self._data.set(key, (count + 1, expires_at), ttl=expires_at - now)
+        return count + 1, expires_at - now
+
+    async def delete(self, key: str):
+        self._data.pop(key)
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        # Без await внутри - атомарно в пределах event loop
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens, wait = _refill(tokens, updated, now, rate, burst, cost)
+        # Полная корзина не отличается от отсутствующей - TTL до наполнения
+        self._buckets.set(key, (tokens, now), ttl=(burst - tokens) / rate + 1)
+        return wait
+
+    async def publish(self, channel: str, message: str):
+        for queue in self._listeners.get(channel, ()):
+            queue.put_nowait(message)
+
+    async def listen(self, channel: str) -> AsyncIterator[str]:
+        queue = asyncio.Queue()
+        self._listeners.setdefault(channel, set()).add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._listeners[channel].discard(queue)
+
+    async def close(self):
+        pass
+
+
+class SQLiteState:
+    """
+    Общий файл SQLite. Каждая операция - короткая транзакция в потоке
+    (BEGIN IMMEDIATE для чтения-изменения-записи корзины), время - по
+    часам машины, одинаковым для всех процессов. Подписчики опрашивают
+    таблицу сообщений раз в poll_interval.
+    """
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS kv ("
+        " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS buckets ("
+        " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL,"
+        " full_at REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS messages ("
+        " id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL,"
+        " data TEXT NOT NULL, created_at REAL NOT NULL)",
+    ]
+    # Раз в столько записей удаляются истекшие ключи и старые сообщения
+    CLEANUP_EVERY = 1000
+    # Сколько хранить сообщения pub/sub (секунды)
+    MESSAGE_TTL = 60
+
+    def __init__(self, path: str, poll_interval: float):
+        self.path = path
+        self.poll_interval = poll_interval
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        self._writes = 0
+        with self._lock:
+            for ddl in self.SCHEMA:
+                self._conn.execute(ddl)
+
+    def _call(self, func, *args):
+        return asyncio.to_thread(self._locked, func, *args)
+
+    def _locked(self, func, *args):
+        with self._lock:
+            return func(*args)
+
+    def _written(self, now: float):
+        self._writes += 1
+        if self._writes % self.CLEANUP_EVERY == 0:
+            self._conn.execute("DELETE FROM kv WHERE expires_at < ?", (now,))
+            self._conn.execute("DELETE FROM buckets WHERE full_at < ?", (now,))
+            self._conn.execute("DELETE FROM messages WHERE created_at < ?",
+                               (now - self.MESSAGE_TTL,))
+
+    def _get(self, key: str) -> Any:
+        row = self._conn.execute(
+            "SELECT value FROM kv WHERE key = ? AND expires_at >= ?",
+            (key, time.time())).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def _set(self, key: str, value: Any, ttl: float):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), now + ttl))
+        self._written(now)
+
+    def _add(self, key: str, value: Any, ttl: float) -> bool:
+        # Одна команда: вставка или замена только истекшей записи
+        now = time.time()
+        added = self._conn.execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET value = excluded.value,"
+            " expires_at = excluded.expires_at WHERE kv.expires_at < ?",
+            (key, json.dumps(value), now + ttl, now)).rowcount == 1
+        self._written(now)
+        return added
+
+    def _incr(self, key: str, ttl: float) -> tuple[int, float]:
+        # UPDATE видит старые значения строки: истекший счетчик начинается заново
+        now = time.time()
+        count, expires_at = self._conn.execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, 1, ?)"
+            " ON CONFLICT (key) DO UPDATE SET"
+            " value = CASE WHEN expires_at < ? THEN 1 ELSE value + 1 END,"
+            " expires_at = CASE WHEN expires_at < ? THEN excluded.expires_at"
+            " ELSE expires_at END"
+            " RETURNING value, expires_at",
+            (key, now + ttl, now, now)).fetchone()
+        self._written(now)
+        return int(count), expires_at - now
+
+    def _take(self, key: str, rate: float, burst: float, cost: float) -> float:
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row is not None else (burst, now)
+            tokens, wait = _refill(tokens, updated, now, rate, burst, cost)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated, full_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, tokens, now, now + (burst - tokens) / rate))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._written(now)
+        return wait
+
+    def _publish(self, channel: str, message: str):
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO messages (channel, data, created_at) VALUES (?, ?, ?)",
+            (channel, message, now))
+        self._written(now)
+
+    def _last_id(self) -> int:
+        return self._conn.execute(
+            "SELECT coalesce(max(id), 0) FROM messages").fetchone()[0]
+
+    def _poll(self, channel: str, after: int) -> list[tuple[int, str]]:
+        return self._conn.execute(
+            "SELECT id, data FROM messages WHERE id > ? AND channel = ? ORDER BY id",
+            (after, channel)).fetchall()
+
+    async def get(self, key: str) -> Any:
+        return await self._call(self._get, key)
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await self._call(self._set, key, value, ttl)
+
+    async def add(self, key: str, value: Any, ttl: float) -> bool:
+        return await self._call(self._add, key, value, ttl)
+
+    async def incr(self, key: str, ttl: float) -> tuple[int, float]:
+        return await self._call(self._incr, key, ttl)
+
+    async def delete(self, key: str):
+        await self._call(self._conn.execute, "DELETE FROM kv WHERE key = ?", (key,))
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        return await self._call(self._take, key, rate, burst, cost)
+
+    async def publish(self, channel: str, message: str):
+        await self._call(self._publish, channel, message)
+
+    async def listen(self, channel: str) -> AsyncIterator[str]:
+        last_id = await self._call(self._last_id)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            for last_id, data in await self._call(self._poll, channel, last_id):
+                yield data
+
+    async def close(self):
+        await self._call(self._conn.close)
+
+
+# Token bucket одной командой на сервере Redis (атомарно)
+_TAKE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(((burst - tokens) / rate + 1) * 1000))
+return tostring(wait)
+"""
+
+
+class RedisState:
+    """Redis (или совместимый сервер): SET PX / NX, INCR, скрипт token bucket, PUBLISH"""
+
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("Для SHARED_STATE_BACKEND=redis нужен пакет redis")
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+
+    async def get(self, key: str) -> Any:
+        value = await self._redis.get(key)
+        return None if value is None else json.loads(value)
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await self._redis.set(key, json.dumps(value), px=max(1, int(ttl * 1000)))
+
+    async def add(self, key: str, value: Any, ttl: float) -> bool:
+        return bool(await self._redis.set(
+            key, json.dumps(value), px=max(1, int(ttl * 1000)), nx=True))
+
+    async def incr(self, key: str, ttl: float) -> tuple[int, float]:
+        # MULTI: новый счетчик с TTL, INCR (TTL сохраняет) и остаток TTL
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.set(key, 0, px=max(1, int(ttl * 1000)), nx=True)
+            pipe.incr(key)
+            pipe.pttl(key)
+            _, count, expires_in = await pipe.execute()
+        return count, expires_in / 1000
+
+    async def delete(self, key: str):
+        await self._redis.delete(key)
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        return float(await self._take(keys=[key], args=[rate, burst, cost]))
+
+    async def publish(self, channel: str, message: str):
+        await self._redis.publish(channel, message)
+
+    async def listen(self, channel: str) -> AsyncIterator[str]:
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(channel)
+        try:
+            async for message in pubsub.listen():
+                yield message["data"]
+        finally:
+            await pubsub.aclose()
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+# Подключения к общим хранилищам - по одному на процесс
+_states: dict[str, SharedState] = {}
+
+
+def create_state(backend: str = config.SHARED_STATE_BACKEND,
+                 maxsize: int = 10000) -> SharedState:
+    """
+    Хранилище по имени. memory - новое для каждого вызова (maxsize
+    ключей, чтобы разные потребители не вытесняли записи друг друга),
+    sqlite и redis - одно подключение на процесс, ключи различаются
+    префиксами.
+    """
+    if backend == "memory":
+        return MemoryState(maxsize=maxsize)
+    if backend not in _states:
+        if backend == "sqlite":
+            _states[backend] = SQLiteState(
+                config.SHARED_STATE_PATH, config.SHARED_STATE_POLL_INTERVAL)
+        elif backend == "redis":
+            _states[backend] = RedisState(config.SHARED_STATE_URL)
+        else:
+            raise ValueError(f"Неизвестное общее хранилище: {backend}")
+    return _states[backend]
+
+
+async def close_all():
+    """Закрывает подключения (при остановке воркера)"""
+    for state in _states.values():
+        await state.close()
+    _states.clear()
@@ -0,0 +1,169 @@
+"""
+Общие шаблоны и статика.
+
+- templates - единый Jinja2 environment для всех роутеров, скомпилированные
+  шаблоны кэшируются на диске (быстрый старт воркеров). Jinja2 импортируется
+  и environment создается при первом рендере, а не при импорте.
+- landing_page - главная страница, отрендеренная один раз и хранящаяся в
+  памяти вместе с gzip / brotli вариантами, ETag и Last-Modified.
+- CachedStaticFiles - StaticFiles с заголовком Cache-Control.
+"""
+import gzip
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+
+from fastapi import Request
+from fastapi.responses import Response
+from fastapi.staticfiles import StaticFiles
+
+from app import config
+
+try:
+    import brotli
+except ImportError:  # brotli не обязателен - тогда только gzip
+    brotli = None
+
+
+def accepted_encodings(header: str) -> dict[str, float]:
+    """
+    Accept-Encoding -> {кодировка: q}: "gzip;q=0.5, br" ->
+    {"gzip": 0.5, "br": 1.0}. q=0 - кодировка запрещена.
+    """
+    encodings = {}
+    for item in header.split(","):
+        name, *params = item.split(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        encodings[name] = q
+    return encodings
+
+
+class LazyTemplates:
+    """
+    Jinja2Templates, создаваемый при первом обращении: атрибуты
+    (TemplateResponse, get_template, env) берутся у него.
+    """
+
+    def __init__(self):
+        self._templates = None
+
+    def __getattr__(self, name: str):
+        if self._templates is None:
+            from fastapi.templating import Jinja2Templates
+            from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+            self._templates = Jinja2Templates(env=Environment(
+                loader=FileSystemLoader(config.TEMPLATES_DIR),
+                autoescape=True,
+                auto_reload=config.TEMPLATES_AUTO_RELOAD,
+                bytecode_cache=FileSystemBytecodeCache(
+                    config.TEMPLATES_BYTECODE_CACHE_DIR),
+            ))
+        return getattr(self._templates, name)
+
+
+templates = LazyTemplates()
+
+
+class PrerenderedPage:
+    """
+    Страница без данных запроса: рендерится один раз, дальше отдается из
+    памяти. Поддерживает условные запросы (304) и сжатые варианты.
+    """
+
+    def __init__(self, template_name: str):
+        self.template_name = template_name
+        self._variants: dict[str, bytes] | None = None
+        self.etag = ""
+        self.last_modified = ""
+        self._mtime = 0
+
+    def render(self):
+        """Рендерит шаблон и готовит сжатые варианты"""
+        body = templates.get_template(self.template_name).render().encode()
+        path = Path(config.TEMPLATES_DIR) / self.template_name
+
+        variants = {"identity": body, "gzip": gzip.compress(body, 9)}
+        if brotli is not None:
+            variants["br"] = brotli.compress(body, quality=11)
+
+        self._mtime = int(path.stat().st_mtime)
+        self.etag = 'W/"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.last_modified = formatdate(self._mtime, usegmt=True)
+        self._variants = variants
+
+    def _not_modified(self, request: Request) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            return self.etag in [tag.strip() for tag in if_none_match.split(",")] \
+                or if_none_match.strip() == "*"
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return self._mtime <= since
+        return False
+
+    def _encoding(self, request: Request) -> str:
+        """
+        Вариант с наибольшим q из Accept-Encoding (при равных - br, затем
+        gzip); "*" - любая кодировка, не названная явно
+        """
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        best, best_q = "identity", 0.0
+        for encoding in ("br", "gzip"):
+            q = accepted.get(encoding, accepted.get("*", 0.0))
+            if encoding in self._variants and q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def response(self, request: Request) -> Response:
+        if self._variants is None or config.TEMPLATES_AUTO_RELOAD:
+            self.render()
+
+        headers = {
+            "ETag": self.etag,
+            "Last-Modified": self.last_modified,
+            "Cache-Control": "public, no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        if self._not_modified(request):
+            return Response(status_code=304, headers=headers)
+
+        encoding = self._encoding(request)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(self._variants[encoding],
+                        media_type="text/html", headers=headers)
+
+
+landing_page = PrerenderedPage("index.html")
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles + Cache-Control (ETag/Last-Modified StaticFiles ставит сам)"""
+
+    def __init__(self, *args, max_age: int = config.STATIC_MAX_AGE,
+                 immutable: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = f"public, max-age={max_age}"
+        # Содержимое по URL никогда не меняется - браузер не перепроверяет
+        if immutable:
+            self.cache_control += ", immutable"
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers.setdefault("Cache-Control", self.cache_control)
+        return response
@@ -0,0 +1,240 @@
+"""
+Ограничение частоты запросов:
+
+- AttemptThrottle - число попыток за окно (вход в админку);
+- TokenBucket - token bucket по ключу (IP, email) с подключаемым
+  хранилищем корзин;
+- SubmitGuardMiddleware - ограничение по IP и сброс нагрузки на приеме
+  заявок до разбора тела запроса и любой работы с БД.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Protocol
+
+from app import config
+from app.shared import SharedState, create_state
+
+
+class AttemptThrottle:
+    """
+    Не более max_attempts попыток за window секунд с одного ключа
+    (фиксированное окно, отсчитывается от первой попытки).
+    Счетчики - в store, общем для воркеров (app.shared), и увеличиваются
+    атомарно: одновременные попытки из разных воркеров не проходят сверх
+    лимита.
+    """
+
+    def __init__(self, name: str, max_attempts: int, window: float, store: SharedState):
+        self.name = name
+        self.max_attempts = max_attempts
+        self.window = window
+        self.store = store
+
+    async def hit(self, key: str) -> float:
+        """
+        Учитывает попытку. Возвращает 0 если она разрешена, иначе -
+        через сколько секунд можно повторить.
+        """
+        count, expires_in = await self.store.incr(f"{self.name}:{key}",
+                                                  ttl=self.window)
+        if count > self.max_attempts:
+            return expires_in
+        return 0
+
+    async def reset(self, key: str):
+        """Сбрасывает счетчик (например, после успешного входа)"""
+        await self.store.delete(f"{self.name}:{key}")
+
+
+login_throttle = AttemptThrottle(
+    "login",
+    max_attempts=config.LOGIN_MAX_ATTEMPTS,
+    window=config.LOGIN_WINDOW,
+    store=create_state(maxsize=10000),
+)
+
+
+# ============= TOKEN BUCKET =============
+
+
+class RateLimited(Exception):
+    """Лимит исчерпан, повторить можно через retry_after секунд"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class BucketStore(Protocol):
+    """
+    Хранилище корзин. take атомарно пополняет корзину key по времени
+    (rate токенов в секунду, не больше burst) и забирает cost токенов.
+    Возвращает 0, если токены были, иначе - через сколько секунд их хватит.
+    """
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        ...
+
+
+class MemoryBucketStore:
+    """
+    Корзины в памяти процесса: {key: (токены, время обновления)}.
+    Не больше maxsize ключей - давно не использованные вытесняются
+    (вытесненная корзина и так успела бы наполниться).
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+
+            wait = 0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+def create_bucket_store(backend: str) -> BucketStore:
+    """
+    Хранилище корзин по имени из RATE_LIMIT_BACKEND: memory - в памяти
+    процесса, sqlite / redis - общее для воркеров (app.shared)
+    """
+    if backend == "memory":
+        return MemoryBucketStore(maxsize=config.RATE_LIMIT_MAX_KEYS)
+    return create_state(backend)
+
+
+class TokenBucket:
+    """
+    Не чаще rate запросов в секунду с одного ключа в среднем,
+    с пиками до burst запросов подряд. rate больше 0: на него делится
+    время ожидания.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, store: BucketStore):
+        if rate <= 0:
+            raise ValueError(f"Скорость {name} должна быть больше 0")
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.store = store
+
+    async def hit(self, key: str) -> float:
+        """0 - запрос разрешен, иначе через сколько секунд повторить"""
+        return await self.store.take(f"{self.name}:{key}", self.rate, self.burst)
+
+    async def check(self, key: str):
+        """То же, что hit, но с исключением RateLimited"""
+        retry_after = await self.hit(key)
+        if retry_after:
+            raise RateLimited(retry_after)
+
+
+bucket_store = create_bucket_store(config.RATE_LIMIT_BACKEND)
+
+submit_ip_limiter = TokenBucket(
+    "submit-ip", rate=config.RATE_LIMIT_IP_RATE,
+    burst=config.RATE_LIMIT_IP_BURST, store=bucket_store)
+
+submit_email_limiter = TokenBucket(
+    "submit-email", rate=config.RATE_LIMIT_EMAIL_RATE,
+    burst=config.RATE_LIMIT_EMAIL_BURST, store=bucket_store)
+
+
+# ============= ЗАЩИТА ПРИЕМА ЗАЯВОК =============
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(int(seconds) + 1)
+
+
+def client_ip(scope, trust_forwarded: bool = False) -> str:
+    """
+    IP клиента. За reverse proxy (trust_forwarded) - последний адрес
+    из X-Forwarded-For: его дописал наш прокси, подделать его клиент не может.
+    """
+    if trust_forwarded:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").rsplit(",", 1)[-1].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class SubmitGuardMiddleware:
+    """
+    ASGI middleware для POST на paths:
+    - token bucket по IP клиента -> 429 + Retry-After;
+    - не больше max_concurrency таких запросов одновременно, лишние
+      сразу получают 503 + Retry-After (а не ждут в очереди к БД),
+      поэтому поток заявок не отнимает ресурсы у админки.
+
+    Срабатывает до чтения тела запроса, валидации и работы с БД.
+    """
+
+    def __init__(self, app, paths: tuple[str, ...], limiter: TokenBucket | None,
+                 max_concurrency: int, trust_forwarded: bool = False):
+        self.app = app
+        self.paths = paths
+        self.limiter = limiter
+        self.max_concurrency = max_concurrency
+        self.trust_forwarded = trust_forwarded
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] != "POST"
+                or scope["path"] not in self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        if self.limiter is not None:
+            retry_after = await self.limiter.hit(
+                client_ip(scope, self.trust_forwarded))
+            if retry_after:
+                await self._reject(send, 429, retry_after,
+                                   "Слишком много заявок. Попробуйте позже.")
+                return
+
+        if self.in_flight >= self.max_concurrency:
+            await self._reject(send, 503, 1,
+                               "Сервер перегружен. Попробуйте через несколько секунд.")
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+    async def _reject(self, send, status: int, retry_after: float, message: str):
+        body = json.dumps({"success": False, "message": message},
+                          ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", retry_after_header(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,204 @@
+"""
+Загрузка фотографий проектов.
+
+- Тело запроса пишется на диск кусками по UPLOAD_CHUNK_SIZE по мере
+  поступления: в памяти не больше одного куска, сколько бы ни весил файл.
+- Имя файла - sha256 содержимого (content-addressed): повторная загрузка
+  того же файла не занимает места, а содержимое по URL никогда не меняется,
+  поэтому /uploads отдается с Cache-Control: immutable.
+- Превью и WebP строит Pillow в пуле процессов (IMAGE_WORKERS), event loop
+  не ждет CPU. Без Pillow сохраняется только оригинал. Pillow
+  импортируется при первой загрузке, а не на старте воркера.
+"""
+import asyncio
+import hashlib
+import importlib.util
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import (
+    BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor)
+from pathlib import Path
+from typing import AsyncIterator
+
+from app import config
+
+# Pillow не обязателен - без него нет превью и WebP
+HAS_PILLOW = importlib.util.find_spec("PIL") is not None
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = Path(config.UPLOAD_DIR)
+# URL, под которым UPLOAD_DIR смонтирован в main.py
+UPLOAD_URL = "/uploads/projects"
+
+# Сигнатура в начале файла -> расширение
+SIGNATURES = [
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+]
+
+# Варианты: имя -> наибольшая сторона
+VARIANTS = {
+    "thumb": config.IMAGE_THUMB_SIZE,
+    "large": config.IMAGE_WEBP_SIZE,
+}
+
+
+class UploadTooLarge(Exception):
+    """Файл больше UPLOAD_MAX_BYTES"""
+
+
+class UnsupportedImage(Exception):
+    """Не JPEG / PNG / WebP или не открывается"""
+
+
+def detect_format(head: bytes) -> str | None:
+    """Расширение по первым байтам файла (заголовку Content-Type не верим)"""
+    for signature, extension in SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def photo_path(digest: str, suffix: str) -> Path:
+    """<UPLOAD_DIR>/ab/abcdef...<suffix> - не больше 256 файлов-каталогов в корне"""
+    return UPLOAD_DIR / digest[:2] / f"{digest}{suffix}"
+
+
+def photo_url(path: Path) -> str:
+    return f"{UPLOAD_URL}/{path.relative_to(UPLOAD_DIR).as_posix()}"
+
+
+def make_variants(source: str, digest: str) -> dict[str, str]:
+    """
+    Строит WebP варианты рядом с source (в процессе пула). Уже
+    существующие не пересоздаются. Возвращает {имя варианта: путь}.
+    """
+    from PIL import Image, ImageOps
+    source = Path(source)
+    variants = {}
+    with Image.open(source) as image:
+        # Учитываем поворот из EXIF и переводим в RGB(A) для WebP
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        for name, size in VARIANTS.items():
+            target = source.with_name(f"{digest}.{name}.webp")
+            if not target.exists():
+                variant = image.copy()
+                variant.thumbnail((size, size))
+                temporary = target.with_name(f".{uuid.uuid4().hex}.tmp")
+                variant.save(temporary, format="WEBP",
+                             quality=config.IMAGE_WEBP_QUALITY)
+                os.replace(temporary, target)
+            variants[name] = str(target)
+    return variants
+
+
+_executor: Executor | None = None
+
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if config.IMAGE_WORKERS > 0:
+            # spawn, а не fork: у процесса сервера есть потоки и event loop
+            _executor = ProcessPoolExecutor(
+                max_workers=config.IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"))
+        else:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="images")
+    return _executor
+
+
+def shutdown():
+    """Останавливает пул (при остановке приложения)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _write_stream(chunks: AsyncIterator[bytes], target: Path,
+                        max_bytes: int) -> tuple[str, bytes, int]:
+    """
+    Пишет поток в target кусками по UPLOAD_CHUNK_SIZE (запись - в потоке).
+    Возвращает (sha256, первые байты, размер).
+    """
+    digest = hashlib.sha256()
+    head = b""
+    size = 0
+    buffer = bytearray()
+    with open(target, "wb") as file:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge()
+            digest.update(chunk)
+            if len(head) < 16:
+                head += chunk[:16]
+            buffer += chunk
+            if len(buffer) >= config.UPLOAD_CHUNK_SIZE:
+                await asyncio.to_thread(file.write, buffer)
+                buffer = bytearray()
+        if buffer:
+            await asyncio.to_thread(file.write, buffer)
+    return digest.hexdigest(), head, size
+
+
+async def save_photo(chunks: AsyncIterator[bytes],
+                     max_bytes: int = config.UPLOAD_MAX_BYTES,
+                     variants: bool = True) -> dict:
+    """
+    Сохраняет фото из потока байтов, строит варианты (variants=False -
+    только оригинал). Возвращает
+    {"digest", "url", "size", "duplicate", "variants": {имя: url}}.
+    UploadTooLarge / UnsupportedImage - файл не сохранен.
+    """
+    incoming = UPLOAD_DIR / ".incoming"
+    incoming.mkdir(parents=True, exist_ok=True)
+    temporary = incoming / uuid.uuid4().hex
+    try:
+        digest, head, size = await _write_stream(chunks, temporary, max_bytes)
+        extension = detect_format(head)
+        if extension is None:
+            raise UnsupportedImage()
+
+        path = photo_path(digest, f".{extension}")
+        duplicate = path.exists()
+        if not duplicate:
+            path.parent.mkdir(exist_ok=True)
+            os.replace(temporary, path)
+    finally:
+        temporary.unlink(missing_ok=True)
+
+    built = {}
+    if variants and HAS_PILLOW:
+        from PIL import Image
+        loop = asyncio.get_running_loop()
+        try:
+            built = await loop.run_in_executor(
+                _get_executor(), make_variants, str(path), digest)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # Сигнатура верная, но Pillow файл не открыл - битый файл
+            logger.warning("Не удалось обработать фото %s: %r", digest, e)
+            if not duplicate:
+                path.unlink(missing_ok=True)
+            raise UnsupportedImage() from e
+        except BrokenExecutor:
+            # Процесс пула упал (например, OOM) - следующая загрузка создаст новый
+            shutdown()
+            raise
+
+    return {
+        "digest": digest,
+        "url": photo_url(path),
+        "size": size,
+        "duplicate": duplicate,
+        "variants": {name: photo_url(Path(variant))
+                     for name, variant in built.items()},
+    }
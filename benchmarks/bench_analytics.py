@@ -0,0 +1,130 @@
+"""
+Аналитика по заявкам: запрос по агрегатам против GROUP BY по tickets.
+
+Таблица заполняется size заявками за последний год, история и агрегаты
+строятся через analytics.backfill. Сравниваются:
+- "заявок в день по project_type" - GROUP BY date(created_at) по tickets
+  и выборка из ticket_rollups;
+- "медиана времени до completed" - все длительности из tickets
+  в приложение и get_duration_stats по гистограмме в агрегатах за день.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_analytics --sizes 10000 100000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from app import analytics
+from app.database.db import Base
+from app.enums import TicketStatus
+from app.models import Ticket
+
+PROJECTS = ["cottage", "bath", "garage", "renovation", None]
+REPEATS = 10
+
+
+def fill(engine, size: int, seed: int = 42):
+    """size заявок со случайной датой за год и временем обработки до 10 дней"""
+    rnd = random.Random(seed)
+    start = datetime.now() - timedelta(days=365)
+    statuses = list(TicketStatus)
+    with Session(engine) as db:
+        batch = []
+        for i in range(size):
+            created_at = start + timedelta(seconds=rnd.randint(0, 365 * 86400))
+            status = rnd.choice(statuses)
+            batch.append({
+                "name": "Иван Петров",
+                "email": f"ivan{i}@example.com",
+                "phone": "+7 999 1234567",
+                "status": status,
+                "project_type": rnd.choice(PROJECTS),
+                "created_at": created_at,
+                "updated_at": None if status == TicketStatus.new else
+                created_at + timedelta(seconds=rnd.randint(600, 10 * 86400)),
+            })
+            if len(batch) == 10000:
+                db.execute(insert(Ticket), batch)
+                batch.clear()
+        if batch:
+            db.execute(insert(Ticket), batch)
+        db.commit()
+
+
+async def measure(func) -> float:
+    """Средняя задержка в миллисекундах"""
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        await func()
+    return (time.perf_counter() - started) / REPEATS * 1000
+
+
+async def run(size: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "analytics.db"
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(engine)
+        fill(engine, size)
+        started = time.perf_counter()
+        analytics.backfill(engine)
+        backfill_seconds = time.perf_counter() - started
+
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        session_factory = async_sessionmaker(async_engine)
+        date_from = (datetime.now() - timedelta(days=90)).date()
+
+        async with session_factory() as db:
+            async def scan_per_day():
+                await db.execute(
+                    select(func.date(Ticket.created_at), Ticket.project_type,
+                           func.count())
+                    .where(Ticket.created_at >= date_from)
+                    .group_by(func.date(Ticket.created_at), Ticket.project_type))
+
+            async def rollup_per_day():
+                await analytics.get_rollups(
+                    db, "day", date_from=date_from, status=TicketStatus.new)
+
+            async def scan_median():
+                rows = await db.execute(
+                    select(Ticket.created_at, Ticket.updated_at)
+                    .where(Ticket.status == TicketStatus.completed,
+                           Ticket.updated_at >= date_from))
+                statistics.median(
+                    (updated - created).total_seconds() for created, updated in rows)
+
+            async def rollup_median():
+                await analytics.get_duration_stats(
+                    db, TicketStatus.completed, date_from=date_from)
+
+            results = [
+                ("в день по project_type, tickets", await measure(scan_per_day)),
+                ("в день по project_type, rollup", await measure(rollup_per_day)),
+                ("медиана до completed, tickets", await measure(scan_median)),
+                ("медиана до completed, rollup", await measure(rollup_median)),
+            ]
+
+        await async_engine.dispose()
+        engine.dispose()
+
+    print(f"\nзаявок: {size}, backfill: {backfill_seconds:.1f} с, период: 90 дней")
+    for name, ms in results:
+        print(f"  {name:<34} {ms:8.2f} мс")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+    for size in args.sizes:
+        asyncio.run(run(size))
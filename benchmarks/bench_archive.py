@@ -0,0 +1,107 @@
+"""
+Архив закрытых заявок: запросы админки до и после переноса.
+
+size заявок за год (bench_analytics.fill, статусы случайные), затем
+archive.Archiver переносит закрытые заявки старше ARCHIVE_AFTER_DAYS.
+До и после переноса измеряются:
+- list    - первая страница списка (get_tickets_page; после переноса -
+  tickets и архив);
+- status  - первая страница с фильтром по статусу completed (так же);
+- search  - страница поиска (так же);
+- stats   - GROUP BY по статусам без снимка (после - по обеим таблицам);
+- bulk    - выборка id для массовой операции за последний месяц
+  (WHERE по created_at, как в bulk_update_status).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_archive --size 200000
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import archive
+from app import async_crud
+from app import config
+from app.crud import ticket_filters, ticket_stats_query
+from app.database import db as db_s
+from app.database import fts
+from app.database.db import Base
+from app.enums import TicketStatus
+from app.models import ArchivedTicket, Ticket
+from benchmarks.bench_analytics import fill
+
+REPEATS = 20
+
+
+async def measure(func) -> float:
+    """Средняя задержка в миллисекундах"""
+    await func()
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        await func()
+    return (time.perf_counter() - started) / REPEATS * 1000
+
+
+async def measure_all(factory) -> dict[str, float]:
+    month_ago = date.today() - timedelta(days=30)
+    async with factory() as db:
+        return {
+            "list": await measure(lambda: async_crud.get_tickets_page(db, limit=50)),
+            "status": await measure(lambda: async_crud.get_tickets_page(
+                db, limit=50, status=TicketStatus.completed)),
+            "search": await measure(lambda: async_crud.get_tickets_page(
+                db, limit=50, search="ivan12")),
+            "stats": await measure(lambda: db.execute(ticket_stats_query)),
+            "bulk": await measure(lambda: db.execute(
+                select(Ticket.id, Ticket.status).where(
+                    *ticket_filters(date_from=month_ago)))),
+        }
+
+
+async def count(factory, model) -> int:
+    async with factory() as db:
+        return await db.scalar(select(func.count()).select_from(model))
+
+
+async def run(size: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "archive.db"
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(engine)
+        fts.init_fts(engine)
+        fill(engine, size)
+        engine.dispose()
+
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        factory = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+        db_s.AsyncSessionLocal = factory
+
+        before = await measure_all(factory)
+
+        archiver = archive.Archiver(config.ARCHIVE_AFTER_DAYS, 0,
+                                    config.ARCHIVE_BATCH_SIZE)
+        started = time.perf_counter()
+        moved = await archiver.run_once()
+        elapsed = time.perf_counter() - started
+
+        after = await measure_all(factory)
+        hot = await count(factory, Ticket)
+        archived = await count(factory, ArchivedTicket)
+        await async_engine.dispose()
+
+    print(f"{size} заявок: перенесено {moved} за {elapsed:.1f} с "
+          f"({moved / elapsed:.0f} заявок/с); tickets {hot}, архив {archived}")
+    for name in before:
+        print(f"  {name:<7} до {before[name]:8.2f} мс   после {after[name]:8.2f} мс")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=200000)
+    asyncio.run(run(parser.parse_args().size))
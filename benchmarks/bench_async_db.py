@@ -0,0 +1,149 @@
+"""
+Нагрузочный бенчмарк: запросы в секунду на /api/submit-application
+и /admin/tickets при конкурентных запросах.
+
+Приложение запускается в этом же процессе через httpx.ASGITransport,
+БД - временный SQLite файл (рабочая sqlbase.db не трогается).
+Зависимости get_db / get_async_db подменяются, поэтому скрипт работает
+и на коммите до перехода на AsyncSession - так получаются цифры "до":
+
+    git stash && python -m benchmarks.bench_async_db   # до
+    git stash pop && python -m benchmarks.bench_async_db   # после
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_async_db --requests 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Сотни заявок с одного IP - лимиты приема заявок на время бенчмарка
+# выключаются (до импорта app: настройки читаются при импорте)
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("SUBMIT_MAX_CONCURRENCY", "1000000")
+
+from app.main import app
+from app.database import db as db_module
+from app.database.db import Base
+from app.models import AdminUser
+from app.crud import get_password_hash
+from app.dependencies import create_access_token
+
+TICKET = {
+    "name": "Иван Петров",
+    "email": "ivan@example.com",
+    "phone": "+7 (999) 123-45-67",
+    "message": "Хочу дом",
+    "projectType": "cottage",
+}
+
+_ticket_numbers = itertools.count(1)
+
+
+def unique_ticket() -> dict:
+    """TICKET с уникальным сообщением - иначе повторы отсекает дедупликация"""
+    return {**TICKET, "message": f"{TICKET['message']} #{next(_ticket_numbers)}"}
+
+
+def setup_database(path: Path):
+    """Создает временную БД, админа и подменяет зависимости приложения"""
+    url = f"sqlite:///{path}"
+    # sync-зависимости FastAPI создает в threadpool, а используются сессии
+    # в event loop - отключаем проверку потока у sqlite3
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+
+    with session_factory() as db:
+        # БД может быть уже заполнена (benchmarks.generate) и с админом
+        if db.query(AdminUser).filter(AdminUser.username == "bench").first() is None:
+            db.add(AdminUser(username="bench",
+                             hashed_password=get_password_hash("bench-password")))
+            db.commit()
+
+    def get_db_override():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[db_module.get_db] = get_db_override
+
+    async_engine = None
+    if hasattr(db_module, "get_async_db"):
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        async_factory = async_sessionmaker(
+            bind=async_engine, expire_on_commit=False)
+
+        async def get_async_db_override():
+            async with async_factory() as db:
+                yield db
+
+        app.dependency_overrides[db_module.get_async_db] = get_async_db_override
+        # login_page открывает сессию напрямую через AsyncSessionLocal
+        db_module.AsyncSessionLocal = async_factory
+
+    return engine, async_engine
+
+
+async def run(client: httpx.AsyncClient, method: str, url: str,
+              total: int, concurrency: int, make_json=None, **kwargs) -> float:
+    """
+    Выполняет total запросов с заданной конкурентностью, возвращает RPS.
+    make_json() - тело каждого запроса, если оно должно быть разным.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            if make_json is not None:
+                kwargs["json"] = make_json()
+            response = await client.request(method, url, **kwargs)
+            assert response.status_code < 400, response.text
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return total / (time.perf_counter() - started)
+
+
+async def main(total: int, concurrency: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, async_engine = setup_database(Path(tmp) / "bench.db")
+        token = create_access_token({"sub": "bench"})
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://bench",
+            cookies={"admin_token": token},
+        ) as client:
+            rps = await run(client, "POST", "/api/submit-application",
+                            total, concurrency, make_json=unique_ticket)
+            print(f"POST /api/submit-application: {rps:8.1f} req/s")
+
+            rps = await run(client, "GET", "/admin/tickets",
+                            total, concurrency)
+            print(f"GET  /admin/tickets:          {rps:8.1f} req/s")
+
+        if async_engine is not None:
+            await async_engine.dispose()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
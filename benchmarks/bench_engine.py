@@ -0,0 +1,113 @@
+"""
+Бенчмарк движка БД: конкурентные чтение и запись в SQLite с настройками
+SQLAlchemy по умолчанию и с профилем из app.database.db.create_db_engine
+(WAL, busy_timeout, synchronous=NORMAL, cache/mmap).
+
+Писатели создают заявки по одной (commit на каждую), читатели листают
+первую страницу списка и считают статистику по статусам.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_engine --writers 4 --readers 8 --seconds 5
+"""
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import crud
+from app.database.db import Base, create_db_engine
+from app.schemas import TicketCreate
+
+TICKET = TicketCreate(
+    name="Иван Петров",
+    email="ivan@example.com",
+    phone="+7 (999) 123-45-67",
+    message="Хочу дом",
+    project_type="cottage",
+)
+SEED_ROWS = 5000
+counters_lock = threading.Lock()
+
+
+def worker(session_factory, action, stop: threading.Event, counters: dict, key: str):
+    done = errors = 0
+    while not stop.is_set():
+        with session_factory() as db:
+            try:
+                action(db)
+                done += 1
+            except OperationalError:
+                # "database is locked" при конкурентной записи
+                db.rollback()
+                errors += 1
+    with counters_lock:
+        counters[key] += done
+        counters[key + "_errors"] += errors
+
+
+def write(db):
+    crud.create_ticket(db, TICKET)
+
+
+def read(db):
+    crud.get_tickets(db, limit=30)
+    db.execute(crud.ticket_stats_query).all()
+
+
+def run(engine, writers: int, readers: int, seconds: float) -> dict:
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    with session_factory() as db:
+        for _ in range(SEED_ROWS // 100):
+            db.add_all(crud.Ticket(**TICKET.model_dump()) for _ in range(100))
+            db.commit()
+
+    counters = {"writes": 0, "writes_errors": 0, "reads": 0, "reads_errors": 0}
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=worker, args=(
+            session_factory, write, stop, counters, "writes"))
+        for _ in range(writers)
+    ] + [
+        threading.Thread(target=worker, args=(
+            session_factory, read, stop, counters, "reads"))
+        for _ in range(readers)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return counters
+
+
+def main(writers: int, readers: int, seconds: float):
+    profiles = {
+        "default": lambda url: create_engine(
+            url, pool_size=writers + readers),
+        "tuned": create_db_engine,
+    }
+    print(f"{'engine':>8} {'writes/s':>10} {'reads/s':>10} {'errors':>8}")
+    for name, factory in profiles.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = factory(f"sqlite:///{Path(tmp) / 'bench.db'}")
+            counters = run(engine, writers, readers, seconds)
+        errors = counters["writes_errors"] + counters["reads_errors"]
+        print(f"{name:>8} {counters['writes'] / seconds:>10.1f} "
+              f"{counters['reads'] / seconds:>10.1f} {errors:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+    main(args.writers, args.readers, args.seconds)
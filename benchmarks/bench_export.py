@@ -0,0 +1,69 @@
+"""
+Бенчмарк потоковой выгрузки заявок: строк в секунду и пиковая память
+процесса (RSS) для CSV / NDJSON / Parquet.
+
+Таблица заполняется синтетическими заявками во временной БД, выгрузка
+читается через app.export.stream_export так же, как ее отдает эндпоинт.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_export --rows 2000000
+"""
+import argparse
+import asyncio
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import export
+from app.database import db as db_s
+from app.database.db import Base
+from benchmarks.bench_search import fill
+
+
+def rss_mb() -> float:
+    """Текущий RSS процесса, МБ (Linux)"""
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * resource.getpagesize() / 2 ** 20
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def main(rows: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(bind=engine)
+        fill(sessionmaker(bind=engine), rows)
+        engine.dispose()
+
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        db_s.AsyncSessionLocal = async_sessionmaker(
+            bind=async_engine, expire_on_commit=False)
+
+        print(f"rows: {rows}, RSS after fill: {rss_mb():.1f} MB")
+        print(f"{'format':>8} {'rows/s':>10} {'output MB':>10} {'RSS MB':>8} {'peak RSS MB':>12}")
+        for fmt in export.available_formats():
+            size = 0
+            started = time.perf_counter()
+            async for chunk in export.stream_export(fmt, export.export_query()):
+                size += len(chunk)
+            elapsed = time.perf_counter() - started
+            print(f"{fmt:>8} {rows / elapsed:>10.0f} {size / 2 ** 20:>10.1f} "
+                  f"{rss_mb():>8.1f} {peak_rss_mb():>12.1f}")
+
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows))
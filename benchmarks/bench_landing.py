@@ -0,0 +1,76 @@
+"""
+Пропускная способность главной страницы "/".
+
+- template: как было - TemplateResponse("index.html") на каждый запрос;
+- prerendered: текущий маршрут, без сжатия / gzip / br / 304 по ETag.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_landing --requests 2000
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse
+from fastapi.templating import Jinja2Templates
+
+from app.main import app
+
+old_app = FastAPI()
+old_templates = Jinja2Templates(directory="templates")
+
+
+@old_app.get("/", response_class=HTMLResponse)
+async def old_home(request: Request):
+    return old_templates.TemplateResponse("index.html", {"request": request})
+
+
+async def run(target, total: int, concurrency: int, headers: dict) -> tuple[float, int]:
+    """RPS и размер тела ответа в байтах (как передается по сети)"""
+    transport = httpx.ASGITransport(app=target)
+    semaphore = asyncio.Semaphore(concurrency)
+    size = 0
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            nonlocal size
+            async with semaphore:
+                response = await client.get("/", headers=headers)
+                assert response.status_code in (200, 304)
+                size = int(response.headers.get("content-length", 0))
+
+        await one()  # прогрев (первый рендер)
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return total / (time.perf_counter() - started), size
+
+
+async def main(total: int, concurrency: int):
+    logging.getLogger("app.access").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        etag = (await client.get("/")).headers["etag"]
+
+    cases = [
+        ("template", old_app, {"accept-encoding": "identity"}),
+        ("prerendered", app, {"accept-encoding": "identity"}),
+        ("prerendered gzip", app, {"accept-encoding": "gzip"}),
+        ("prerendered br", app, {"accept-encoding": "br"}),
+        ("304 if-none-match", app, {"if-none-match": etag}),
+    ]
+    for name, target, headers in cases:
+        rps, size = await run(target, total, concurrency, headers)
+        print(f"{name:>18}: {rps:8.1f} req/s {size:>8} bytes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
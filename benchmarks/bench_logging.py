@@ -0,0 +1,108 @@
+"""
+Микробенчмарк накладных расходов логирования на один запрос.
+
+Сравнивает:
+- old: как было в submit_application - три logger.info с f-строками
+  (сырое тело, model_dump, итог) синхронно в StreamHandler;
+- access: AccessLogMiddleware через очередь (QueueListener в отдельном
+  потоке) при разных LOG_SAMPLE_RATE;
+- none: тот же ASGI вызов без логирования.
+
+Вывод логов уходит в os.devnull, чтобы измерять только накладные расходы.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_logging --requests 50000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+from app import logging_config
+from app.logging_config import AccessLogMiddleware, JsonFormatter
+from app.schemas import TicketCreate
+
+TICKET = {
+    "name": "Иван Петров",
+    "email": "ivan@example.com",
+    "phone": "+7 (999) 123-45-67",
+    "message": "Хочу дом из бруса, 120 м2, участок уже есть",
+    "projectType": "cottage",
+}
+BODY = json.dumps(TICKET, ensure_ascii=False).encode()
+SCOPE = {"type": "http", "method": "POST", "path": "/api/submit-application"}
+
+
+async def endpoint(scope, receive, send):
+    await send({"type": "http.response.start", "status": 201, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def receive():
+    return {"type": "http.request", "body": BODY}
+
+
+async def send(message):
+    pass
+
+
+async def time_app(app, total: int) -> float:
+    """Среднее время одного вызова в микросекундах"""
+    started = time.perf_counter()
+    for _ in range(total):
+        await app(SCOPE, receive, send)
+    return (time.perf_counter() - started) / total * 1e6
+
+
+def make_old_app(logger: logging.Logger):
+    ticket = TicketCreate(**TICKET)
+
+    async def app(scope, receive, send):
+        body = (await receive())["body"]
+        logger.info(f"Raw body: {body.decode()}")
+        logger.info(f"Parsed data: {ticket.model_dump()}")
+        await endpoint(scope, receive, send)
+        logger.info(f"Заявка #{1} успешно создана")
+
+    return app
+
+
+async def main(total: int):
+    devnull = open(os.devnull, "w")
+
+    # Было: basicConfig(level=INFO) - синхронный StreamHandler
+    old_logger = logging.getLogger("bench.old")
+    old_logger.propagate = False
+    old_logger.setLevel(logging.INFO)
+    old_handler = logging.StreamHandler(devnull)
+    old_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    old_logger.addHandler(old_handler)
+
+    # Стало: очередь + поток записи, как в setup_logging
+    logging_config.setup_logging()
+    for handler in logging_config._listener.handlers:
+        handler.setStream(devnull)
+        handler.setFormatter(JsonFormatter())
+
+    results = {
+        "none": await time_app(endpoint, total),
+        "old": await time_app(make_old_app(old_logger), total),
+    }
+    for rate in (1.0, 0.1, 0.01):
+        app = AccessLogMiddleware(endpoint, sample_rate=rate)
+        results[f"access rate={rate}"] = await time_app(app, total)
+
+    logging_config.shutdown_logging()
+    devnull.close()
+
+    for name, us in results.items():
+        print(f"{name:>18}: {us:8.2f} us/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
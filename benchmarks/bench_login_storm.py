@@ -0,0 +1,89 @@
+"""
+Задержка /api/submit-application (p50 / p99) во время шторма попыток
+входа в админку.
+
+Проверка Argon2 в event loop останавливает все остальные запросы;
+в пуле потоков (PASSWORD_WORKERS > 0) формы продолжают обрабатываться.
+Сравнение:
+    PASSWORD_WORKERS=0 python -m benchmarks.bench_login_storm   # в loop
+    python -m benchmarks.bench_login_storm                      # в пуле
+
+Ограничение попыток входа по IP на время бенчмарка отключается.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+# Сотни заявок с одного IP - лимиты приема заявок на время бенчмарка
+# выключаются (до импорта app: настройки читаются при импорте)
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("SUBMIT_MAX_CONCURRENCY", "1000000")
+
+from app.main import app
+from app.throttling import login_throttle
+from benchmarks.bench_async_db import setup_database, unique_ticket
+
+
+def percentile(values: list[float], q: float) -> float:
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+async def login_storm(client: httpx.AsyncClient, stop: asyncio.Event, codes: dict):
+    while not stop.is_set():
+        response = await client.post(
+            "/admin/login", data={"username": "bench", "password": "wrong-password"})
+        codes[response.status_code] = codes.get(response.status_code, 0) + 1
+
+
+async def main(attackers: int, submits: int, concurrency: int):
+    login_throttle.max_attempts = 10 ** 9
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, async_engine = setup_database(Path(tmp) / "bench.db")
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            stop = asyncio.Event()
+            codes = {}
+            storm = [asyncio.create_task(login_storm(client, stop, codes))
+                     for _ in range(attackers)]
+            await asyncio.sleep(0.5)
+
+            latencies = []
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def submit():
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.post(
+                        "/api/submit-application", json=unique_ticket())
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    assert response.status_code == 201, response.text
+
+            await asyncio.gather(*(submit() for _ in range(submits)))
+            stop.set()
+            await asyncio.gather(*storm)
+
+        print(f"login attempts: {codes}")
+        print(f"submit p50: {percentile(latencies, 50):8.1f} ms")
+        print(f"submit p99: {percentile(latencies, 99):8.1f} ms")
+
+        if async_engine is not None:
+            await async_engine.dispose()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--attackers", type=int, default=4)
+    parser.add_argument("--submits", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.attackers, args.submits, args.concurrency))
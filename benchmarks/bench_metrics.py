@@ -0,0 +1,91 @@
+"""
+Микробенчмарк накладных расходов метрик.
+
+- request: MetricsMiddleware вокруг пустого ASGI приложения против
+  того же вызова без middleware;
+- query: SELECT 1 на SQLite в памяти с хуками SQLAlchemy и без них;
+- render: время формирования ответа /metrics.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_metrics --requests 50000
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import create_engine, text
+
+from app import metrics
+from app.metrics import MetricsMiddleware
+
+
+class Route:
+    path = "/admin/tickets/{ticket_id}"
+
+
+ROUNDS = 3
+
+SCOPE = {"type": "http", "method": "GET", "path": "/admin/tickets/1",
+         "route": Route()}
+
+
+async def endpoint(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def time_app(app, total: int) -> float:
+    """Среднее время одного вызова в микросекундах"""
+    started = time.perf_counter()
+    for _ in range(total):
+        await app(SCOPE, receive, send)
+    return (time.perf_counter() - started) / total * 1e6
+
+
+def time_queries(engine, total: int) -> float:
+    with engine.connect() as conn:
+        statement = text("SELECT 1")
+        started = time.perf_counter()
+        for _ in range(total):
+            conn.execute(statement).scalar()
+        return (time.perf_counter() - started) / total * 1e6
+
+
+async def main(total: int):
+    results = {
+        "request, без метрик": await time_app(endpoint, total),
+        "request, MetricsMiddleware": await time_app(
+            MetricsMiddleware(endpoint), total),
+    }
+
+    plain = create_engine("sqlite://")
+    instrumented = create_engine("sqlite://")
+    metrics.instrument_engine(instrumented, "bench")
+    # Лучший из нескольких прогонов по очереди - меньше шума от соседей
+    rounds = [(time_queries(plain, total), time_queries(instrumented, total))
+              for _ in range(ROUNDS)]
+    results["query, без хуков"] = min(plain_us for plain_us, _ in rounds)
+    results["query, с хуками"] = min(hooked_us for _, hooked_us in rounds)
+
+    started = time.perf_counter()
+    body = metrics.render()
+    results["render /metrics"] = (time.perf_counter() - started) * 1e6
+
+    for name, us in results.items():
+        print(f"{name:>28}: {us:8.2f} us")
+    print(f"размер /metrics: {len(body)} байт")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=50000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
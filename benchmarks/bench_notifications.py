@@ -0,0 +1,324 @@
+"""
+Уведомления о заявках против локальных заглушек SMTP и HTTP.
+
+В этом же процессе поднимаются SMTP сервер (принимает или отклоняет
+письма, считает команды, умеет закрыть простаивающие соединения) и
+HTTP сервер для webhook (отвечает заданными кодами). NotificationDispatcher
+отправляет уведомления из временной БД через настоящие EmailSink и
+WebhookSink. Проверяются:
+- success - пачка уходит через одно SMTP соединение без NOOP и одним
+  POST с верной подписью;
+- reconnect - сервер закрыл простаивающее соединение: письма уходят
+  через новое, без ошибок;
+- retry - webhook отвечает 503: попытка откладывается с растущей
+  задержкой (base * 2^(n-1), от половины до целой), потом доставляется;
+- dead - получатели все время отказывают: после max_attempts попыток
+  статус dead, retry_dead возвращает уведомления в очередь.
+И скорость отправки писем пачкой через одно соединение (писем/с и SMTP
+команд на письмо).
+
+Если проверка не прошла - код возврата 1.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_notifications
+    python -m benchmarks.bench_notifications --size 2000
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, delete, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import analytics
+from app import notifications
+from app.database import db as db_s
+from app.database.db import Base
+from app.enums import NotificationStatus
+from app.models import Notification
+
+SECRET = "stub-secret"
+MAX_ATTEMPTS = 3
+RETRY_BASE = 0.2
+RETRY_MAX = 1
+
+
+class SMTPStub:
+    """
+    SMTP сервер-заглушка: письма в messages, счетчик команд.
+    reject=True - отвечать 550 на конец DATA.
+    """
+
+    def __init__(self):
+        self.messages: list[bytes] = []
+        self.commands = Counter()
+        self.connections = 0
+        self.reject = False
+        self._writers: set[asyncio.StreamWriter] = set()
+        self._server = None
+        self.port = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.drop_connections()
+        self._server.close()
+        await self._server.wait_closed()
+
+    def drop_connections(self):
+        """Закрывает открытые соединения, как сервер по таймауту простоя"""
+        for writer in self._writers:
+            writer.close()
+        self._writers.clear()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        writer.write(b"220 stub ESMTP\r\n")
+        try:
+            while line := await reader.readline():
+                command = line.split(b" ", 1)[0].strip().upper().decode()
+                self.commands[command] += 1
+                if command == "EHLO":
+                    writer.write(b"250-stub\r\n250 8BITMIME\r\n")
+                elif command == "DATA":
+                    writer.write(b"354 end with .\r\n")
+                    await writer.drain()
+                    data = []
+                    while (chunk := await reader.readline()) not in (b".\r\n", b""):
+                        data.append(chunk)
+                    if self.reject:
+                        writer.write(b"550 rejected by stub\r\n")
+                    else:
+                        self.messages.append(b"".join(data))
+                        writer.write(b"250 queued\r\n")
+                elif command == "QUIT":
+                    writer.write(b"221 bye\r\n")
+                    await writer.drain()
+                    break
+                else:
+                    # HELO, MAIL, RCPT, RSET, NOOP
+                    writer.write(b"250 ok\r\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+
+class HTTPStub:
+    """
+    HTTP сервер-заглушка для webhook (keep-alive): запросы в requests,
+    ответ - следующий код из statuses, когда они кончились - status
+    """
+
+    def __init__(self):
+        self.requests: list[tuple[dict, bytes]] = []
+        self.statuses: list[int] = []
+        self.status = 200
+        self._server = None
+        self.url = ""
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/hook"
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while await reader.readline():
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests.append((headers, body))
+                status = self.statuses.pop(0) if self.statuses else self.status
+                writer.write(f"HTTP/1.1 {status} Stub\r\nContent-Length: 0\r\n\r\n".encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+class Checks:
+    def __init__(self):
+        self.failed = 0
+
+    def __call__(self, name: str, ok: bool, detail: str = ""):
+        print(f"  {'ok  ' if ok else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+        self.failed += not ok
+
+
+def enqueue(engine, count: int, channels: list[str]) -> list[int]:
+    """count заявок-заглушек в outbox, id уведомлений"""
+    tickets = [
+        SimpleNamespace(id=number, name="Иван Петров", email=f"ivan{number}@example.com",
+                        phone="+79991234567", message="Хочу дом", project_type="cottage",
+                        created_at=analytics.now())
+        for number in range(1, count + 1)
+    ]
+    with engine.begin() as conn:
+        return list(conn.scalars(
+            insert(Notification).returning(Notification.id, sort_by_parameter_order=True),
+            notifications.outbox_rows(tickets, channels)))
+
+
+async def rows(ids: list[int]) -> list[Notification]:
+    async with db_s.AsyncSessionLocal() as db:
+        return list(await db.scalars(
+            select(Notification).where(Notification.id.in_(ids)).order_by(Notification.id)))
+
+
+async def run_until_settled(dispatcher, ids: list[int], timeout: float = 30) -> list[Notification]:
+    """Отправляет, пока у ids есть pending (с ожиданием next_attempt_at)"""
+    deadline = time.monotonic() + timeout
+    while True:
+        await dispatcher.run_once()
+        current = await rows(ids)
+        if all(row.status != NotificationStatus.pending for row in current):
+            return current
+        if time.monotonic() > deadline:
+            raise RuntimeError("Уведомления не отправились за отведенное время")
+        await asyncio.sleep(0.02)
+
+
+async def scenarios(engine, dispatcher, smtp: SMTPStub, http: HTTPStub, check: Checks):
+    print("success")
+    ids = enqueue(engine, 20, ["email", "webhook"])
+    await dispatcher.run_once()
+    sent = [row for row in await rows(ids) if row.status == NotificationStatus.sent]
+    check("все 40 уведомлений отправлены", len(sent) == 40, f"{len(sent)}")
+    check("20 писем через одно соединение", len(smtp.messages) == 20 and smtp.connections == 1,
+          f"писем {len(smtp.messages)}, соединений {smtp.connections}")
+    check("без NOOP перед письмами", smtp.commands["NOOP"] == 0, f"NOOP {smtp.commands['NOOP']}")
+    headers, body = http.requests[-1]
+    digest = hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+    check("один POST на пачку", len(http.requests) == 1
+          and len(json.loads(body)["notifications"]) == 20, f"запросов {len(http.requests)}")
+    check("подпись X-Signature", headers.get("x-signature") == f"sha256={digest}")
+
+    print("reconnect")
+    smtp.drop_connections()
+    await asyncio.sleep(0.05)
+    ids = enqueue(engine, 5, ["email"])
+    await dispatcher.run_once()
+    current = await rows(ids)
+    check("письма ушли после закрытия соединения сервером",
+          all(row.status == NotificationStatus.sent and row.attempts == 1 for row in current),
+          f"{Counter(row.status.value for row in current)}")
+    check("новое соединение", smtp.connections == 2, f"соединений {smtp.connections}")
+
+    print("retry")
+    http.statuses = [503, 503]
+    ids = enqueue(engine, 3, ["webhook"])
+    delays = []
+    for attempt in (1, 2):
+        started = analytics.now()
+        await dispatcher.run_once()
+        current = await rows(ids)
+        delays.append(min((row.next_attempt_at - started).total_seconds() for row in current))
+        check(f"после {attempt}-й ошибки - pending, attempts={attempt}",
+              all(row.status == NotificationStatus.pending and row.attempts == attempt
+                  and "HTTP 503" in row.last_error for row in current))
+        await asyncio.sleep(max(0.0, max((row.next_attempt_at - analytics.now()).total_seconds()
+                                         for row in current)))
+    check("задержка 1-й попытки в [base/2, base]",
+          RETRY_BASE / 2 - 0.01 <= delays[0] <= RETRY_BASE + 0.05, f"{delays[0]:.3f} с")
+    check("задержка 2-й попытки в [base, 2 base]",
+          RETRY_BASE - 0.01 <= delays[1] <= 2 * RETRY_BASE + 0.05, f"{delays[1]:.3f} с")
+    current = await run_until_settled(dispatcher, ids)
+    check("доставлено с 3-й попытки",
+          all(row.status == NotificationStatus.sent and row.attempts == 3 for row in current))
+
+    print("dead")
+    http.status = 500
+    smtp.reject = True
+    ids = enqueue(engine, 2, ["email", "webhook"])
+    current = await run_until_settled(dispatcher, ids)
+    check(f"после {MAX_ATTEMPTS} попыток - dead",
+          all(row.status == NotificationStatus.dead and row.attempts == MAX_ATTEMPTS
+              for row in current), f"{Counter(row.status.value for row in current)}")
+    errors = {row.channel: row.last_error for row in current}
+    check("последняя ошибка сохранена",
+          "550" in errors["email"] and "HTTP 500" in errors["webhook"], f"{errors}")
+    async with db_s.AsyncSessionLocal() as db:
+        returned = await notifications.retry_dead(db, ids)
+    http.status = 200
+    smtp.reject = False
+    current = await run_until_settled(dispatcher, ids)
+    check("retry_dead возвращает в очередь, затем доставлено",
+          returned == len(ids) and all(row.status == NotificationStatus.sent
+                                       for row in current), f"возвращено {returned}")
+
+
+async def throughput(engine, dispatcher, smtp: SMTPStub, size: int):
+    with engine.begin() as conn:
+        conn.execute(delete(Notification))
+    smtp.commands.clear()
+    sent_before = len(smtp.messages)
+    ids = enqueue(engine, size, ["email"])
+    started = time.perf_counter()
+    await run_until_settled(dispatcher, ids)
+    elapsed = time.perf_counter() - started
+    sent = len(smtp.messages) - sent_before
+    print(f"\nписем: {sent} за {elapsed:.2f} с ({sent / elapsed:.0f}/с), "
+          f"SMTP команд на письмо: {sum(smtp.commands.values()) / sent:.1f} "
+          f"(NOOP {smtp.commands['NOOP']})")
+
+
+async def run(size: int) -> int:
+    smtp, http = SMTPStub(), HTTPStub()
+    await smtp.start()
+    await http.start()
+    dispatcher = notifications.NotificationDispatcher(
+        sinks={
+            "email": notifications.EmailSink("127.0.0.1", smtp.port, "info@example.com",
+                                             ["sales@example.com"], timeout=5),
+            "webhook": notifications.WebhookSink(http.url, secret=SECRET, timeout=5),
+        },
+        batch_size=50, poll_interval=1, lease=60, max_attempts=MAX_ATTEMPTS,
+        retry_base=RETRY_BASE, retry_max=RETRY_MAX,
+    )
+    check = Checks()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "notifications.db"
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(engine)
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        db_s.AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+        try:
+            await scenarios(engine, dispatcher, smtp, http, check)
+            await throughput(engine, dispatcher, smtp, size)
+        finally:
+            await dispatcher.stop()
+            await async_engine.dispose()
+            engine.dispose()
+            await smtp.stop()
+            await http.stop()
+    if check.failed:
+        print(f"Проверок не прошло: {check.failed}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=500,
+                        help="писем в замере скорости")
+    raise SystemExit(asyncio.run(run(parser.parse_args().size)))
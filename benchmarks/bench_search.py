@@ -0,0 +1,98 @@
+"""
+Бенчмарк поиска заявок: задержка crud.get_tickets(search=...) через FTS5
+в сравнении со старым ILIKE '%term%' в зависимости от размера таблицы.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_search --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, desc, insert, or_, select
+from sqlalchemy.orm import sessionmaker
+
+from app import crud
+from app.database.db import Base
+from app.enums import TicketStatus
+from app.models import Ticket
+
+NAMES = ["Иван", "Петр", "Анна", "Мария", "Олег", "Елена", "Сергей", "Ольга"]
+SURNAMES = ["Иванов", "Петров", "Смирнов", "Кузнецов", "Попов", "Волков"]
+PROJECTS = ["cottage", "townhouse", "bath", "villa", None]
+WORDS = ["дом", "баня", "участок", "кирпич", "брус", "проект", "смета", "гараж"]
+QUERIES = ["Иван", "petrov", "баня", "+7 912", "zzzz"]
+REPEATS = 20
+
+
+def fill(session_factory, size: int, seed: int = 42):
+    """Заполняет таблицу size случайными заявками (триггеры ведут FTS индекс)"""
+    rnd = random.Random(seed)
+    statuses = list(TicketStatus)
+    batch = []
+    with session_factory() as db:
+        for i in range(size):
+            name = f"{rnd.choice(NAMES)} {rnd.choice(SURNAMES)}"
+            batch.append({
+                "name": name,
+                "email": f"{name.split()[1].lower()}{i}@example.com",
+                "phone": f"+7 9{rnd.randint(10, 99)} {rnd.randint(1000000, 9999999)}",
+                "status": rnd.choice(statuses),
+                "message": " ".join(rnd.choices(WORDS, k=8)),
+                "project_type": rnd.choice(PROJECTS),
+            })
+            if len(batch) == 10000:
+                db.execute(insert(Ticket), batch)
+                batch.clear()
+        if batch:
+            db.execute(insert(Ticket), batch)
+        db.commit()
+
+
+def ilike_search(db, search: str, limit: int):
+    """Поиск как он был до FTS5 (с исправленным email)"""
+    query = (
+        select(Ticket)
+        .where(or_(Ticket.name.ilike(f"%{search}%"),
+                   Ticket.email.ilike(f"{search}%")))
+        .order_by(desc(Ticket.created_at))
+        .limit(limit)
+    )
+    return list(db.scalars(query))
+
+
+def measure(func) -> float:
+    """Средняя задержка вызова в миллисекундах"""
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        func()
+    return (time.perf_counter() - started) / REPEATS * 1000
+
+
+def main(sizes: list[int], limit: int):
+    print(f"{'rows':>10} {'query':>10} {'fts5 ms':>10} {'ilike ms':>10}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+            Base.metadata.create_all(bind=engine)
+            session_factory = sessionmaker(bind=engine)
+            fill(session_factory, size)
+
+            with session_factory() as db:
+                for query in QUERIES:
+                    fts_ms = measure(lambda: crud.get_tickets(
+                        db, search=query, limit=limit))
+                    ilike_ms = measure(lambda: ilike_search(db, query, limit))
+                    print(f"{size:>10} {query:>10} {fts_ms:>10.2f} {ilike_ms:>10.2f}")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10000, 100000])
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+    main(args.sizes, args.limit)
@@ -0,0 +1,107 @@
+"""
+Сериализация списка заявок: ORM + Pydantic против кортежей строк + orjson.
+
+На size заявках сравниваются два пути от SELECT до байтов ответа:
+- orm: select(Ticket) -> ORM объекты -> TicketPage (from_attributes)
+  -> dump в JSON-совместимые значения -> JSONResponse, как было
+  в /admin/api/tickets;
+- rows: select(*TICKET_COLUMNS) -> словари -> DefaultJSONResponse
+  (ORJSONResponse при установленном orjson), как сейчас.
+
+Время - лучший из нескольких прогонов, память - пик tracemalloc
+в отдельном прогоне (tracemalloc сам замедляет код).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_serialization --size 10000
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.crud import TICKET_COLUMNS, TICKET_FIELDS
+from app.database.db import Base
+from app.models import Ticket
+from app.responses import DefaultJSONResponse
+from app.schemas import TicketPage
+from benchmarks.bench_analytics import fill
+
+ROUNDS = 5
+
+page_adapter = TypeAdapter(TicketPage)
+
+
+async def orm_path(session_factory) -> bytes:
+    async with session_factory() as db:
+        tickets = list(await db.scalars(select(Ticket)))
+        page = page_adapter.validate_python({"items": tickets, "next_cursor": None})
+        content = page_adapter.dump_python(page, mode="json")
+        return JSONResponse(content).body
+
+
+async def rows_path(session_factory) -> bytes:
+    async with session_factory() as db:
+        rows = (await db.execute(select(*TICKET_COLUMNS))).all()
+        items = [dict(zip(TICKET_FIELDS, row)) for row in rows]
+        return DefaultJSONResponse({"items": items, "next_cursor": None}).body
+
+
+async def best_time(path, session_factory) -> float:
+    """Лучшее время из ROUNDS прогонов, мс"""
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        await path(session_factory)
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+async def peak_memory(path, session_factory) -> tuple[float, int]:
+    """Пик выделенной памяти (МБ) и размер ответа"""
+    tracemalloc.start()
+    body = await path(session_factory)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20, len(body)
+
+
+async def main(size: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "serialization.db"
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(engine)
+        fill(engine, size)
+        engine.dispose()
+
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+
+        # Прогрев: соединение в пуле, скомпилированные запросы в кэше
+        assert len(await orm_path(session_factory)) == len(await rows_path(session_factory))
+
+        results = []
+        for name, func in (("ORM + Pydantic", orm_path),
+                           (f"строки + {DefaultJSONResponse.__name__}", rows_path)):
+            ms = await best_time(func, session_factory)
+            peak, body_size = await peak_memory(func, session_factory)
+            results.append((name, ms, peak, body_size))
+
+        await async_engine.dispose()
+
+    print(f"заявок: {size}")
+    for name, ms, peak, body_size in results:
+        print(f"  {name:<28} {ms:8.1f} мс  пик {peak:6.1f} МБ  ответ {body_size / 2**20:.1f} МБ")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=10000)
+    args = parser.parse_args()
+    asyncio.run(main(args.size))
@@ -0,0 +1,88 @@
+"""
+Рассылка SSE событий на много простаивающих подключений.
+
+N подписчиков читают app.events.sse_stream (как это делает StreamingResponse),
+затем публикуется серия событий. Меряется:
+- память на одно подключение (tracemalloc, без учета сокета и буферов ASGI);
+- время publish() - кодирование кадра + put_nowait в N очередей;
+- задержка от publish() до получения кадра подписчиком (p50 / p99).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_sse_fanout --subscribers 500 --events 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from app import events
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def subscriber(received: list[float], expected: int, ready: asyncio.Event):
+    stream = events.sse_stream(keepalive=3600)
+    await stream.__anext__()  # retry: - после него подписка уже активна
+    ready.set()
+    count = 0
+    async for frame in stream:
+        if frame.startswith("event: bench"):
+            received.append(time.perf_counter())
+            count += 1
+            if count == expected:
+                break
+    await stream.aclose()
+
+
+async def main(subscribers: int, total_events: int, interval: float):
+    received: list[list[float]] = [[] for _ in range(subscribers)]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tasks = []
+    for i in range(subscribers):
+        ready = asyncio.Event()
+        tasks.append(asyncio.create_task(
+            subscriber(received[i], total_events, ready)))
+        await ready.wait()
+    per_connection = (tracemalloc.get_traced_memory()[0] - before) / subscribers
+    tracemalloc.stop()
+
+    publish_times = []
+    sent_at = []
+    payload = {"ticket": {"id": 1, "name": "Иван Петров", "status": "new"},
+               "stats": {"new": 1, "in_progress": 0, "completed": 0, "cancelled": 0}}
+    for _ in range(total_events):
+        started = time.perf_counter()
+        events.broker.publish("bench", payload)
+        publish_times.append(time.perf_counter() - started)
+        sent_at.append(started)
+        await asyncio.sleep(interval)
+
+    await asyncio.gather(*tasks)
+
+    latencies = [
+        (times[n] - sent_at[n]) * 1000
+        for times in received for n in range(total_events)
+    ]
+    print(f"подписчиков: {subscribers}, событий: {total_events}")
+    print(f"память на подключение: {per_connection / 1024:.1f} КБ")
+    print(f"publish(): {statistics.mean(publish_times) * 1000:.2f} мс "
+          f"(max {max(publish_times) * 1000:.2f} мс)")
+    print(f"задержка доставки: p50 {percentile(latencies, 0.5):.2f} мс, "
+          f"p99 {percentile(latencies, 0.99):.2f} мс")
+    print(f"активных подписок после отключения: {events.broker.subscribers}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, default=500)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.05,
+                        help="пауза между событиями, сек")
+    args = parser.parse_args()
+    asyncio.run(main(args.subscribers, args.events, args.interval))
@@ -0,0 +1,165 @@
+"""
+Холодный старт воркера: импорт app.main и время до первого ответа.
+
+- importtime - разбор python -X importtime -c "import app.main": суммарное
+  собственное время модулей по пакетам, самые медленные модули и
+  модули app с накопленным временем (вместе с тем, что они импортируют).
+  Тяжелые зависимости (passlib, python-jose, Jinja2, Pillow, pyarrow, httpx)
+  должны импортироваться при первом использовании и в отчет не попадать;
+- import - время import app.main в чистом процессе (лучшее из --runs);
+- first request - от запуска python -m app.server (1 воркер, временная БД)
+  до первого ответа 200 на /health (lifespan со схемой БД уже выполнен),
+  и время первого GET / после этого (первый рендер шаблона).
+
+Медиана времени до первого ответа сравнивается с --target (TARGET_MS):
+если больше - код возврата 1. Цифры зависят от машины.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 10 --top 30
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import NamedTuple
+
+import httpx
+
+from benchmarks.bench_workers import free_port
+
+MODULE = "app.main"
+# Цель: воркер отвечает на /health не позже чем через столько мс после запуска
+TARGET_MS = 1500
+# Модули, которых не должно быть при импорте app.main
+LAZY = ["passlib", "argon2", "jose", "jinja2", "PIL", "pyarrow", "httpx"]
+
+
+class ImportRecord(NamedTuple):
+    name: str
+    self_us: int
+    cumulative_us: int
+
+
+def importtime(module: str = MODULE) -> list[ImportRecord]:
+    """Строки -X importtime для импорта module в чистом процессе"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True)
+    records = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        records.append(ImportRecord(name.strip(), int(self_us), int(cumulative_us)))
+    return records
+
+
+def print_report(records: list[ImportRecord], top: int):
+    by_package = defaultdict(int)
+    for record in records:
+        by_package[record.name.split(".")[0]] += record.self_us
+    total = sum(by_package.values())
+    print(f"Импорт {MODULE}: {total / 1000:.0f} мс, модулей {len(records)}")
+
+    print("\nПо пакетам (собственное время):")
+    for package, spent in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:<30} {spent / 1000:7.1f} мс  {spent / total:6.1%}")
+
+    print("\nСамые медленные модули (собственное время):")
+    for record in sorted(records, key=lambda record: -record.self_us)[:top]:
+        print(f"  {record.name:<45} {record.self_us / 1000:7.1f} мс")
+
+    print("\nМодули app (накопленное время, вместе с их импортами):")
+    app_records = [record for record in records if record.name.startswith("app.")]
+    for record in sorted(app_records, key=lambda record: -record.cumulative_us)[:top]:
+        print(f"  {record.name:<45} {record.cumulative_us / 1000:7.1f} мс")
+
+    loaded = sorted({record.name.split(".")[0] for record in records} & set(LAZY))
+    if loaded:
+        print(f"\nВнимание: при импорте загружены {', '.join(loaded)}")
+
+
+def import_ms(runs: int) -> float:
+    """Лучшее время import app.main (мс) в отдельных процессах"""
+    code = ("import time; started = time.perf_counter(); "
+            f"import {MODULE}; print(time.perf_counter() - started)")
+    times = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                                text=True, check=True, env={**os.environ, "LOG_LEVEL": "WARNING"})
+        times.append(float(result.stdout.split()[-1]) * 1000)
+    return min(times)
+
+
+def first_request(tmp: Path, timeout: float = 30) -> tuple[float, float]:
+    """
+    (мс от запуска сервера до первого 200 на /health,
+     мс первого GET / после этого)
+    """
+    port = free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmp / 'startup.db'}",
+        "UPLOAD_DIR": str(tmp / "uploads"),
+        "WEB_WORKERS": "1",
+        "WEB_PORT": str(port),
+        "LOG_LEVEL": "WARNING",
+    }
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "app.server"], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            while True:
+                try:
+                    if client.get("/health").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError("Сервер не запустился")
+                time.sleep(0.005)
+            ready = time.perf_counter() - started
+
+            page_started = time.perf_counter()
+            assert client.get("/").status_code == 200
+            page = time.perf_counter() - page_started
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return ready * 1000, page * 1000
+
+
+def main(args) -> int:
+    print_report(importtime(), args.top)
+    print(f"\nimport {MODULE}: {import_ms(args.runs):.0f} мс (лучшее из {args.runs})")
+
+    ready, pages = [], []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            ready_ms, page_ms = first_request(Path(tmp))
+        ready.append(ready_ms)
+        pages.append(page_ms)
+    median = statistics.median(ready)
+    print(f"До первого ответа /health: медиана {median:.0f} мс, "
+          f"лучшее {min(ready):.0f} мс (цель {args.target} мс)")
+    print(f"Первый GET /: медиана {statistics.median(pages):.1f} мс")
+    if median > args.target:
+        print("Цель не достигнута")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--target", type=int, default=TARGET_MS,
+                        help="цель для медианы до первого ответа, мс")
+    sys.exit(main(parser.parse_args()))
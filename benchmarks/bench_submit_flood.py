@@ -0,0 +1,135 @@
+"""
+Задержка админки во время флуда /api/submit-application.
+
+Сначала меряется задержка GET /admin/api/tickets без нагрузки, затем -
+во время флуда: rate заявок в секунду с ips разных IP (X-Forwarded-For). Клиенты работают в том же процессе и на том же
+CPU, что и приложение, поэтому цифры - оценка сверху. Сравнение:
+
+    python -m benchmarks.bench_submit_flood --guard on    # лимиты и сброс нагрузки
+    python -m benchmarks.bench_submit_flood --guard off   # как было, без ограничений
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+async def probe_admin(client, stop: asyncio.Event, interval: float) -> list[float]:
+    """Запросы админки по одному раз в interval секунд, задержки в мс"""
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/admin/api/tickets", params={"limit": 20})
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.text
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def flood(client, stop: asyncio.Event, rate: float, ips: int, codes: dict):
+    """
+    Открытая нагрузка: rate запросов в секунду независимо от того, как
+    быстро отвечает сервер (как настоящий флуд, а не вежливые клиенты).
+    Не дождавшиеся ответа к концу замера отменяются.
+    """
+    async def one(number: int):
+        response = await client.post(
+            "/api/submit-application",
+            json={
+                "name": "Бот Ботов",
+                "email": f"bot{number}@example.com",
+                "phone": "+7 999 0000000",
+                "message": f"спам {number}",
+            },
+            headers={"X-Forwarded-For": f"10.0.{number % ips // 256}.{number % ips % 256}"},
+        )
+        codes[response.status_code] = codes.get(response.status_code, 0) + 1
+
+    pending = set()
+    sent = 0
+    started = time.perf_counter()
+    while not stop.is_set():
+        due = int((time.perf_counter() - started) * rate)
+        for number in range(sent, due):
+            task = asyncio.create_task(one(number))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        sent = max(sent, due)
+        await asyncio.sleep(0.005)
+
+    codes["не дождались"] = len(pending)
+    for task in list(pending):
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def measure(client, seconds: float, rate: float, ips: int, interval: float):
+    stop = asyncio.Event()
+    codes = {}
+    probe = asyncio.create_task(probe_admin(client, stop, interval))
+    flooder = asyncio.create_task(flood(client, stop, rate, ips, codes))
+    await asyncio.sleep(seconds)
+    stop.set()
+    await flooder
+    return await probe, codes
+
+
+async def main(args):
+    import httpx
+
+    from app.main import app
+    from app.dependencies import create_access_token
+    from benchmarks.bench_async_db import setup_database
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("app").setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, async_engine = setup_database(Path(tmp) / "bench.db")
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=60,
+            cookies={"admin_token": create_access_token({"sub": "bench"})},
+        ) as client:
+            idle, _ = await measure(client, args.seconds, 0, args.ips, args.interval)
+            loaded, codes = await measure(
+                client, args.seconds, args.rate, args.ips, args.interval)
+
+        if async_engine is not None:
+            await async_engine.dispose()
+        engine.dispose()
+
+    print(f"guard: {args.guard}, флуд: {args.rate:g} заявок/с с {args.ips} IP")
+    print(f"ответы флуду: {codes}")
+    for name, latencies in (("без нагрузки", idle), ("во время флуда", loaded)):
+        print(f"админка {name:<15} p50 {percentile(latencies, 50):7.1f} мс, "
+              f"p99 {percentile(latencies, 99):7.1f} мс ({len(latencies)} запросов)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--guard", choices=["on", "off"], default="on")
+    parser.add_argument("--rate", type=float, default=300,
+                        help="заявок в секунду во время флуда")
+    parser.add_argument("--ips", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    # Настройки читаются при импорте app - задаем их до него
+    os.environ["RATE_LIMIT_TRUST_FORWARDED"] = "1"
+    if args.guard == "off":
+        os.environ["RATE_LIMIT_ENABLED"] = "0"
+        os.environ["SUBMIT_MAX_CONCURRENCY"] = "1000000"
+    else:
+        os.environ["RATE_LIMIT_ENABLED"] = "1"
+
+    asyncio.run(main(args))
@@ -0,0 +1,127 @@
+"""
+Загрузка фото: потоковая запись на диск против чтения тела целиком.
+
+concurrency клиентов одновременно загружают size-мегабайтные JPEG
+(шум - плохо сжимается) кусками по 64 КБ, как браузер по сети:
+- stream   - uploads.save_photo(request.stream()), как /admin/api/photos;
+- buffered - await request.body(), затем то же сохранение: тело
+  каждого запроса целиком в памяти (как UploadFile в памяти или
+  request.body() в обработчике).
+
+Для обоих - МБ/с и пик памяти tracemalloc (в отдельном прогоне:
+tracemalloc сам замедляет код). Отдельно - МБ/с с построением превью
+и WebP в пуле процессов (IMAGE_WORKERS): процессы пула в пик памяти
+сервера не входят.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_uploads --size 8 --concurrency 8
+"""
+import argparse
+import asyncio
+import io
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI, Request
+from PIL import Image
+
+from app import config
+from app import uploads
+
+PIECE = 64 * 1024
+
+
+async def stream_photo(request: Request):
+    return await uploads.save_photo(
+        request.stream(), variants=request.query_params.get("variants") == "1")
+
+
+async def buffered_photo(request: Request):
+    body = await request.body()
+
+    async def chunks():
+        yield body
+
+    return await uploads.save_photo(
+        chunks(), variants=request.query_params.get("variants") == "1")
+
+
+app = FastAPI()
+app.add_api_route("/stream", stream_photo, methods=["POST"])
+app.add_api_route("/buffered", buffered_photo, methods=["POST"])
+
+
+def make_photos(count: int, size_mb: float) -> list[bytes]:
+    """count разных JPEG примерно по size_mb МБ"""
+    side = int((size_mb * 1024 * 1024 / 0.6) ** 0.5)
+    photos = []
+    for i in range(count):
+        image = Image.effect_noise((side, side), 40 + i).convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=95)
+        photos.append(buffer.getvalue())
+    return photos
+
+
+async def pieces(data: bytes):
+    for start in range(0, len(data), PIECE):
+        yield data[start:start + PIECE]
+        await asyncio.sleep(0)
+
+
+async def upload_all(path: str, photos: list[bytes], variants: bool) -> float:
+    """Время загрузки всех photos одновременно (секунды)"""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                 base_url="http://bench", timeout=300) as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post(path, content=pieces(photo),
+                        params={"variants": "1" if variants else "0"})
+            for photo in photos))
+        elapsed = time.perf_counter() - started
+    for response in responses:
+        assert response.status_code == 200, response.text
+    return elapsed
+
+
+async def measure(path: str, photos: list[bytes], variants: bool,
+                  trace: bool) -> tuple[float, int]:
+    """(МБ/с, пик памяти в байтах) на пустом каталоге загрузок"""
+    with tempfile.TemporaryDirectory() as tmp:
+        uploads.UPLOAD_DIR = Path(tmp)
+        if trace:
+            tracemalloc.start()
+        try:
+            elapsed = await upload_all(path, photos, variants)
+            peak = tracemalloc.get_traced_memory()[1] if trace else 0
+        finally:
+            if trace:
+                tracemalloc.stop()
+    total = sum(len(photo) for photo in photos)
+    return total / elapsed / 1024 / 1024, peak
+
+
+async def main(args):
+    photos = make_photos(args.concurrency, args.size)
+    total = sum(len(photo) for photo in photos) / 1024 / 1024
+    print(f"{len(photos)} фото, всего {total:.1f} МБ")
+
+    for path in ("/stream", "/buffered"):
+        speed, _ = await measure(path, photos, variants=False, trace=False)
+        _, peak = await measure(path, photos, variants=False, trace=True)
+        print(f"{path[1:]:<9} {speed:7.1f} МБ/с  пик памяти {peak / 1024 / 1024:6.1f} МБ")
+
+    await measure("/stream", photos[:1], variants=True, trace=False)  # старт пула
+    speed, _ = await measure("/stream", photos, variants=True, trace=False)
+    print(f"stream + превью и WebP ({config.IMAGE_WORKERS} проц.) {speed:7.1f} МБ/с")
+    uploads.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=float, default=8, help="МБ на фото")
+    parser.add_argument("--concurrency", type=int, default=8)
+    asyncio.run(main(parser.parse_args()))
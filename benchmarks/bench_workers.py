@@ -0,0 +1,145 @@
+"""
+Пропускная способность в зависимости от количества воркеров.
+
+Для каждого значения --workers запускается настоящий сервер
+(python -m app.server) на временной БД с SHARED_STATE_BACKEND=sqlite,
+и concurrency клиентов seconds секунд запрашивают:
+- "/"                  - главная страница (CPU, без БД);
+- "/admin/api/tickets" - JSON список заявок (чтение из БД).
+
+Клиент работает на той же машине и тоже занимает CPU: прирост от
+воркеров виден, только если ядер больше, чем нужно клиенту.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_workers --workers 1 2 4
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+PATHS = ["/", "/admin/api/tickets"]
+TICKETS = 1000
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(tmp: Path, workers: int, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmp / 'bench.db'}",
+        "SHARED_STATE_BACKEND": "sqlite",
+        "SHARED_STATE_PATH": str(tmp / "shared.db"),
+        "WEB_WORKERS": str(workers),
+        "WEB_PORT": str(port),
+        "RATE_LIMIT_ENABLED": "0",
+        "LOG_LEVEL": "WARNING",
+    }
+    return subprocess.Popen([sys.executable, "-m", "app.server"], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Сервер не запустился")
+
+
+def prepare_database(tmp: Path):
+    """Админ и TICKETS заявок (схему уже создал сервер)"""
+    from app.models import AdminUser
+    from app.passwords import get_password_hash
+    from benchmarks.bench_analytics import fill
+
+    engine = create_engine(f"sqlite:///{tmp / 'bench.db'}")
+    fill(engine, TICKETS)
+    with Session(engine) as db:
+        db.add(AdminUser(username="bench",
+                         hashed_password=get_password_hash("bench-password")))
+        db.commit()
+    engine.dispose()
+
+
+async def load(client: httpx.AsyncClient, path: str, seconds: float,
+               concurrency: int) -> tuple[float, list[float]]:
+    """RPS и задержки (мс) за seconds секунд"""
+    latencies = []
+    deadline = time.perf_counter() + seconds
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.get(path)
+            latencies.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.text
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return len(latencies) / (time.perf_counter() - started), latencies
+
+
+async def measure(workers: int, seconds: float, concurrency: int) -> dict:
+    from app.dependencies import create_access_token
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        port = free_port()
+        server = start_server(tmp, workers, port)
+        try:
+            async with httpx.AsyncClient(
+                base_url=f"http://127.0.0.1:{port}", timeout=60,
+                limits=httpx.Limits(max_connections=concurrency),
+                cookies={"admin_token": create_access_token({"sub": "bench"})},
+            ) as client:
+                await wait_ready(client)
+                prepare_database(tmp)
+                for path in PATHS:
+                    await load(client, path, 1, concurrency)  # прогрев
+                    results[path] = await load(client, path, seconds, concurrency)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    return results
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+async def main(args):
+    print(f"CPU: {os.cpu_count()}, клиентов: {args.concurrency}, {args.seconds:g} с на замер")
+    for workers in args.workers:
+        results = await measure(workers, args.seconds, args.concurrency)
+        for path, (rps, latencies) in results.items():
+            print(f"воркеров {workers}  {path:<20} {rps:8.0f} RPS  "
+                  f"p50 {percentile(latencies, 50):6.1f} мс  "
+                  f"p99 {percentile(latencies, 99):6.1f} мс")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=32)
+    asyncio.run(main(parser.parse_args()))
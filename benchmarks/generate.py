@@ -0,0 +1,214 @@
+"""
+Генератор синтетических заявок для бенчмарков.
+
+Заполняет БД size заявками, похожими на настоящие:
+- created_at за последние days дней: заявок со временем становится
+  больше, днем и вечером больше, чем ночью;
+- статус зависит от возраста заявки: свежие - new, за последние дни -
+  в работе, старые в основном завершены или отменены;
+- updated_at - через несколько часов или дней после создания (у new нет);
+- имена, email и телефоны в разных форматах, как их вводят в форму,
+  сохраненные нормализованными, как при приеме (app.customers);
+  часть заявок - повторные обращения тех же клиентов, иногда с другим
+  email, но тем же телефоном;
+- сообщения разной длины, у части заявок сообщения и типа проекта нет.
+
+Одинаковый seed - одинаковые данные (даты - от момента запуска).
+После заявок заполняются история статусов и агрегаты аналитики
+(analytics.backfill) и клиенты (customers.backfill), FTS индекс
+обновляется триггерами.
+
+Запуск из корня репозитория:
+    python -m benchmarks.generate --size 1000000 --url sqlite:///bench-1m.db
+"""
+import argparse
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Iterator
+
+from sqlalchemy import Engine, create_engine, insert
+
+from app import analytics
+from app import customers
+from app.database import fts
+from app.database.db import Base
+from app.enums import TicketStatus
+from app.models import Ticket
+
+BATCH_SIZE = 10000
+
+FIRST_NAMES = [
+    ("Иван", "Ivan"), ("Петр", "Petr"), ("Сергей", "Sergey"), ("Олег", "Oleg"),
+    ("Андрей", "Andrey"), ("Дмитрий", "Dmitry"), ("Алексей", "Alexey"),
+    ("Анна", "Anna"), ("Мария", "Maria"), ("Елена", "Elena"), ("Ольга", "Olga"),
+    ("Наталья", "Natalia"), ("Татьяна", "Tatiana"), ("Ирина", "Irina"),
+]
+SURNAMES = [
+    ("Иванов", "ivanov"), ("Петров", "petrov"), ("Смирнов", "smirnov"),
+    ("Кузнецов", "kuznetsov"), ("Попов", "popov"), ("Волков", "volkov"),
+    ("Соколов", "sokolov"), ("Лебедев", "lebedev"), ("Козлов", "kozlov"),
+    ("Новиков", "novikov"), ("Морозов", "morozov"), ("Орлов", "orlov"),
+]
+DOMAINS = ["gmail.com", "yandex.ru", "mail.ru", "bk.ru", "outlook.com", "inbox.ru"]
+PHONE_FORMATS = [
+    "+7 ({a}) {b}-{c}-{d}",
+    "8{a}{b}{c}{d}",
+    "+7{a}{b}{c}{d}",
+    "8 ({a}) {b} {c} {d}",
+    "+7 {a} {b}{c}{d}",
+]
+# Тип проекта -> вес (None - не указан)
+PROJECTS = {"cottage": 35, "townhouse": 15, "bath": 20, "villa": 5,
+            "renovation": 10, None: 15}
+PHRASES = [
+    "Хочу построить дом", "Интересует баня из бруса", "Нужна смета на проект",
+    "Есть участок 10 соток", "Рассматриваем кирпичный дом", "Нужен гараж",
+    "Перезвоните, пожалуйста, после 18:00", "Какие сроки строительства?",
+    "Интересует ипотека", "Пришлите каталог проектов", "Нужна консультация",
+    "Участок в Подмосковье", "Бюджет до 10 млн", "Хотим въехать к осени",
+]
+# Доля повторных обращений уже писавших клиентов
+REPEAT_SHARE = 0.15
+# Доля повторных обращений с новым email (тот же телефон)
+NEW_EMAIL_SHARE = 0.2
+
+STATUSES = (TicketStatus.new, TicketStatus.in_progress,
+            TicketStatus.completed, TicketStatus.canceled)
+# Накопленные веса статусов: до 2 дней, до 2 недель, старше
+STATUS_WEIGHTS = [list(accumulate(weights)) for weights in
+                  ((80, 15, 3, 2), (15, 55, 20, 10), (3, 7, 65, 25))]
+# Накопленные веса часа создания: ночью заявок меньше
+HOUR_WEIGHTS = list(accumulate([1] * 8 + [4] * 10 + [6] * 4 + [2] * 2))
+
+
+def _status(rnd: random.Random, age_days: float) -> TicketStatus:
+    """Статус по возрасту заявки"""
+    if age_days < 2:
+        weights = STATUS_WEIGHTS[0]
+    elif age_days < 14:
+        weights = STATUS_WEIGHTS[1]
+    else:
+        weights = STATUS_WEIGHTS[2]
+    return rnd.choices(STATUSES, cum_weights=weights)[0]
+
+
+def _created_at(rnd: random.Random, now: datetime, days: int) -> datetime:
+    """Время создания: к настоящему заявок больше, ночью меньше"""
+    # Плотность растет линейно к now: обратная функция распределения
+    age = days * (1 - math.sqrt(rnd.random()))
+    day = (now - timedelta(days=age)).replace(hour=0, minute=0, second=0, microsecond=0)
+    hour = rnd.choices(range(24), cum_weights=HOUR_WEIGHTS)[0]
+    moment = day + timedelta(hours=hour, seconds=rnd.randrange(3600))
+    return min(moment, now)
+
+
+def _email(rnd: random.Random, first_latin: str, surname_latin: str) -> str:
+    login = rnd.choice([
+        f"{first_latin.lower()}.{surname_latin}",
+        f"{surname_latin}{rnd.randint(1, 999)}",
+        f"{first_latin[0]}{surname_latin.capitalize()}{rnd.randint(70, 99)}",
+    ])
+    return customers.normalize_email(f"{login}@{rnd.choice(DOMAINS)}")
+
+
+def _contact(rnd: random.Random) -> dict:
+    first, first_latin = rnd.choice(FIRST_NAMES)
+    surname, surname_latin = rnd.choice(SURNAMES)
+    if first_latin[-1] == "a":
+        surname += "а"
+        surname_latin += "a"
+    digits = f"{rnd.randint(900, 999)}{rnd.randint(0, 9999999):07d}"
+    phone = rnd.choice(PHONE_FORMATS).format(
+        a=digits[:3], b=digits[3:6], c=digits[6:8], d=digits[8:])
+    return {
+        "name": rnd.choice([f"{first} {surname}", first, f"{surname} {first}"]),
+        "email": _email(rnd, first_latin, surname_latin),
+        "phone": customers.normalize_phone(phone),
+        # Для нового email при повторном обращении
+        "latin": (first_latin, surname_latin),
+    }
+
+
+def _message(rnd: random.Random) -> str | None:
+    if rnd.random() < 0.2:
+        return None
+    return ". ".join(rnd.sample(PHRASES, rnd.randint(1, 4)))
+
+
+def generate_tickets(size: int, seed: int = 42, days: int = 730,
+                     now: datetime | None = None) -> Iterator[list[dict]]:
+    """Заявки пачками по BATCH_SIZE словарей для insert(Ticket)"""
+    rnd = random.Random(seed)
+    now = now or datetime.now().replace(microsecond=0)
+    projects, weights = list(PROJECTS), list(accumulate(PROJECTS.values()))
+    contacts: list[dict] = []
+    batch = []
+    for _ in range(size):
+        if contacts and rnd.random() < REPEAT_SHARE:
+            contact = rnd.choice(contacts)
+            if rnd.random() < NEW_EMAIL_SHARE:
+                contact = {**contact, "email": _email(rnd, *contact["latin"])}
+        else:
+            contact = _contact(rnd)
+            # Помним ограниченное число клиентов - повторы среди них
+            if len(contacts) < 100000:
+                contacts.append(contact)
+        created_at = _created_at(rnd, now, days)
+        status = _status(rnd, (now - created_at).total_seconds() / 86400)
+        updated_at = None
+        if status != TicketStatus.new:
+            updated_at = min(now, created_at + timedelta(
+                seconds=rnd.randint(1800, 14 * 86400)))
+        batch.append({
+            "name": contact["name"],
+            "email": contact["email"],
+            "phone": contact["phone"],
+            "status": status,
+            "message": _message(rnd),
+            "project_type": rnd.choices(projects, cum_weights=weights)[0],
+            "created_at": created_at,
+            "updated_at": updated_at,
+        })
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def fill_database(engine: Engine, size: int, seed: int = 42, days: int = 730,
+                  progress: bool = False):
+    """Создает схему (с FTS), добавляет size заявок и историю статусов"""
+    Base.metadata.create_all(engine)
+    fts.init_fts(engine)
+    started = time.perf_counter()
+    done = 0
+    for batch in generate_tickets(size, seed, days):
+        with engine.begin() as conn:
+            conn.execute(insert(Ticket), batch)
+        done += len(batch)
+        if progress:
+            elapsed = time.perf_counter() - started
+            print(f"\r{done}/{size} заявок, {done / elapsed:.0f}/с", end="", flush=True)
+    if progress:
+        print()
+    analytics.backfill(engine)
+    customers.backfill(engine)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--url", required=True,
+                        help="БД, например sqlite:///bench.db (рабочую не указывать)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, default=730,
+                        help="за сколько дней создавать заявки")
+    args = parser.parse_args()
+
+    db_engine = create_engine(args.url)
+    fill_database(db_engine, args.size, args.seed, args.days, progress=True)
+    db_engine.dispose()
@@ -0,0 +1,476 @@
+"""
+Набор бенчмарков: функции app.crud и app.async_crud и основные маршруты
+(через httpx.ASGITransport, в этом же процессе).
+
+БД - временный SQLite файл с size заявками из benchmarks.generate или
+готовая БД (--db, ее бенчмарки немного меняют: создают, меняют статус
+и удаляют свои заявки). Для каждого случая - перцентили задержки
+(p50 / p95 / p99) и пик памяти на вызов по tracemalloc (в отдельном
+прогоне; для маршрутов - вместе с клиентом httpx). Вызовы идут
+ROUNDS раундами, p50 - лучшая медиана раунда: так меньше влияют
+фоновые процессы машины.
+
+Результат сравнивается с baseline.json: рост p50 или памяти больше чем на
+threshold плюс шум случая (разброс медиан раундов - в этом прогоне или
+в baseline) и заметный в абсолютных цифрах - регрессия, код возврата 1.
+Такие случаи сначала замеряются еще раз (до CONFIRM_RUNS раз, пока
+похожи на регрессию), в зачет идет лучший замер.
+
+Задержки baseline масштабируются на общий сдвиг скорости машины -
+медиану отношений p50 к baseline по всем случаям прогона: фоновая
+нагрузка замедляет все случаи, регрессия - отдельные (замедление
+больше половины случаев так не видно, сдвиг печатается). Если случаев
+меньше MIN_DRIFT_CASES - на отношение calibrate (фиксированная работа
+на чистом Python) для другой машины и без масштаба для этой же.
+
+Абсолютные задержки сравнимы только на той же машине, поэтому
+регрессией считается рост относительно baseline, снятого на этом же
+хосте (meta.host). С baseline другой машины таблица только для
+сведения: снимите свой (--save-baseline --baseline <файл>) и
+сравнивайте с ним (--baseline <файл>).
+
+Запуск из корня репозитория:
+    python -m benchmarks.suite                          # 10000 заявок
+    python -m benchmarks.suite --size 100000 --only crud.get_tickets
+    python -m benchmarks.suite --db bench-1m.db         # из benchmarks.generate
+    python -m benchmarks.suite --save-baseline
+    python -m benchmarks.suite --save-baseline --baseline bench-local.json
+"""
+import argparse
+import asyncio
+import inspect
+import itertools
+import json
+import logging
+import math
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+# Первым: выключает лимиты приема заявок до импорта app
+from benchmarks.bench_async_db import setup_database, unique_ticket
+
+import httpx
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app import async_crud
+from app import crud
+from app.database import db as db_s
+from app.dependencies import create_access_token
+from app.enums import TicketStatus
+from app.main import app
+from app.models import Ticket
+from app.schemas import TicketBulkSelection, TicketCreate, TicketUpdate
+from benchmarks.generate import fill_database
+
+BASELINE = Path(__file__).with_name("baseline.json")
+# Прогревочных вызовов, раундов замера и вызовов под tracemalloc на случай
+WARMUP = 3
+ROUNDS = 3
+ALLOC_REPEATS = 5
+# Сколько раз перемерить случай, похожий на регрессию
+CONFIRM_RUNS = 2
+# Сдвиг скорости машины считается по случаям, если их не меньше
+MIN_DRIFT_CASES = 5
+# Рост p50 меньше этого (мс) или памяти меньше этого (КБ) - шум
+MIN_DELTA_MS = 0.25
+MIN_DELTA_KB = 4
+
+
+class Case(NamedTuple):
+    name: str
+    # Один вызов (sync функция или корутина)
+    run: Callable
+    # Вызовов в раунде
+    repeats: int = 50
+
+
+def calls(repeats: int) -> int:
+    """Сколько раз measure вызовет случай с repeats повторами"""
+    return WARMUP + repeats * ROUNDS + ALLOC_REPEATS
+
+
+async def call(run: Callable):
+    result = run()
+    if inspect.isawaitable(result):
+        await result
+
+
+async def measure(case: Case) -> dict[str, float]:
+    for _ in range(WARMUP):
+        await call(case.run)
+
+    latencies = []
+    medians = []
+    for _ in range(ROUNDS):
+        round_latencies = []
+        for _ in range(case.repeats):
+            started = time.perf_counter()
+            await call(case.run)
+            round_latencies.append((time.perf_counter() - started) * 1000)
+        medians.append(statistics.median(round_latencies))
+        latencies += round_latencies
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(ALLOC_REPEATS):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            await call(case.run)
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "p50": min(medians),
+        "p95": quantiles[94],
+        "p99": quantiles[98],
+        "mean": statistics.fmean(latencies),
+        # Разброс медиан раундов: 0.1 - худшая на 10% медленнее лучшей
+        "noise": max(medians) / min(medians) - 1 if min(medians) else 0,
+        "alloc_kb": statistics.median(peaks) / 1024,
+    }
+
+
+# ============= СЛУЧАИ =============
+
+
+def new_ticket() -> TicketCreate:
+    return TicketCreate(**unique_ticket())
+
+
+def sample_ids(db: Session, count: int, seed: int = 1) -> list[int]:
+    ids = list(db.scalars(select(Ticket.id)))
+    return random.Random(seed).sample(ids, min(count, len(ids)))
+
+
+def crud_cases(db: Session) -> list[Case]:
+    ids = itertools.cycle(sample_ids(db, 200))
+    statuses = itertools.cycle(TicketStatus)
+    _, cursor = crud.get_tickets_page(db, limit=50)
+    deletable = iter([crud.create_ticket(db, new_ticket()).id
+                      for _ in range(calls(50))])
+
+    def stats():
+        crud.invalidate_ticket_stats()
+        return crud.get_ticket_stats(db)
+
+    return [
+        Case("crud.get_ticket_stats", stats),
+        Case("crud.get_ticket", lambda: crud.get_ticket(db, next(ids))),
+        Case("crud.get_tickets", lambda: crud.get_tickets(db, limit=30)),
+        Case("crud.get_tickets_page.status", lambda: crud.get_tickets_page(
+            db, limit=50, status=TicketStatus.in_progress)),
+        Case("crud.get_tickets_page.cursor", lambda: crud.get_tickets_page(
+            db, limit=50, cursor=cursor)),
+        Case("crud.get_tickets_page.search", lambda: crud.get_tickets_page(
+            db, limit=50, search="Иван")),
+        Case("crud.create_ticket", lambda: crud.create_ticket(db, new_ticket())),
+        Case("crud.update_ticket_status", lambda: crud.update_ticket_status(
+            db, next(ids), TicketUpdate(status=next(statuses)))),
+        Case("crud.delete_ticket", lambda: crud.delete_ticket(db, next(deletable))),
+        Case("crud.get_admin_by_username",
+             lambda: crud.get_admin_by_username(db, "bench")),
+        Case("crud.authenticate_admin", lambda: crud.authenticate_admin(
+            db, "bench", "bench-password"), repeats=10),
+    ]
+
+
+async def async_crud_cases(db, ids_source: list[int]) -> list[Case]:
+    ids = itertools.cycle(ids_source)
+    statuses = itertools.cycle(TicketStatus)
+    deletable = []
+    for _ in range(calls(50)):
+        deletable.append((await async_crud.create_ticket(db, new_ticket())).id)
+    deletable = iter(deletable)
+    bulk = TicketBulkSelection(ids=ids_source[:20])
+
+    async def stats():
+        crud.invalidate_ticket_stats()
+        return await async_crud.get_ticket_stats(db)
+
+    return [
+        Case("async_crud.get_ticket_stats", stats),
+        Case("async_crud.get_ticket", lambda: async_crud.get_ticket(db, next(ids))),
+        Case("async_crud.get_tickets_page", lambda: async_crud.get_tickets_page(
+            db, limit=50)),
+        Case("async_crud.get_tickets_page.search", lambda: async_crud.get_tickets_page(
+            db, limit=50, search="Иван")),
+        Case("async_crud.get_ticket_row", lambda: async_crud.get_ticket_row(
+            db, next(ids))),
+        Case("async_crud.get_ticket_rows_page", lambda: async_crud.get_ticket_rows_page(
+            db, limit=50)),
+        Case("async_crud.create_ticket", lambda: async_crud.create_ticket(
+            db, new_ticket())),
+        Case("async_crud.create_tickets.10", lambda: async_crud.create_tickets(
+            db, [new_ticket() for _ in range(10)])),
+        Case("async_crud.update_ticket_status", lambda: async_crud.update_ticket_status(
+            db, next(ids), TicketUpdate(status=next(statuses)))),
+        Case("async_crud.bulk_update_status.20", lambda: async_crud.bulk_update_status(
+            db, bulk, next(statuses))),
+        Case("async_crud.delete_ticket", lambda: async_crud.delete_ticket(
+            db, next(deletable))),
+        Case("async_crud.authenticate_admin", lambda: async_crud.authenticate_admin(
+            db, "bench", "bench-password"), repeats=10),
+    ]
+
+
+def route_cases(client: httpx.AsyncClient, ids_source: list[int]) -> list[Case]:
+    ids = itertools.cycle(ids_source)
+    statuses = itertools.cycle(status.value for status in TicketStatus)
+
+    async def get(url: str, **params):
+        response = await client.get(url, params=params)
+        assert response.status_code == 200, (url, response.status_code)
+
+    async def submit():
+        response = await client.post("/api/submit-application", json=unique_ticket())
+        assert response.status_code == 201, response.text
+
+    async def change_status():
+        response = await client.post(f"/admin/tickets/{next(ids)}/status",
+                                     data={"status": next(statuses)})
+        assert response.status_code == 303, response.text
+
+    return [
+        Case("route.GET /", lambda: get("/")),
+        Case("route.GET /health", lambda: get("/health")),
+        Case("route.POST /api/submit-application", submit),
+        Case("route.GET /admin/dashboard", lambda: get("/admin/dashboard")),
+        Case("route.GET /admin/tickets", lambda: get("/admin/tickets")),
+        Case("route.GET /admin/tickets?search", lambda: get(
+            "/admin/tickets", search="Иван")),
+        Case("route.GET /admin/tickets/{id}", lambda: get(
+            f"/admin/tickets/{next(ids)}")),
+        Case("route.GET /admin/api/tickets", lambda: get("/admin/api/tickets")),
+        Case("route.GET /admin/api/tickets/{id}", lambda: get(
+            f"/admin/api/tickets/{next(ids)}")),
+        Case("route.POST /admin/tickets/{id}/status", change_status),
+    ]
+
+
+# ============= BASELINE =============
+
+
+def calibrate() -> float:
+    """Время (мс) фиксированной работы на чистом Python, лучшее из 5"""
+    data = [{"id": i, "name": f"Заявка {i}", "tags": list(range(10))}
+            for i in range(2000)]
+    best = math.inf
+    for _ in range(5):
+        started = time.perf_counter()
+        json.loads(json.dumps(data))
+        sorted(map(str, range(20000)))
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return best
+
+
+def host() -> str:
+    """Машина, на которой сняты замеры: имя хоста, архитектура, Python"""
+    return f"{platform.node()}/{platform.machine()}/{platform.python_version()}"
+
+
+def drift(results: dict, cases: dict) -> float | None:
+    """
+    Во сколько раз эта машина сейчас медленнее, чем при снятии baseline:
+    медиана отношений p50 по случаям. None - случаев меньше MIN_DRIFT_CASES.
+    """
+    ratios = [result["p50"] / cases[name]["p50"]
+              for name, result in results.items()
+              if name in cases and cases[name]["p50"]]
+    if len(ratios) < MIN_DRIFT_CASES:
+        return None
+    return statistics.median(ratios)
+
+
+def check(result: dict, base: dict, threshold: float,
+          scale: float) -> tuple[float, float, bool]:
+    """
+    (p50 к baseline, память к baseline, регрессия ли). Допустимый рост
+    времени - threshold плюс шум случая в этом прогоне или в baseline.
+    """
+    expected = base["p50"] * scale
+    time_ratio = result["p50"] / expected if expected else 1
+    alloc_ratio = result["alloc_kb"] / base["alloc_kb"] if base["alloc_kb"] else 1
+    tolerance = threshold + max(result["noise"], base.get("noise", 0))
+    slower = (time_ratio > 1 + tolerance
+              and result["p50"] - expected > MIN_DELTA_MS)
+    bigger = (alloc_ratio > 1 + threshold
+              and result["alloc_kb"] - base["alloc_kb"] > MIN_DELTA_KB)
+    return time_ratio, alloc_ratio, slower or bigger
+
+
+def compare(results: dict, baseline: dict, threshold: float,
+            scale: float = 1) -> list[str]:
+    """
+    Печатает таблицу, возвращает имена случаев с регрессией.
+    scale - во сколько раз эта машина медленнее машины baseline.
+    """
+    regressions = []
+    print(f"{'случай':<42} {'p50':>8} {'p95':>8} {'p99':>8} {'КБ':>8}  "
+          f"{'p50 к base':>10} {'КБ к base':>10}")
+    for name, result in results.items():
+        line = (f"{name:<42} {result['p50']:8.2f} {result['p95']:8.2f} "
+                f"{result['p99']:8.2f} {result['alloc_kb']:8.1f}  ")
+        base = baseline.get(name)
+        if base is None:
+            print(line + f"{'нет':>10}")
+            continue
+
+        time_ratio, alloc_ratio, regressed = check(result, base, threshold, scale)
+        mark = ""
+        if regressed:
+            mark = "  РЕГРЕССИЯ"
+            regressions.append(name)
+        elif time_ratio < 1 - threshold:
+            mark = "  быстрее"
+        print(line + f"{time_ratio - 1:+10.0%} {alloc_ratio - 1:+10.0%}{mark}")
+    return regressions
+
+
+def load_baseline(path: Path, size: int) -> dict | None:
+    if not path.exists():
+        print(f"Нет {path} - сравнивать не с чем (--save-baseline, чтобы создать)")
+        return None
+    data = json.loads(path.read_text())
+    if data["meta"]["size"] != size:
+        print(f"Внимание: baseline снят на {data['meta']['size']} заявках, сейчас {size}")
+    return data
+
+
+def save_baseline(path: Path, results: dict, size: int, calibration: float):
+    data = {
+        "meta": {
+            "size": size,
+            "calibration_ms": round(calibration, 3),
+            "host": host(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "created": datetime.now().isoformat(timespec="seconds"),
+        },
+        "cases": {name: {key: round(value, 3) for key, value in result.items()}
+                  for name, result in results.items()},
+    }
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n")
+    print(f"Baseline записан в {path}")
+
+
+# ============= ЗАПУСК =============
+
+
+async def run(db_path: Path, selected: Callable[[str], bool]) -> dict:
+    # INFO логи приложения и httpx в терминал искажали бы задержки
+    logging.disable(logging.INFO)
+    engine, async_engine = setup_database(db_path)
+    results = {}
+    try:
+        with Session(engine) as db:
+            ids = sample_ids(db, 200, seed=2)
+            for case in crud_cases(db):
+                if selected(case.name):
+                    results[case.name] = await measure(case)
+
+        async with db_s.AsyncSessionLocal() as db:
+            for case in await async_crud_cases(db, ids):
+                if selected(case.name):
+                    results[case.name] = await measure(case)
+
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench",
+            cookies={"admin_token": create_access_token({"sub": "bench"})},
+        ) as client:
+            for case in route_cases(client, ids):
+                if selected(case.name):
+                    results[case.name] = await measure(case)
+    finally:
+        await async_engine.dispose()
+        engine.dispose()
+    return results
+
+
+async def main(args) -> int:
+    def selected(name: str) -> bool:
+        return not args.only or any(name.startswith(prefix) for prefix in args.only)
+
+    calibration = calibrate()
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.db:
+            db_path = Path(args.db)
+            with Session(create_engine(f"sqlite:///{db_path}")) as db:
+                size = db.query(Ticket).count()
+        else:
+            db_path = Path(tmp) / "suite.db"
+            engine = create_engine(f"sqlite:///{db_path}")
+            fill_database(engine, args.size)
+            engine.dispose()
+            size = args.size
+        print(f"Заявок в БД: {size}")
+        results = await run(db_path, selected)
+        calibration = min(calibration, calibrate())
+
+        baseline = None if args.save_baseline else load_baseline(args.baseline, size)
+        same_host = baseline is not None and baseline["meta"].get("host") == host()
+        scale = 1
+        if baseline is not None:
+            scale = drift(results, baseline["cases"])
+            # calibrate шумит сильнее случаев - на той же машине без масштаба
+            if scale is None:
+                scale = 1 if same_host else calibration / baseline["meta"]["calibration_ms"]
+        if same_host:
+            # Похожее на регрессию замеряем еще раз: пик фоновой нагрузки
+            # редко повторяется, настоящая регрессия - всегда
+            for _ in range(CONFIRM_RUNS):
+                suspects = [name for name, result in results.items()
+                            if name in baseline["cases"]
+                            and check(result, baseline["cases"][name],
+                                      args.threshold, scale)[2]]
+                if not suspects:
+                    break
+                print(f"Повторный замер: {', '.join(suspects)}")
+                for name, result in (await run(db_path, suspects.__contains__)).items():
+                    if result["p50"] < results[name]["p50"]:
+                        results[name] = result
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results, size, calibration)
+        compare(results, {}, args.threshold)
+        return 0
+
+    if baseline is None:
+        compare(results, {}, args.threshold)
+        return 0
+    print(f"Скорость машины относительно baseline: x{1 / scale:.2f}")
+    regressions = compare(results, baseline["cases"], args.threshold, scale)
+    if not same_host:
+        print(f"Baseline снят на другой машине ({baseline['meta'].get('host', 'неизвестно')}), "
+              f"здесь {host()}: задержки несравнимы, регрессии только для сведения. "
+              "Снимите baseline на этой машине: --save-baseline --baseline <файл>")
+        return 0
+    if regressions:
+        print(f"Регрессий: {len(regressions)} ({', '.join(regressions)})")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=10000,
+                        help="заявок во временной БД")
+    parser.add_argument("--db", help="готовая SQLite БД вместо временной")
+    parser.add_argument("--only", action="append",
+                        help="только случаи с этим префиксом имени (можно несколько)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="допустимый рост p50 и памяти (0.25 = 25%%)")
+    sys.exit(asyncio.run(main(parser.parse_args())))